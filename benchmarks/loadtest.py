@@ -0,0 +1,204 @@
+"""
+Async HTTP load driver. Runs a scripted mix of login, list, search, birthdays, create and update
+requests against a running app and reports p50/p95/p99 latency and throughput per route as JSON.
+
+    python -m benchmarks.seed --users 10000 --contacts 1000
+    RATE_LIMIT_ENABLED=false python main.py
+    python -m benchmarks.loadtest --users 10000 --concurrency 50 --duration 60 --output build-123.json
+
+Start the app with the rate limiter off, the per-user limits of the routes are far below the load.
+429 answers are counted per route in ``rate_limited`` and left out of the latency percentiles,
+so a run against a limited app does not report the latency of the rejections.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.seed import FIRST_NAMES, SURNAMES, random_birthday, seed_user_email
+
+
+DEFAULT_MIX = {"list": 40, "search": 20, "birthdays": 15, "create": 10, "update": 10, "login": 5}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        sorted_values (List[float]): Sorted samples.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile or 0.0 when there are no samples.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class Recorder:
+    """
+    Latencies and status codes per route.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, status: int, elapsed: float):
+        self.statuses[route][status] += 1
+        if status != 429:
+            self.latencies[route].append(elapsed)
+
+    def report(self, duration: float) -> dict:
+        routes = {}
+        for route in sorted(self.statuses):
+            samples = sorted(self.latencies[route])
+            statuses = self.statuses[route]
+            routes[route] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / duration, 2),
+                "rate_limited": statuses.get(429, 0),
+                "errors": sum(count for status, count in statuses.items() if status >= 500 or status == 0),
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {"duration_s": round(duration, 2), "requests": total,
+                "throughput_rps": round(total / duration, 2),
+                "rate_limited": sum(route["rate_limited"] for route in routes.values()), "routes": routes}
+
+
+class VirtualUser:
+    """
+    One client that logs in as a seeded user and then sends requests picked by weight.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, email: str, password: str,
+                 mix: Dict[str, int], rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.email = email
+        self.password = password
+        self.routes = list(mix)
+        self.weights = list(mix.values())
+        self.rng = rng
+        self.headers = {}
+        self.contact_ids: List[int] = []
+
+    async def _request(self, route: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        self.recorder.record(route, status, time.perf_counter() - start)
+        return response
+
+    def _contact_body(self) -> dict:
+        name, surname = self.rng.choice(FIRST_NAMES), self.rng.choice(SURNAMES)
+        return {"name": name, "surname": surname, "mobile": f"+380{self.rng.randint(500000000, 999999999)}",
+                "email": f"{name.lower()}.{surname.lower()}@example.com",
+                "birthday": random_birthday(self.rng).isoformat()}
+
+    async def login(self):
+        response = await self._request("login", "POST", "/api/auth/login",
+                                       data={"username": self.email, "password": self.password})
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def step(self):
+        route = self.rng.choices(self.routes, weights=self.weights)[0]
+        if route == "login":
+            await self.login()
+        elif route == "list":
+            response = await self._request(route, "GET", "/api/contacts/", headers=self.headers,
+                                           params={"skip": self.rng.randint(0, 50), "limit": 100})
+            if response is not None and response.status_code == 200:
+                self.contact_ids = [contact["id"] for contact in response.json()][:20] or self.contact_ids
+        elif route == "search":
+            await self._request(route, "GET", f"/api/contacts/name/{self.rng.choice(FIRST_NAMES)}", headers=self.headers)
+        elif route == "birthdays":
+            await self._request(route, "GET", "/api/contacts/birthdays", headers=self.headers)
+        elif route == "create":
+            response = await self._request(route, "POST", "/api/contacts/", headers=self.headers, json=self._contact_body())
+            if response is not None and response.status_code == 201:
+                self.contact_ids.append(response.json()["id"])
+        elif route == "update" and self.contact_ids:
+            await self._request(route, "PUT", f"/api/contacts/{self.rng.choice(self.contact_ids)}",
+                                headers=self.headers, json=self._contact_body())
+
+    async def run(self, deadline: float):
+        await self.login()
+        while time.perf_counter() < deadline:
+            await self.step()
+
+
+async def run_load(base_url: str, users: int, concurrency: int, duration: float, password: str,
+                   mix: Dict[str, int], seed_value: int = 42) -> dict:
+    """
+    Runs ``concurrency`` virtual users for ``duration`` seconds.
+
+    Args:
+        base_url (str): Address of the running app.
+        users (int): Number of seeded users to pick the logins from.
+        concurrency (int): Number of virtual users.
+        duration (float): Test length in seconds.
+        password (str): Password of the seeded users.
+        mix (Dict[str, int]): Relative weight of every route.
+        seed_value (int, optional): Random seed. Defaults to 42.
+
+    Returns:
+        dict: Report of the run.
+    """
+    rng = random.Random(seed_value)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        vus = [VirtualUser(client, recorder, seed_user_email(rng.randint(1, users)), password, mix,
+                           random.Random(rng.random())) for _ in range(concurrency)]
+        await asyncio.gather(*(vu.run(deadline) for vu in vus))
+        elapsed = time.perf_counter() - start
+    report = recorder.report(elapsed)
+    report["config"] = {"base_url": base_url, "users": users, "concurrency": concurrency,
+                        "duration_s": duration, "mix": mix, "seed": seed_value,
+                        "started_at": datetime.now().isoformat(timespec="seconds")}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mixed-traffic load test against a running app.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=100, help="Number of seeded users.")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds.")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX, help='JSON, e.g. \'{"list": 1, "search": 1}\'')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    args = parser.parse_args()
+    report = asyncio.run(run_load(args.base_url, args.users, args.concurrency, args.duration, args.password,
+                                  args.mix, args.seed))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
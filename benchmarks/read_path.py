@@ -0,0 +1,122 @@
+"""
+Time and memory of the contact list read through the ORM and through the Core row path.
+
+Both paths read the same page of contacts and serialize it to the JSON of the list route:
+the ORM path builds Contact instances and validates them into ContactResponse like the
+response_model did, the row path selects the columns and dumps the rows with contact_list_adapter.
+
+    python -m benchmarks.read_path --rows 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import sessionmaker, Session
+
+from benchmarks.seed import seed, seed_user_email
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.schemas import CONTACT_FIELDS, ContactResponse, contact_list_adapter
+
+
+def paths(user: User, rows: int) -> Dict[str, Callable[[Session], bytes]]:
+    """
+    Args:
+        user (User): Owner of the seeded contacts.
+        rows (int): Contacts per call.
+
+    Returns:
+        Dict[str, Callable[[Session], bytes]]: Path name and the call returning the JSON body.
+    """
+    orm_adapter = TypeAdapter(List[ContactResponse])
+    row_adapter = contact_list_adapter(CONTACT_FIELDS)
+
+    def orm(db: Session) -> bytes:
+        contacts = asyncio.run(repository_contacts.get_contacts(0, rows, user, db))
+        body = orm_adapter.dump_json(orm_adapter.validate_python(contacts))
+        db.expunge_all()
+        return body
+
+    def core_rows(db: Session) -> bytes:
+        result = asyncio.run(repository_contacts.get_contact_rows(0, rows, user, db))
+        return row_adapter.dump_json(row_adapter.validate_python(result, from_attributes=True))
+
+    return {"orm": orm, "rows": core_rows}
+
+
+def measure(call: Callable[[Session], bytes], session_factory: sessionmaker, repeat: int) -> dict:
+    """
+    Args:
+        call (Callable[[Session], bytes]): Read path.
+        session_factory (sessionmaker): Seeded database.
+        repeat (int): Timed calls.
+
+    Returns:
+        dict: Median milliseconds per call and the peak of the allocated memory of one call in KiB.
+    """
+    timings = []
+    with session_factory() as db:
+        call(db)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            call(db)
+            timings.append(time.perf_counter() - start)
+        gc.collect()
+        tracemalloc.start()
+        call(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"ms": statistics.median(timings) * 1000, "peak_kib": peak / 1024}
+
+
+def run(url: str, rows: int, repeat: int) -> Dict[str, dict]:
+    """
+    Seed one user with ``rows`` contacts and measure both paths.
+
+    Args:
+        url (str): Database URL. The tables are dropped and created again.
+        rows (int): Contacts of the user and the page size.
+        repeat (int): Timed calls of each path.
+
+    Returns:
+        Dict[str, dict]: Measurements of the "orm" and "rows" paths.
+    """
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    seed(engine, users=1, contacts=rows)
+    with engine.begin() as connection:
+        # ContactResponse requires the email, the seed leaves some of them empty.
+        connection.execute(update(Contact).where(Contact.email.is_(None)).values(email="bench@example.com"))
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    try:
+        with session_factory() as db:
+            user = db.execute(select(User).where(User.email == seed_user_email(1))).scalar_one()
+            db.expunge(user)
+        return {name: measure(call, session_factory, repeat) for name, call in paths(user, rows).items()}
+    finally:
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ORM and the Core row read paths.")
+    parser.add_argument("--url", default="sqlite://", help="Database that is wiped and seeded. Defaults to in-memory SQLite.")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = run(args.url, args.rows, args.repeat)
+    for name, result in results.items():
+        print(f"{name:<6} {result['ms']:10.3f} ms {result['peak_kib']:12.1f} KiB per {args.rows} rows")
+    print(f"rows/orm: {results['rows']['ms'] / results['orm']['ms']:.2f}x time, "
+          f"{results['rows']['peak_kib'] / results['orm']['peak_kib']:.2f}x memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Micro-benchmarks of the repository functions at several data scales.
+
+Every function is timed against a freshly seeded database for each backend and scale.
+The median time is compared with the stored baseline and the run fails (exit code 1)
+when a function got slower than ``baseline * (1 + tolerance)``, when there is no baseline
+file or when a measured function has no baseline time.
+
+    python -m benchmarks.repository --scale 1000 --scale 100000 --update-baseline
+    python -m benchmarks.repository --scale 1000 --scale 100000 --tolerance 0.2
+    python -m benchmarks.repository --backend postgres --postgres-url postgresql+psycopg2://... --scale 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker, Session
+
+from benchmarks.seed import seed, seed_user_email
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.repository import users as repository_users
+from src.schemas import ContactBase
+
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_SCALES = (1_000, 100_000, 1_000_000)
+
+
+def _body(i: int) -> ContactBase:
+    return ContactBase(name=f"Bench{i}", surname="Mark", mobile="+380501234567",
+                       email=f"bench{i}@example.com", birthday=datetime(1990, 5, 17))
+
+
+def benchmarks(user: User, contact_ids: List[int]) -> Dict[str, Callable[[Session, int], object]]:
+    """
+    Calls of the benchmarked functions. Every call gets the session and the iteration number.
+
+    Args:
+        user (User): User that owns the seeded contacts.
+        contact_ids (List[int]): Ids of the user's contacts, removed ones are taken from the end.
+
+    Returns:
+        Dict[str, Callable]: Benchmark name and the coroutine factory.
+    """
+    return {
+        "get_contacts": lambda db, i: repository_contacts.get_contacts(0, 100, user, db),
+        "get_contact_rows": lambda db, i: repository_contacts.get_contact_rows(0, 100, user, db),
+        "get_contact": lambda db, i: repository_contacts.get_contact(contact_ids[i % len(contact_ids)], user, db),
+        "get_contact_by_name": lambda db, i: repository_contacts.get_contact_by_name("name", "Olena", user, db),
+        "get_closest_birthdays": lambda db, i: repository_contacts.get_closest_birthdays(0, 100, user, db),
+        "create_contact": lambda db, i: repository_contacts.create_contact(_body(i), user, db),
+        "update_contact": lambda db, i: repository_contacts.update_contact(contact_ids[i % len(contact_ids)], _body(i), user, db),
+        "remove_contact": lambda db, i: repository_contacts.remove_contact(contact_ids.pop(), user, db),
+        "get_user_by_email": lambda db, i: repository_users.get_user_by_email(user.email, db),
+    }
+
+
+def run_scale(url: str, scale: int, contacts_per_user: int, repeat: int) -> Dict[str, float]:
+    """
+    Seeds ``scale`` contacts into an empty database and times every benchmark.
+
+    Args:
+        url (str): Database URL. The tables are dropped and created again.
+        scale (int): Total number of contacts.
+        contacts_per_user (int): Contacts per seeded user.
+        repeat (int): Number of timed calls of each function.
+
+    Returns:
+        Dict[str, float]: Median seconds per call for every function.
+    """
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    per_user = min(contacts_per_user, scale)
+    seed(engine, users=max(scale // per_user, 1), contacts=per_user)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        with session_factory() as db:
+            user = db.execute(select(User).where(User.email == seed_user_email(1))).scalar_one()
+            contact_ids = list(db.execute(select(Contact.id).where(Contact.user_id == user.id)).scalars())
+            db.expunge(user)
+        for name, call in benchmarks(user, contact_ids).items():
+            timings = []
+            with session_factory() as db:
+                loop.run_until_complete(call(db, -1))
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    loop.run_until_complete(call(db, i))
+                    timings.append(time.perf_counter() - start)
+            results[name] = statistics.median(timings)
+    finally:
+        loop.close()
+        engine.dispose()
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """
+    Args:
+        results (Dict[str, float]): Current median times.
+        baseline (Dict[str, float]): Stored median times.
+        tolerance (float): Allowed slowdown, 0.2 means 20 %.
+
+    Returns:
+        List[str]: Descriptions of the regressed benchmarks.
+    """
+    regressions = []
+    for key, value in sorted(results.items()):
+        expected = baseline.get(key)
+        if expected and value > expected * (1 + tolerance):
+            regressions.append(f"{key}: {value * 1000:.3f} ms, baseline {expected * 1000:.3f} ms "
+                               f"(+{(value / expected - 1) * 100:.0f} %)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the repository functions.")
+    parser.add_argument("--backend", action="append", choices=("sqlite", "postgres"),
+                        help="Can be repeated. Defaults to sqlite.")
+    parser.add_argument("--postgres-url", default=os.environ.get("BENCHMARK_POSTGRES_URL"),
+                        help="Database that is wiped and seeded. Defaults to BENCHMARK_POSTGRES_URL.")
+    parser.add_argument("--scale", action="append", type=int, help=f"Total contacts, can be repeated. Defaults to {DEFAULT_SCALES}.")
+    parser.add_argument("--contacts-per-user", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline.")
+    args = parser.parse_args()
+    if not args.update_baseline and not args.baseline.exists():
+        # A check without a baseline would pass whatever the times are.
+        sys.exit(f"No baseline at {args.baseline}, run with --update-baseline first")
+
+    results = {}
+    for backend in args.backend or ["sqlite"]:
+        for scale in args.scale or DEFAULT_SCALES:
+            if backend == "postgres":
+                if not args.postgres_url:
+                    parser.error("--postgres-url or BENCHMARK_POSTGRES_URL is required for postgres")
+                url = args.postgres_url
+            else:
+                url = f"sqlite:///{os.path.join(tempfile.gettempdir(), f'bench_{scale}.db')}"
+            for name, seconds in run_scale(url, scale, args.contacts_per_user, args.repeat).items():
+                key = f"{backend}:{scale}:{name}"
+                results[key] = seconds
+                print(f"{key:<50} {seconds * 1000:10.3f} ms")
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    missing = sorted(set(results) - set(baseline))
+    regressions = compare(results, baseline, args.tolerance)
+    for key in missing:
+        print(f"NO BASELINE {key}")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    sys.exit(1 if regressions or missing else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,151 @@
-import redis.asyncio as redis
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.routes import contacts, auth, users
+from src.routes import contacts, auth, users, metrics, admin, dashboard
 from src.conf.config import settings
+from src.services.metrics import MetricsRoute, rate_limit_callback
+from src.middleware.query_stats import QueryStatsMiddleware
+from src.middleware.profiling import ProfilingMiddleware
+from src.middleware.admission import AdmissionControlMiddleware, Priority, EXEMPT
+from src.middleware.deadline import DeadlineMiddleware, NO_DEADLINE
 from fastapi_limiter import FastAPILimiter
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 import asyncio
+import logging
+from datetime import datetime, timedelta
 
-import sys
-import os
-sys.path.append(os.getcwd())
+from src.database.shards import shard_map
+from src.repository.contacts import prune_tombstones, reconcile_contacts_counts
+from src.services.change_stream import change_hub
+from src.services.idempotency import IdempotentReplay, idempotent_replay_handler
+from src.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
 
 async def startup():
     """
-    Initialize the connection to Redis. Allows to use Redis to store rate limit information.
+    Initialize the rate limiter on the shared Redis connection pool.
+    """
+    await FastAPILimiter.init(get_redis(), http_callback=rate_limit_callback)
+
+
+
+def reconcile_counts():
+    """
+    Fix the per-user contacts counters that drifted from the real number of contacts.
     """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    fixed = 0
+    for session_factory in shard_map.session_factories():
+        with session_factory() as db:
+            fixed += reconcile_contacts_counts(db)
+    if fixed:
+        logger.warning("Reconciled contacts_count of %d users", fixed)
+
+
+async def reconcile_counts_periodically():
+    """
+    Runs reconcile_counts every CONTACTS_COUNT_RECONCILE_SECONDS.
+    """
+    while True:
+        await asyncio.sleep(settings.contacts_count_reconcile_seconds)
+        try:
+            await run_in_threadpool(reconcile_counts)
+        except Exception:
+            logger.exception("Contacts count reconciliation failed")
+
+
+def prune_old_tombstones():
+    """
+    Delete the tombstones older than TOMBSTONE_RETENTION_DAYS; sync tokens older than them get a reset.
+    """
+    older_than = datetime.now() - timedelta(days=settings.tombstone_retention_days)
+    pruned = 0
+    for session_factory in shard_map.session_factories():
+        with session_factory() as db:
+            pruned += prune_tombstones(older_than, db)
+    if pruned:
+        logger.info("Pruned %d contact tombstones", pruned)
+
+
+async def prune_tombstones_periodically():
+    """
+    Runs prune_old_tombstones every TOMBSTONE_PRUNE_SECONDS.
+    """
+    while True:
+        await asyncio.sleep(settings.tombstone_prune_seconds)
+        try:
+            await run_in_threadpool(prune_old_tombstones)
+        except Exception:
+            logger.exception("Pruning the contact tombstones failed")
+
 
-        
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """ Background task starts at statrup """
     asyncio.create_task(startup())
+    reconcile_task = asyncio.create_task(reconcile_counts_periodically())
+    prune_task = asyncio.create_task(prune_tombstones_periodically())
     yield
+    reconcile_task.cancel()
+    prune_task.cancel()
+    await change_hub.close()
 
 app = FastAPI(lifespan=lifespan)
+app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
+app.router.route_class = MetricsRoute
 
 origins = [ 
     "http://localhost:3000"
     ]
 
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(
+    DeadlineMiddleware,
+    default_seconds=settings.request_timeout_seconds,
+    budgets={
+        "/api/contacts/batch": 3 * settings.request_timeout_seconds,
+        "/api/contacts/merge": 3 * settings.request_timeout_seconds,
+        "/api/contacts/stream": NO_DEADLINE,
+        "/api/admin": NO_DEADLINE,
+        "/metrics": NO_DEADLINE,
+    },
+)
+app.add_middleware(
+    AdmissionControlMiddleware,
+    max_concurrency=settings.admission_max_concurrency,
+    queue_size=settings.admission_queue_size,
+    queue_timeout=settings.admission_queue_timeout_seconds,
+    retry_after=settings.admission_retry_after_seconds,
+    priorities={
+        "/api/auth": Priority.HIGH,
+        "/api/contacts/batch": Priority.LOW,
+        "/api/contacts/stats": Priority.LOW,
+        "/api/contacts/duplicates": Priority.LOW,
+        "/api/contacts/stream": EXEMPT,
+        "/api/admin": EXEMPT,
+        "/metrics": EXEMPT,
+    },
+)
+# Added last, so it is the outermost middleware and the 503 and 504 answered by the
+# admission and deadline middlewares carry the CORS headers too.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "Retry-After"],
 )
 
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(admin.router, prefix='/api')
+app.include_router(dashboard.router, prefix='/api')
+app.include_router(metrics.router)
 
 @app.get("/")
 def read_root():
@@ -30,7 +30,8 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
-config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
+# src/database/shards.py passes the URL of every shard in config.attributes.
+config.set_main_option("sqlalchemy.url", config.attributes.get("sqlalchemy.url", SQLALCHEMY_DATABASE_URL).replace("%", "%%"))
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
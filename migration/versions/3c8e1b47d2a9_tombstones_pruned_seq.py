@@ -0,0 +1,30 @@
+"""Watermark of the pruned tombstones
+
+Revision ID: 3c8e1b47d2a9
+Revises: f76f7cf9e4e5
+Create Date: 2026-10-19 18:04:52.113409
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.online_migrations import add_column_online, create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8e1b47d2a9'
+down_revision: Union[str, None] = 'f76f7cf9e4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    add_column_online('users', sa.Column('tombstones_pruned_seq', sa.Integer(), server_default='0', nullable=False))
+    create_index_concurrently('ix_contact_tombstones_deleted_at', 'contact_tombstones', ['deleted_at'])
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_contact_tombstones_deleted_at', 'contact_tombstones')
+    op.drop_column('users', 'tombstones_pruned_seq')
@@ -0,0 +1,28 @@
+"""User shard assignment
+
+Revision ID: 6f307212995d
+Revises: 756772fe966b
+Create Date: 2026-10-19 14:02:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f307212995d'
+down_revision: Union[str, None] = '756772fe966b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('shard', sa.Integer(), nullable=True))
+    op.add_column('users', sa.Column('shard_moving', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'shard_moving')
+    op.drop_column('users', 'shard')
@@ -0,0 +1,53 @@
+"""Contact change tracking and tombstones
+
+Revision ID: 756772fe966b
+Revises: d2ee223e4cba
+Create Date: 2026-10-19 12:26:05.771934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.online_migrations import add_column_online, create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '756772fe966b'
+down_revision: Union[str, None] = 'd2ee223e4cba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    add_column_online('contacts', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    add_column_online('contacts', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    add_column_online('users', sa.Column('change_seq', sa.Integer(), server_default='0', nullable=False))
+    # The sequences start above the ids of the existing contacts, the contact_change_seq backfill then
+    # gives every existing contact its id as the change number: unique per user and below every future number.
+    op.execute(
+        "UPDATE users SET change_seq = "
+        "COALESCE((SELECT max(contacts.id) FROM contacts WHERE contacts.user_id = users.id), 0)"
+    )
+    create_index_concurrently('ix_contacts_user_id_change_seq', 'contacts', ['user_id', 'change_seq'])
+    op.create_table('contact_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # The table is new and empty, a plain index does not block anything.
+    op.create_index('ix_contact_tombstones_user_id_change_seq', 'contact_tombstones', ['user_id', 'change_seq'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_tombstones_user_id_change_seq', table_name='contact_tombstones')
+    op.drop_table('contact_tombstones')
+    drop_index_concurrently('ix_contacts_user_id_change_seq', 'contacts')
+    op.drop_column('users', 'change_seq')
+    op.drop_column('contacts', 'change_seq')
+    op.drop_column('contacts', 'updated_at')
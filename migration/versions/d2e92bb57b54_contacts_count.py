@@ -0,0 +1,30 @@
+"""Per-user contacts counter
+
+Revision ID: d2e92bb57b54
+Revises: 72b3112a5455
+Create Date: 2026-10-19 10:12:41.318270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2e92bb57b54'
+down_revision: Union[str, None] = '72b3112a5455'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('contacts_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE users SET contacts_count = "
+        "(SELECT count(*) FROM contacts WHERE contacts.user_id = users.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'contacts_count')
@@ -0,0 +1,40 @@
+"""Contact duplicate keys
+
+Revision ID: d2ee223e4cba
+Revises: d2e92bb57b54
+Create Date: 2026-10-19 11:03:27.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.database.online_migrations import add_column_online, create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2ee223e4cba'
+down_revision: Union[str, None] = 'd2e92bb57b54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The keys stay NULL for existing rows: the contact_duplicate_keys backfill fills them, until then
+    # fill_duplicate_keys computes them per user on the first search.
+    add_column_online('contacts', sa.Column('email_key', sa.String(length=150), nullable=True))
+    add_column_online('contacts', sa.Column('mobile_key', sa.String(length=50), nullable=True))
+    add_column_online('contacts', sa.Column('name_key', sa.String(length=100), nullable=True))
+    create_index_concurrently('ix_contacts_user_id_email_key', 'contacts', ['user_id', 'email_key'])
+    create_index_concurrently('ix_contacts_user_id_mobile_key', 'contacts', ['user_id', 'mobile_key'])
+    create_index_concurrently('ix_contacts_user_id_name_key', 'contacts', ['user_id', 'name_key'])
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_contacts_user_id_name_key', 'contacts')
+    drop_index_concurrently('ix_contacts_user_id_mobile_key', 'contacts')
+    drop_index_concurrently('ix_contacts_user_id_email_key', 'contacts')
+    op.drop_column('contacts', 'name_key')
+    op.drop_column('contacts', 'mobile_key')
+    op.drop_column('contacts', 'email_key')
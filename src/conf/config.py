@@ -7,6 +7,7 @@ load_dotenv() # я додала тут підвантаження бо чому
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
+    shard_urls: str = ''
     secret_key: str
     algorithm: str
     mail_username: str
@@ -16,9 +17,46 @@ class Settings(BaseSettings):
     mail_server: str
     redis_host: str = 'localhost'
     redis_port: int = 6379
+    redis_max_connections: int = 50
+    redis_socket_timeout: float = 0.5
+    redis_connect_timeout: float = 0.5
+    redis_pool_timeout: float = 1
+    redis_breaker_failures: int = 5
+    redis_breaker_reset_seconds: float = 10
+    rate_limit_enabled: bool = True
+    user_cache_ttl_seconds: int = 900
     cloudinary_name: str
     cloudinary_api_key: int
     cloudinary_api_secret: str
+    debug: bool = False
+    sql_slow_query_ms: float = 200
+    sql_n_plus_one_threshold: int = 5
+    admin_token: str = ''
+    profiling_sample_rate: float = 0.0
+    profiling_interval_ms: float = 5
+    profile_dir: str = ''
+    profiles_limit: int = 100
+    memory_snapshots_limit: int = 10
+    contacts_count_reconcile_seconds: int = 3600
+    tombstone_retention_days: int = 30
+    tombstone_prune_seconds: int = 3600
+    suggest_max_entries: int = 1_000_000
+    suggest_index_ttl_seconds: int = 300
+    stats_cache_ttl_seconds: int = 3600
+    query_cache_ttl_seconds: int = 300
+    query_cache_max_bytes: int = 262144
+    stream_heartbeat_seconds: float = 15
+    stream_retry_ms: int = 3000
+    stream_queue_size: int = 100
+    stream_replay_limit: int = 1000
+    idempotency_ttl_seconds: int = 86400
+    idempotency_lock_seconds: int = 30
+    idempotency_wait_seconds: float = 10
+    admission_max_concurrency: int = 64
+    admission_queue_size: int = 128
+    admission_queue_timeout_seconds: float = 2
+    admission_retry_after_seconds: int = 1
+    request_timeout_seconds: float = 10
 
     class Config:
         env_file = f"{Path(__file__).resolve().parent}/.env"
@@ -1,5 +0,0 @@
-import sys
-import os
-sys.path.append(os.getcwd())
-
-print(os.getcwd())
\ No newline at end of file
@@ -0,0 +1,116 @@
+import logging
+import math
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.services import deadline
+from src.services.metrics import Counter as MetricCounter
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = MetricCounter("sql_slow_queries_total", "Statements slower than SQL_SLOW_QUERY_MS.")
+N_PLUS_ONE = MetricCounter("sql_n_plus_one_suspected_total", "Statements repeated within one request.")
+SLOW_QUERIES_TOTAL = SLOW_QUERIES.labels()
+N_PLUS_ONE_TOTAL = N_PLUS_ONE.labels()
+
+
+class QueryStats:
+    """
+    Queries issued while handling one request.
+    """
+    __slots__ = ("count", "duration", "statements", "suspected")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.suspected = set()
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries():
+    """
+    Attributes every statement executed inside the block to a new QueryStats object.
+
+    Yields:
+        QueryStats: Stats of the block.
+    """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def _redact(parameters) -> str:
+    if not parameters:
+        return "[]"
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        return f"[{len(parameters)} parameter sets redacted]"
+    return f"[{len(parameters)} parameters redacted]"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    if elapsed * 1000 >= settings.sql_slow_query_ms:
+        SLOW_QUERIES_TOTAL.inc()
+        logger.warning("Slow query (%.1f ms): %s %s", elapsed * 1000, statement, _redact(parameters))
+
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.duration += elapsed
+    stats.statements[statement] += 1
+    if stats.statements[statement] == settings.sql_n_plus_one_threshold and statement not in stats.suspected:
+        stats.suspected.add(statement)
+        N_PLUS_ONE_TOTAL.inc()
+        logger.warning("Suspected N+1: statement executed %d times in one request: %s",
+                       settings.sql_n_plus_one_threshold, statement)
+
+
+def _check_deadline(conn, cursor, statement, parameters, context, executemany):
+    deadline.check()
+
+
+def _apply_deadline(session, transaction, connection):
+    """
+    Bound the statements and lock waits of a Postgres transaction by the rest of the request budget,
+    so a slow query is cancelled by the server instead of holding the worker and the connection.
+    """
+    left = deadline.remaining()
+    if left is None or connection.dialect.name != "postgresql":
+        return
+    milliseconds = max(math.ceil(left * 1000), 1)
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {milliseconds}; SET LOCAL lock_timeout = {milliseconds}")
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Hooks the query listeners and the request deadline to an engine.
+
+    Args:
+        engine (Engine): Engine to instrument.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _check_deadline)
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    if not event.contains(Session, "after_begin", _apply_deadline):
+        event.listen(Session, "after_begin", _apply_deadline)
@@ -1,13 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, func, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, func, Table, Index, false
+from sqlalchemy.orm import relationship, backref
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime
 from sqlalchemy.ext.declarative import declarative_base
 
-import sys
-import os
-sys.path.append(os.getcwd())
-
 Base = declarative_base()
 
 
@@ -20,9 +16,43 @@ class Contact(Base):
     email = Column(String(50))
     birthday = Column(DateTime)
     created_at = Column('created_at', DateTime, default=func.now())
+    updated_at = Column('updated_at', DateTime, default=func.now(), onupdate=func.now())
+    # Number from the owner's change sequence of the last write, used by the delta sync.
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
-    user = relationship('User', backref="notes")
-    
+    # Normalized blocking keys for the duplicates search, see src/services/dedup.py.
+    email_key = Column(String(150), nullable=True)
+    mobile_key = Column(String(50), nullable=True)
+    name_key = Column(String(100), nullable=True)
+    # Lazy loads raise instead of silently issuing one query per contact (N+1).
+    user = relationship('User', backref=backref("notes", lazy="raise_on_sql", passive_deletes=True), lazy="raise_on_sql")
+
+    __table_args__ = (
+        Index('ix_contacts_user_id_email_key', 'user_id', 'email_key'),
+        Index('ix_contacts_user_id_mobile_key', 'user_id', 'mobile_key'),
+        Index('ix_contacts_user_id_name_key', 'user_id', 'name_key'),
+        Index('ix_contacts_user_id_change_seq', 'user_id', 'change_seq'),
+    )
+
+
+class ContactTombstone(Base):
+    __tablename__ = "contact_tombstones"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    contact_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index('ix_contact_tombstones_user_id_change_seq', 'user_id', 'change_seq'),
+        Index('ix_contact_tombstones_deleted_at', 'deleted_at'),
+    )
+
+
+# Columns of the shard copy of a users row, the credentials stay in the main database.
+SHARD_USER_COLUMNS = ("id", "username", "email", "confirmed")
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -32,4 +62,25 @@ class User(Base):
     created_at = Column('crated_at', DateTime, default=func.now())
     confirmed = Column(Boolean, default=False)
     avatar = Column(String(255), nullable=True)
-    refresh_token = Column(String(255), nullable=True)
\ No newline at end of file
+    refresh_token = Column(String(255), nullable=True)
+    # Maintained by the contacts repository in the same transaction as the insert/delete.
+    contacts_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Last number of the change sequence of the user's contacts.
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Highest change number of the pruned tombstones, older sync tokens get a reset.
+    tombstones_pruned_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Shard of the user's contacts, NULL means user_id % number of shards. See src/database/shards.py.
+    shard = Column(Integer, nullable=True)
+    # Set while the contacts are moved to another shard, the contacts routes answer 503 meanwhile.
+    shard_moving = Column(Boolean, nullable=False, default=False, server_default=false())
+
+
+# Resume point of a batched backfill, see src/database/online_migrations.py.
+class MigrationProgress(Base):
+    __tablename__ = "migration_progress"
+    name = Column(String(100), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    rows_done = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,295 @@
+"""
+Helpers for schema and data changes on large tables without locking them.
+
+A plain ``op.create_index`` or ``op.add_column`` with a NOT NULL column and an UPDATE of every row
+holds a lock on the table for as long as the statement runs. Instead, the Alembic revisions
+use the helpers below, and the data is filled afterwards, in committed batches, by a backfill
+that can be stopped and resumed at any time:
+
+    python -m src.database.online_migrations backfill contact_duplicate_keys --batch-size 2000 --pause 0.2
+    python -m src.database.online_migrations status
+
+The backfills run on the main database and on every shard; the resume point of each one is kept
+in the ``migration_progress`` table of that database.
+"""
+import argparse
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import Table, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.database.models import Contact, MigrationProgress
+from src.services.dedup import contact_keys, name_key
+
+
+logger = logging.getLogger(__name__)
+
+Apply = Callable[[Session, int, int], int]
+
+
+def _is_postgres() -> bool:
+    from alembic import op
+    return op.get_context().dialect.name == "postgresql"
+
+
+@contextmanager
+def lock_timeout(timeout: str = "5s"):
+    """
+    Make the DDL statements inside the block give up after ``timeout`` instead of waiting for the
+    table lock. A waiting ALTER TABLE blocks every query that comes after it, so it is better to
+    fail and retry the migration than to stall the application. Does nothing outside Postgres.
+
+    Args:
+        timeout (str, optional): Postgres interval. Defaults to "5s".
+    """
+    from alembic import op
+    if not _is_postgres():
+        yield
+        return
+    op.execute(sa.text(f"SET LOCAL lock_timeout = '{timeout}'"))
+    try:
+        yield
+    finally:
+        op.execute(sa.text("SET LOCAL lock_timeout = DEFAULT"))
+
+
+def add_column_online(table_name: str, column: sa.Column, timeout: str = "5s"):
+    """
+    Add a column without rewriting the table. The column has to be nullable or have a constant
+    server default (Postgres 11+ stores it in the catalog); existing rows are filled by a backfill.
+
+    Args:
+        table_name (str): Table name.
+        column (sa.Column): New column.
+        timeout (str, optional): Lock timeout of the ALTER TABLE. Defaults to "5s".
+
+    Raises:
+        ValueError: The column is NOT NULL without a server default.
+    """
+    from alembic import op
+    if not column.nullable and column.server_default is None:
+        raise ValueError(f"{table_name}.{column.name} is NOT NULL without a server default, add it as nullable "
+                         f"and set NOT NULL after the backfill")
+    with lock_timeout(timeout):
+        op.add_column(table_name, column)
+
+
+def create_index_concurrently(index_name: str, table_name: str, columns: Sequence[str], **kwargs):
+    """
+    Create an index without blocking the writes to the table. On Postgres the index is built
+    with CREATE INDEX CONCURRENTLY outside the migration transaction; an invalid index left by an
+    interrupted build is dropped first, so the revision can simply be run again.
+
+    Args:
+        index_name (str): Index name.
+        table_name (str): Table name.
+        columns (Sequence[str]): Indexed columns.
+        **kwargs: Other arguments of ``op.create_index``, e.g. ``unique=True``.
+    """
+    from alembic import op
+    if not _is_postgres():
+        op.create_index(index_name, table_name, list(columns), **kwargs)
+        return
+    with op.get_context().autocommit_block():
+        invalid = op.get_bind().execute(sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                                        {"name": index_name}).scalar()
+        if invalid:
+            op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True)
+        op.create_index(index_name, table_name, list(columns), postgresql_concurrently=True, if_not_exists=True,
+                        **kwargs)
+
+
+def drop_index_concurrently(index_name: str, table_name: str):
+    """
+    Drop an index without blocking the writes to the table (DROP INDEX CONCURRENTLY on Postgres).
+
+    Args:
+        index_name (str): Index name.
+        table_name (str): Table name.
+    """
+    from alembic import op
+    if not _is_postgres():
+        op.drop_index(index_name, table_name=table_name)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+
+
+class Backfill:
+    """
+    Data migration that walks a table in primary key order. Every batch is a short transaction
+    that updates the rows with ``after_id < id <= last_id`` and moves the resume point in the
+    ``migration_progress`` table, so a stopped backfill continues from the last committed batch.
+    """
+
+    def __init__(self, name: str, table: Table, apply: Apply, batch_size: int = 1000):
+        """
+        Args:
+            name (str): Name of the backfill in the CLI and the progress table.
+            table (Table): Walked table, it must have an integer primary key ``id``.
+            apply (Apply): Updates the rows of one id range in the given session and returns their number.
+            batch_size (int, optional): Rows per batch. Defaults to 1000.
+        """
+        self.name = name
+        self.table = table
+        self.apply = apply
+        self.batch_size = batch_size
+
+    def run(self, session_factory: sessionmaker, batch_size: int | None = None, pause_seconds: float = 0,
+            max_batches: int | None = None, restart: bool = False) -> dict:
+        """
+        Run the backfill until the end of the table or ``max_batches``.
+
+        Args:
+            session_factory (sessionmaker): Database to migrate.
+            batch_size (int | None, optional): Rows per batch. Defaults to the batch size of the backfill.
+            pause_seconds (float, optional): Sleep between the batches to leave capacity to the application
+                and to the replicas. Defaults to 0.
+            max_batches (int | None, optional): Stop after this number of batches. Defaults to None.
+            restart (bool, optional): Start again from the first row. Defaults to False.
+
+        Returns:
+            dict: Progress with the ``last_id``, ``rows_done`` and ``finished`` keys.
+        """
+        batch_size = batch_size or self.batch_size
+        id_column = self.table.c.id
+        with session_factory() as db:
+            progress = db.get(MigrationProgress, self.name)
+            if progress is None:
+                progress = MigrationProgress(name=self.name, last_id=0, rows_done=0)
+                db.add(progress)
+            elif restart:
+                progress.last_id, progress.rows_done, progress.finished_at = 0, 0, None
+            db.commit()
+
+            max_id = db.scalar(select(func.max(id_column))) or 0
+            started, batches = time.monotonic(), 0
+            while progress.finished_at is None and (max_batches is None or batches < max_batches):
+                batch = select(id_column).where(id_column > progress.last_id).order_by(id_column).limit(batch_size)
+                last_id = db.scalar(select(func.max(batch.subquery().c.id)))
+                if last_id is None:
+                    progress.finished_at = func.now()
+                    db.commit()
+                    break
+                rows = self.apply(db, progress.last_id, last_id)
+                progress.last_id = last_id
+                progress.rows_done += rows
+                db.commit()
+                batches += 1
+                elapsed = time.monotonic() - started
+                logger.info("%s: %d rows updated, id %d of %d (%.0f%%), %.0f rows/s", self.name, progress.rows_done,
+                            last_id, max_id, 100 * min(last_id / max_id, 1) if max_id else 100,
+                            progress.rows_done / elapsed if elapsed else 0)
+                if pause_seconds:
+                    time.sleep(pause_seconds)
+            return {"last_id": progress.last_id, "rows_done": progress.rows_done,
+                    "finished": progress.finished_at is not None}
+
+
+BACKFILLS: Dict[str, Backfill] = {}
+
+
+def backfill(name: str, table: Table, batch_size: int = 1000) -> Callable[[Apply], Apply]:
+    """
+    Register the decorated function as the batch of a backfill.
+
+    Args:
+        name (str): Name of the backfill.
+        table (Table): Walked table.
+        batch_size (int, optional): Default rows per batch. Defaults to 1000.
+    """
+    def register(apply: Apply) -> Apply:
+        BACKFILLS[name] = Backfill(name, table, apply, batch_size)
+        return apply
+    return register
+
+
+@backfill("contact_duplicate_keys", Contact.__table__)
+def fill_contact_duplicate_keys(db: Session, after_id: int, last_id: int) -> int:
+    """
+    Duplicate keys (email, mobile and name) of the contacts created before revision d2ee223e4cba.
+    Without the backfill they are computed per user on the first duplicates search.
+    """
+    rows = db.execute(select(Contact.id, Contact.name, Contact.surname, Contact.mobile, Contact.email)
+                      .where(Contact.id > after_id, Contact.id <= last_id, Contact.name_key.is_(None))).all()
+    if rows:
+        db.execute(update(Contact), [{"id": row.id, **contact_keys(row.name, row.surname, row.mobile, row.email)}
+                                     for row in rows])
+    return len(rows)
+
+
+@backfill("contact_change_seq", Contact.__table__)
+def fill_contact_change_seq(db: Session, after_id: int, last_id: int) -> int:
+    """
+    Change numbers of the contacts created before revision 756772fe966b: the id, which revision
+    756772fe966b put below every number of the owner's sequence. Until it ran, the delta sync
+    sends these contacts only with the full sync, so run it before the clients use the tokens.
+    """
+    result = db.execute(update(Contact).where(Contact.id > after_id, Contact.id <= last_id, Contact.change_seq == 0)
+                        .values(change_seq=Contact.id, updated_at=func.coalesce(Contact.updated_at, Contact.created_at))
+                        .execution_options(synchronize_session=False))
+    return result.rowcount
+
+
+@backfill("contact_name_keys", Contact.__table__)
+def refill_contact_name_keys(db: Session, after_id: int, last_id: int) -> int:
+    """
+    Name keys computed before the names were transliterated: the Cyrillic names had their spelling
+    as the key, so they only matched exactly. Only the changed keys are written.
+    """
+    rows = db.execute(select(Contact.id, Contact.name, Contact.surname, Contact.name_key)
+                      .where(Contact.id > after_id, Contact.id <= last_id, Contact.name_key.is_not(None))).all()
+    changed = [{"id": row.id, "name_key": key} for row in rows
+               if (key := name_key(row.name, row.surname)) != row.name_key]
+    if changed:
+        db.execute(update(Contact), changed)
+    return len(changed)
+
+
+def backfill_status(session_factory: sessionmaker) -> List[dict]:
+    """
+    Args:
+        session_factory (sessionmaker): Database to inspect.
+
+    Returns:
+        List[dict]: Progress rows of the database.
+    """
+    with session_factory() as db:
+        rows = db.execute(select(MigrationProgress.__table__).order_by(MigrationProgress.name)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def main():
+    from src.database.shards import shard_map
+
+    parser = argparse.ArgumentParser(description="Run the batched data migrations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="Run or resume a backfill on every database.")
+    backfill_parser.add_argument("name", choices=sorted(BACKFILLS))
+    backfill_parser.add_argument("--batch-size", type=int)
+    backfill_parser.add_argument("--pause", type=float, default=0, help="Seconds to sleep between the batches.")
+    backfill_parser.add_argument("--max-batches", type=int)
+    backfill_parser.add_argument("--restart", action="store_true", help="Start again from the first row.")
+    commands.add_parser("status", help="Show the progress of the backfills.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    for session_factory in shard_map.session_factories():
+        database = str(session_factory.kw["bind"].url).rsplit("@", 1)[-1]
+        if args.command == "backfill":
+            progress = BACKFILLS[args.name].run(session_factory, args.batch_size, args.pause, args.max_batches,
+                                                args.restart)
+            print(f"{database}: {progress['rows_done']} rows, "
+                  f"{'finished' if progress['finished'] else 'stopped at id %d' % progress['last_id']}")
+        else:
+            for row in backfill_status(session_factory):
+                print(f"{database}: {row['name']} {row['rows_done']} rows, last id {row['last_id']}, "
+                      f"{'finished ' + str(row['finished_at']) if row['finished_at'] else 'in progress'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Optional sharding of the contacts by user.
+
+With SHARD_URLS empty everything lives in the main database. With N comma separated shard URLs
+the main database keeps the users (authentication, profile) and the contacts, tombstones and
+counters of a user live in shard ``users.shard`` or, when it is NULL, in shard ``user_id % N``.
+Every shard has the full schema and a copy of the owner's users row without the credentials,
+which holds the contacts counter and the change sequence.
+
+    python -m src.database.shards upgrade head
+    python -m src.database.shards move --user-id 42 --to 3
+
+Contact ids are kept when a user is moved unless the id is taken in the target shard; such a
+contact gets a new id, and the clients see the old id deleted and the new one created through the
+delta sync. Non-overlapping id sequences (on Postgres ``ALTER SEQUENCE contacts_id_seq INCREMENT BY <N>
+RESTART WITH <start with remainder shard>``) avoid the new ids but are not required.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Sequence
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import create_engine, delete, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import settings
+from src.database.db import SessionLocal, get_db
+from src.database.instrumentation import instrument_engine
+from src.database.models import SHARD_USER_COLUMNS, Contact, ContactTombstone, User
+from src.repository.contacts import query_cache
+from src.services.auth import auth_service
+
+
+logger = logging.getLogger(__name__)
+
+ENSURED_USERS_LIMIT = 100_000
+COPY_BATCH_SIZE = 1000
+
+
+class ShardMap:
+    """
+    Engines of the contact shards, created on first use.
+    """
+
+    def __init__(self, urls: Sequence[str]):
+        self.urls = list(urls)
+        self._sessionmakers: Dict[int, sessionmaker] = {}
+        self._ensured: "OrderedDict[tuple, None]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def shard_for(self, user: User) -> int:
+        """
+        Args:
+            user (User): Owner of the contacts.
+
+        Returns:
+            int: Number of the shard with the user's contacts.
+        """
+        return user.shard if user.shard is not None else user.id % len(self.urls)
+
+    def session_factory(self, shard: int) -> sessionmaker:
+        factory = self._sessionmakers.get(shard)
+        if factory is None:
+            engine = create_engine(self.urls[shard])
+            instrument_engine(engine)
+            factory = self._sessionmakers[shard] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        return factory
+
+    def session(self, shard: int) -> Session:
+        return self.session_factory(shard)()
+
+    def session_factories(self) -> List[Callable[[], Session]]:
+        """
+        Returns:
+            List[Callable[[], Session]]: Factories of the databases that hold contacts.
+        """
+        return [self.session_factory(shard) for shard in range(len(self.urls))] or [SessionLocal]
+
+    def ensure_user(self, shard: int, db: Session, user: User):
+        """
+        Create the shard copy of the users row if it is missing. Known pairs are remembered,
+        so the check costs one primary key lookup per user and worker.
+
+        Args:
+            shard (int): Number of the shard.
+            db (Session): Session of the shard.
+            user (User): Owner of the contacts.
+        """
+        key = (shard, user.id)
+        if key in self._ensured:
+            self._ensured.move_to_end(key)
+            return
+        if db.execute(select(User.id).where(User.id == user.id)).first() is None:
+            try:
+                db.execute(insert(User).values(password="", **{column: getattr(user, column) for column in SHARD_USER_COLUMNS}))
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+        self._ensured[key] = None
+        if len(self._ensured) > ENSURED_USERS_LIMIT:
+            self._ensured.popitem(last=False)
+
+    def forget_user(self, user_id: int):
+        for key in [key for key in self._ensured if key[1] == user_id]:
+            del self._ensured[key]
+
+
+shard_map = ShardMap([url.strip() for url in settings.shard_urls.split(",") if url.strip()])
+
+
+def get_contacts_db(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+    """
+    Session of the database with the current user's contacts. Without shards it is the main session.
+
+    Args:
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+        db (Session, optional): Session of the main database. Defaults to Depends(get_db).
+
+    Raises:
+        HTTPException: HTTP_503_SERVICE_UNAVAILABLE while the user's contacts are moved to another shard.
+
+    Yields:
+        Session: Session bound to the user's shard.
+    """
+    if not shard_map:
+        yield db
+        return
+    if current_user.shard_moving:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="The contacts are being moved, try again later", headers={"Retry-After": "10"})
+    shard = shard_map.shard_for(current_user)
+    shard_db = shard_map.session(shard)
+    try:
+        shard_map.ensure_user(shard, shard_db, current_user)
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+def get_contacts_session_factory(current_user: User = Depends(auth_service.get_current_user)) -> Callable[[], Session]:
+    """
+    Factory of the sessions of the database with the current user's contacts, for the routes that
+    read with several sessions at once. Without shards it is the main database.
+
+    Args:
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Raises:
+        HTTPException: HTTP_503_SERVICE_UNAVAILABLE while the user's contacts are moved to another shard.
+
+    Returns:
+        Callable[[], Session]: Session factory.
+    """
+    if not shard_map:
+        return SessionLocal
+    if current_user.shard_moving:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="The contacts are being moved, try again later", headers={"Retry-After": "10"})
+    return shard_map.session_factory(shard_map.shard_for(current_user))
+
+
+def _forget_cached_user(email: str):
+    asyncio.run(auth_service.user_cache.invalidate(f"user:{email}"))
+
+
+def _forget_cached_queries(user_id: int):
+    # The cached lists and searches hold the ids of the old shard, some contacts got new ones.
+    asyncio.run(query_cache.bump(user_id))
+
+
+def _copy_rows(source: Session, target: Session, table, user_id: int, skip_columns=()):
+    columns = [column for column in table.__table__.columns if column.key not in skip_columns]
+    result = source.execute(select(*columns).where(table.user_id == user_id).order_by(columns[0]))
+    while True:
+        rows = result.mappings().fetchmany(COPY_BATCH_SIZE)
+        if not rows:
+            break
+        target.execute(insert(table.__table__), [dict(row) for row in rows])
+
+
+def _copy_contacts(source: Session, target: Session, user_id: int) -> int:
+    """
+    Copy the contacts of a user with their ids. A contact whose id belongs to another contact
+    of the target shard is inserted with a new id, under a new change number, and its old id gets
+    a tombstone, so the synced clients replace it.
+
+    Returns:
+        int: Number of contacts that got a new id.
+    """
+    result = source.execute(select(Contact.__table__).where(Contact.user_id == user_id).order_by(Contact.id))
+    renumbered = []
+    while True:
+        rows = [dict(row) for row in result.mappings().fetchmany(COPY_BATCH_SIZE)]
+        if not rows:
+            break
+        taken = set(target.execute(select(Contact.id).where(Contact.id.in_([row["id"] for row in rows]))).scalars())
+        kept = [row for row in rows if row["id"] not in taken]
+        if kept:
+            target.execute(insert(Contact.__table__), kept)
+        renumbered.extend(row for row in rows if row["id"] in taken)
+    if renumbered:
+        last_seq = target.execute(update(User).where(User.id == user_id)
+                                  .values(change_seq=User.change_seq + 2 * len(renumbered))
+                                  .returning(User.change_seq)).scalar_one()
+        change_seq = last_seq - 2 * len(renumbered)
+        for row in renumbered:
+            old_id = row.pop("id")
+            target.execute(insert(ContactTombstone).values(user_id=user_id, contact_id=old_id, change_seq=change_seq + 1))
+            target.execute(insert(Contact.__table__).values(**{**row, "change_seq": change_seq + 2}))
+            change_seq += 2
+    if target.bind.dialect.name == "postgresql":
+        # The copied ids were not taken from the sequence of the target, new contacts must not get them.
+        target.execute(text("SELECT setval(pg_get_serial_sequence('contacts', 'id'), "
+                            "GREATEST(coalesce(max(id), 0), nextval(pg_get_serial_sequence('contacts', 'id')))) "
+                            "FROM contacts"))
+    return len(renumbered)
+
+
+def move_user(user_id: int, target: int, main: sessionmaker = SessionLocal, shards: ShardMap = shard_map,
+              grace_seconds: float = 5) -> int:
+    """
+    Move the contacts of a user to another shard.
+
+    The user is marked as moving first, so the contacts routes answer 503 instead of writing to the
+    old shard, and the requests that already passed the check get ``grace_seconds`` to finish.
+    The rows are copied with their ids (see _copy_contacts for the ids taken in the target) in one
+    transaction of the target shard, then the user is switched to the target and the rows are
+    deleted from the old shard.
+
+    Args:
+        user_id (int): User to move.
+        target (int): Number of the target shard.
+        main (sessionmaker, optional): Factory of the main database sessions. Defaults to SessionLocal.
+        shards (ShardMap, optional): Shards. Defaults to shard_map.
+        grace_seconds (float, optional): Wait for the in-flight requests. Defaults to 5.
+
+    Raises:
+        ValueError: If the user or the shard does not exist.
+
+    Returns:
+        int: Number of moved contacts.
+    """
+    if not 0 <= target < len(shards):
+        raise ValueError(f"Shard {target} does not exist, there are {len(shards)} shards")
+    with main() as db:
+        user = db.get(User, user_id)
+        if user is None:
+            raise ValueError(f"User {user_id} does not exist")
+        source = shards.shard_for(user)
+        if source == target:
+            return 0
+        user.shard_moving = True
+        db.commit()
+        email = user.email
+    _forget_cached_user(email)
+    time.sleep(grace_seconds)
+
+    try:
+        with shards.session(source) as source_db, shards.session(target) as target_db:
+            target_db.execute(delete(Contact).where(Contact.user_id == user_id))
+            target_db.execute(delete(ContactTombstone).where(ContactTombstone.user_id == user_id))
+            target_db.execute(delete(User).where(User.id == user_id))
+            shard_user = source_db.execute(select(User.__table__).where(User.id == user_id)).mappings().first()
+            if shard_user is not None:
+                target_db.execute(insert(User.__table__).values(**dict(shard_user)))
+            _copy_contacts(source_db, target_db, user_id)
+            _copy_rows(source_db, target_db, ContactTombstone, user_id, skip_columns=("id",))
+            moved = target_db.execute(select(Contact.id).where(Contact.user_id == user_id)).scalars().all()
+            target_db.commit()
+    except BaseException:
+        with main() as db:
+            db.execute(update(User).where(User.id == user_id).values(shard_moving=False))
+            db.commit()
+        raise
+
+    with main() as db:
+        db.execute(update(User).where(User.id == user_id).values(shard=target, shard_moving=False))
+        db.commit()
+    _forget_cached_user(email)
+    _forget_cached_queries(user_id)
+    shards.forget_user(user_id)
+
+    with shards.session(source) as source_db:
+        source_db.execute(delete(Contact).where(Contact.user_id == user_id))
+        source_db.execute(delete(ContactTombstone).where(ContactTombstone.user_id == user_id))
+        source_db.execute(delete(User).where(User.id == user_id))
+        source_db.commit()
+    return len(moved)
+
+
+def upgrade_all(revision: str = "head", config_file: str = "alembic.ini") -> List[str]:
+    """
+    Run the Alembic migrations on the main database and on every shard.
+
+    Args:
+        revision (str, optional): Target revision. Defaults to "head".
+        config_file (str, optional): Alembic configuration. Defaults to "alembic.ini".
+
+    Returns:
+        List[str]: Upgraded database URLs.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    urls = [settings.sqlalchemy_database_url, *shard_map.urls]
+    for url in urls:
+        config = Config(config_file)
+        config.attributes["sqlalchemy.url"] = url
+        command.upgrade(config, revision)
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the contact shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = commands.add_parser("upgrade", help="Upgrade the main database and all shards.")
+    upgrade_parser.add_argument("revision", nargs="?", default="head")
+    move_parser = commands.add_parser("move", help="Move the contacts of a user to another shard.")
+    move_parser.add_argument("--user-id", type=int, required=True)
+    move_parser.add_argument("--to", type=int, required=True, help="Number of the target shard.")
+    move_parser.add_argument("--grace-seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        for url in upgrade_all(args.revision):
+            print(f"Upgraded {url.rsplit('@', 1)[-1]}")
+    else:
+        if not shard_map:
+            parser.error("SHARD_URLS is empty")
+        print(f"Moved {move_user(args.user_id, args.to, grace_seconds=args.grace_seconds)} contacts")
+
+
+if __name__ == "__main__":
+    main()
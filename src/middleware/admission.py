@@ -0,0 +1,162 @@
+import asyncio
+import json
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Dict
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.services.metrics import ADMISSION_QUEUE, REQUESTS_SHED
+
+
+class Priority(IntEnum):
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+
+
+# Priority of the paths that are never queued or shed (scrapes, long-lived streams).
+EXEMPT = None
+
+OVERLOADED = json.dumps({"detail": "Server is overloaded, try again later"}).encode()
+
+
+class AdmissionControlMiddleware:
+    """
+    Limits the number of requests the worker processes at once. A request over the limit waits
+    in a bounded queue; it is answered with 503 and Retry-After when the queue is full or when it
+    waited longer than ``queue_timeout``, so under overload the worker keeps serving the admitted
+    requests fast instead of making everyone wait for bcrypt, the DB pool or Redis.
+
+    Requests are admitted by priority, then in arrival order. When the queue is full, a request
+    pushes out the newest waiting request of a lower priority. The priority of a request is that
+    of the longest matching path prefix in ``priorities``, ``default_priority`` otherwise.
+    """
+
+    def __init__(self, app: ASGIApp, max_concurrency: int, queue_size: int, queue_timeout: float,
+                 retry_after: int = 1, priorities: Dict[str, Priority | None] | None = None,
+                 default_priority: Priority = Priority.NORMAL):
+        """
+        Args:
+            app (ASGIApp): Wrapped application.
+            max_concurrency (int): Requests processed at once, 0 turns the admission control off.
+            queue_size (int): Requests that may wait for a slot.
+            queue_timeout (float): Seconds a request may wait for a slot.
+            retry_after (int, optional): Retry-After of the 503 answers in seconds. Defaults to 1.
+            priorities (Dict[str, Priority | None] | None, optional): Priority by path prefix, EXEMPT
+                to bypass the limit. Defaults to None.
+            default_priority (Priority, optional): Priority of the other paths. Defaults to Priority.NORMAL.
+        """
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = str(retry_after).encode()
+        self.priorities = sorted((priorities or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.default_priority = default_priority
+        self.active = 0
+        self.waiting = 0
+        self._queues: Dict[Priority, Deque[asyncio.Future]] = {priority: deque() for priority in Priority}
+        self._shed = {(reason, priority): REQUESTS_SHED.labels(reason, priority.name.lower())
+                      for reason in ("queue_full", "queue_timeout", "evicted") for priority in Priority}
+
+    def priority(self, path: str) -> Priority | None:
+        for prefix, priority in self.priorities:
+            if path.startswith(prefix):
+                return priority
+        return self.default_priority
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.max_concurrency:
+            await self.app(scope, receive, send)
+            return
+        priority = self.priority(scope["path"])
+        if priority is EXEMPT:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await self._admit(priority)
+        if reason is not None:
+            self._shed[reason, priority].inc()
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"retry-after", self.retry_after),
+                                    (b"content-length", str(len(OVERLOADED)).encode())]})
+            await send({"type": "http.response.body", "body": OVERLOADED})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._release()
+
+    async def _admit(self, priority: Priority) -> str | None:
+        """
+        Take a slot, waiting in the queue if needed.
+
+        Returns:
+            str | None: None when admitted, otherwise the reason of the rejection.
+        """
+        if self.active < self.max_concurrency and not self.waiting:
+            self.active += 1
+            return None
+        if self.waiting >= self.queue_size and not self._evict(priority):
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._enqueue(priority, waiter)
+        timer = asyncio.get_running_loop().call_later(self.queue_timeout, self._expire, priority, waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                self._dequeue(priority, waiter)
+            elif waiter.result() is None:
+                self._release()
+            raise
+        finally:
+            timer.cancel()
+
+    def _release(self):
+        for priority in reversed(Priority):
+            queue = self._queues[priority]
+            while queue:
+                waiter = queue.popleft()
+                self.waiting -= 1
+                ADMISSION_QUEUE.set(self.waiting)
+                # A cancelled waiter (the client went away) is skipped, it is not removed yet.
+                if not waiter.done():
+                    # The slot is handed over, so the number of active requests stays the same.
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+
+    def _evict(self, priority: Priority) -> bool:
+        for lower in Priority:
+            if lower >= priority:
+                return False
+            queue = self._queues[lower]
+            while queue:
+                waiter = queue.pop()
+                self.waiting -= 1
+                ADMISSION_QUEUE.set(self.waiting)
+                if not waiter.done():
+                    waiter.set_result("evicted")
+                    return True
+        return False
+
+    def _expire(self, priority: Priority, waiter: asyncio.Future):
+        if self._dequeue(priority, waiter) and not waiter.done():
+            waiter.set_result("queue_timeout")
+
+    def _enqueue(self, priority: Priority, waiter: asyncio.Future):
+        self._queues[priority].append(waiter)
+        self.waiting += 1
+        ADMISSION_QUEUE.set(self.waiting)
+
+    def _dequeue(self, priority: Priority, waiter: asyncio.Future) -> bool:
+        try:
+            self._queues[priority].remove(waiter)
+        except ValueError:
+            return False
+        self.waiting -= 1
+        ADMISSION_QUEUE.set(self.waiting)
+        return True
@@ -0,0 +1,74 @@
+import asyncio
+import json
+from typing import Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services import deadline
+from src.services.metrics import REQUESTS_TIMED_OUT
+
+
+# Budget of the paths that are never cut (long-lived streams, scrapes).
+NO_DEADLINE = None
+
+TIMED_OUT = json.dumps({"detail": "Request deadline exceeded"}).encode()
+
+
+class DeadlineMiddleware:
+    """
+    Gives every request a time budget. The budget is kept in a context variable, so the DB
+    transactions get the rest of it as their statement and lock timeout and the Redis commands
+    are cancelled when it runs out (see ``src.services.deadline``). A request that runs out of
+    time before its response started is answered with 504; the awaited call is cancelled, so
+    the session and the pooled connections are released by the usual cleanup.
+
+    The budget of a request is that of the longest matching path prefix in ``budgets``,
+    ``default_seconds`` otherwise.
+    """
+
+    def __init__(self, app: ASGIApp, default_seconds: float, budgets: Dict[str, float | None] | None = None):
+        """
+        Args:
+            app (ASGIApp): Wrapped application.
+            default_seconds (float): Budget of the other paths in seconds, 0 turns the deadlines off.
+            budgets (Dict[str, float | None] | None, optional): Budget by path prefix, NO_DEADLINE
+                for no budget. Defaults to None.
+        """
+        self.app = app
+        self.default_seconds = default_seconds
+        self.budgets = sorted((budgets or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def budget(self, path: str) -> float | None:
+        for prefix, seconds in self.budgets:
+            if path.startswith(prefix):
+                return seconds
+        return self.default_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        seconds = self.budget(scope["path"]) if scope["type"] == "http" and self.default_seconds else NO_DEADLINE
+        if seconds is NO_DEADLINE:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        with deadline.deadline(seconds):
+            try:
+                async with asyncio.timeout(seconds):
+                    await self.app(scope, receive, send_wrapper)
+            except Exception:
+                # A statement cancelled by the server or refused by the deadline check surfaces as
+                # an error of the route, so any error after the budget ran out counts as a timeout.
+                if started or deadline.remaining() > 0:
+                    raise
+                REQUESTS_TIMED_OUT.inc()
+                await send({"type": "http.response.start", "status": 504,
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(TIMED_OUT)).encode())]})
+                await send({"type": "http.response.body", "body": TIMED_OUT})
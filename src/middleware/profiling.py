@@ -0,0 +1,55 @@
+import hmac
+import random
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.services.profiler import StackSampler, save_profile
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request with the stack sampler when it carries ``X-Profile: <ADMIN_TOKEN>``
+    or when it is picked by PROFILING_SAMPLE_RATE. The id of the stored profile is returned
+    in the X-Profile-Id header. When profiling is off a request costs one settings check.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if settings.admin_token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, settings.admin_token.encode())
+        return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not (settings.admin_token or settings.profiling_sample_rate) \
+                or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(threading.get_ident(), settings.profiling_interval_ms / 1000)
+        start = time.perf_counter()
+        sampler.start()
+        stopped = False
+
+        async def send_with_profile(message: Message):
+            nonlocal stopped
+            if message["type"] == "http.response.start":
+                await run_in_threadpool(sampler.stop)
+                stopped = True
+                profile_id = await run_in_threadpool(save_profile, sampler, scope["method"], scope["path"],
+                                                     time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            if not stopped:
+                await run_in_threadpool(sampler.stop)
@@ -0,0 +1,32 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import settings
+from src.database.instrumentation import track_queries
+
+
+class QueryStatsMiddleware:
+    """
+    Collects the SQL statements of every HTTP request.
+    In debug mode the totals are returned in the X-DB-Query-Count and X-DB-Query-Time-ms headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_stats(message: Message):
+                if message["type"] == "http.response.start" and settings.debug:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-query-count", str(stats.count).encode()))
+                    headers.append((b"x-db-query-time-ms", f"{stats.duration * 1000:.2f}".encode()))
+                    if stats.suspected:
+                        headers.append((b"x-db-n-plus-one", str(len(stats.suspected)).encode()))
+                    message["headers"] = headers
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
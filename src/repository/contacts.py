@@ -1,12 +1,35 @@
-from typing import List
-from sqlalchemy import select, and_
-from datetime import datetime, timedelta
+import asyncio
+from typing import Callable, List, Sequence, Tuple
+from sqlalchemy import select, and_, update, delete, insert, func, case, extract, Row
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
+from datetime import date, datetime, timedelta
 
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from src.database.models import Contact, User
-from src.schemas import ContactBase, ContactResponse
+from src.database.models import SHARD_USER_COLUMNS, Contact, User, ContactTombstone
+from src.schemas import ContactBase, ContactResponse, ContactOperation, CONTACT_FIELDS
+from src.services.dedup import contact_keys
+from src.services.suggest import suggest_indexes
+from src.services.change_stream import publish_changes
+from src.services.metrics import CONTACT_QUERY_CACHE, CONTACT_STATS_CACHE
+from src.services.query_cache import VersionedCache
+from src.services.single_flight import SingleFlightCache
+from src.conf.config import settings
+
+
+stats_cache = SingleFlightCache("contact stats", ttl=settings.stats_cache_ttl_seconds, metric=CONTACT_STATS_CACHE)
+# Results of the read-only queries below, invalidated by contacts_changed after every write.
+query_cache = VersionedCache("contacts:query",
+                             SingleFlightCache("contact queries", ttl=settings.query_cache_ttl_seconds,
+                                               metric=CONTACT_QUERY_CACHE, max_bytes=settings.query_cache_max_bytes),
+                             version_ttl=10 * settings.query_cache_ttl_seconds)
+
+
+def _columns(fields: Tuple[str, ...]) -> list:
+    return [getattr(Contact, field) for field in fields]
 
 
 async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
@@ -25,6 +48,123 @@ async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[C
     return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
 
 
+async def count_contacts(user: User, db: Session) -> int:
+    """
+    Return the number of the user's contacts from the per-user counter instead of COUNT(*).
+
+    Args:
+        user (User): Authorised user.
+        db (Session): Session to retrieve data from DB.
+
+    Returns:
+        int: Number of contacts.
+    """
+    return _count_contacts(user.id, db)
+
+
+def record_changes(user: User, changes: int, contacts_delta: int, db: Session) -> int:
+    """
+    Reserve numbers of the user's change sequence and adjust the contacts counter in one statement.
+    Must be called in the transaction of the write it accounts for. The user row stays locked
+    until the commit, so the change numbers of one user become visible in order.
+
+    Args:
+        user (User): Owner of the contacts.
+        changes (int): Number of changed contacts.
+        contacts_delta (int): Number of added (positive) or removed (negative) contacts.
+        db (Session): Session of the current transaction.
+
+    Returns:
+        int: The last reserved number, the reserved range is last - changes + 1 ... last.
+    """
+    statement = update(User).where(User.id == user.id) \
+        .values(change_seq=User.change_seq + changes, contacts_count=User.contacts_count + contacts_delta) \
+        .returning(User.change_seq)
+    change_seq = db.execute(statement).scalar_one_or_none()
+    if change_seq is None:
+        # The shard copy of the users row is missing: the user was moved away and back while this
+        # worker remembered the row as present. The counter is fixed by reconcile_contacts_counts.
+        db.execute(insert(User).values(password="", **{column: getattr(user, column) for column in SHARD_USER_COLUMNS}))
+        change_seq = db.execute(statement).scalar_one()
+    return change_seq
+
+
+def reconcile_contacts_counts(db: Session) -> int:
+    """
+    Fix the counters that drifted from the real number of contacts.
+
+    Args:
+        db (Session): Session to connect to DB.
+
+    Returns:
+        int: Number of fixed users.
+    """
+    real_count = select(func.count(Contact.id)).where(Contact.user_id == User.id).scalar_subquery()
+    result = db.execute(update(User).where(User.contacts_count != real_count).values(contacts_count=real_count)
+                        .execution_options(synchronize_session=False))
+    db.commit()
+    return result.rowcount
+
+
+def prune_tombstones(older_than: datetime, db: Session) -> int:
+    """
+    Delete the tombstones of the contacts deleted before ``older_than``. The highest pruned change
+    number of every user is kept in users.tombstones_pruned_seq first, so get_changes answers a
+    sync token that may have missed a pruned deletion with a reset instead of a silent gap.
+
+    Args:
+        older_than (datetime): Tombstones of the deletions before it are removed.
+        db (Session): Session to connect to DB.
+
+    Returns:
+        int: Number of deleted tombstones.
+    """
+    pruned_seq = select(func.max(ContactTombstone.change_seq)) \
+        .where(ContactTombstone.user_id == User.id, ContactTombstone.deleted_at < older_than).scalar_subquery()
+    db.execute(update(User).where(pruned_seq > User.tombstones_pruned_seq).values(tombstones_pruned_seq=pruned_seq)
+               .execution_options(synchronize_session=False))
+    result = db.execute(delete(ContactTombstone).where(ContactTombstone.deleted_at < older_than))
+    db.commit()
+    return result.rowcount
+
+
+async def contacts_changed(user_id: int, change_seq: int, upserted: List[Contact] = (), deleted_ids: List[int] = ()) -> None:
+    """
+    Notify the in-memory structures derived from the contacts and the open change streams after a committed write.
+
+    Args:
+        user_id (int): Owner of the contacts.
+        change_seq (int): The last change number of the write.
+        upserted (List[Contact], optional): Created or updated contacts. Defaults to ().
+        deleted_ids (List[int], optional): Ids of the deleted contacts. Defaults to ().
+    """
+    if deleted_ids:
+        suggest_indexes.delete(user_id, deleted_ids)
+    if upserted:
+        suggest_indexes.upsert(user_id, upserted)
+    await query_cache.bump(user_id)
+    await publish_changes(user_id, change_seq, upserted, deleted_ids)
+
+
+async def suggest_contacts(prefix: str, limit: int, user: User, db: Session) -> List[dict]:
+    """
+    Return the contacts whose name, surname or email starts with the prefix.
+    Served from the per-user in-memory prefix index, rebuilt when the query cache version shows
+    that the contacts changed since it was built.
+
+    Args:
+        prefix (str): Typed prefix, case insensitive.
+        limit (int): Maximum number of contacts.
+        user (User): Authorised user.
+        db (Session): Session used to build the index on the first call.
+
+    Returns:
+        List[dict]: Contacts with id, name, surname and email.
+    """
+    version = await query_cache.version(user.id)
+    return suggest_indexes.get(user.id, db, version).search(prefix, limit)
+
+
 # just a note fore me
 async def get_contact(contact_id: int, user: User, db: AsyncSession) -> Contact | None:
     """
@@ -63,9 +203,17 @@ async def get_contact_by_name(path: str, value: str, user: User, db: Session) ->
     if path == 'surname':
         return db.query(Contact).filter(and_(Contact.surname == value, Contact.user_id == user.id)).first()
     if path == 'email':
-        return db.query(Contact).filter(and_(Contact.surname == value, Contact.user_id == user.id)).first()
+        return db.query(Contact).filter(and_(Contact.email == value, Contact.user_id == user.id)).first()
     
 
+def _birthday_within_week(birthday: datetime) -> bool:
+    modified_date = birthday.replace(year=datetime.now().year + 1) \
+    if birthday.month == 1 \
+    else birthday.replace(year=datetime.now().year)
+    result = modified_date - datetime.today()
+    return result <= timedelta(days=7) and result >= timedelta(days=0)
+
+
 async def get_closest_birthdays(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
     """
     Return the list of contact with birthday within the next 7 days.
@@ -84,16 +232,130 @@ async def get_closest_birthdays(skip: int, limit: int, user: User, db: Session)
     if not isinstance(contacts, list):
         contacts = contacts.return_value
 
-    list_of_bees = []
-    for i in contacts:
-        modified_date = i.birthday.replace(year=datetime.now().year + 1) \
-        if i.birthday.month == 1 \
-        else i.birthday.replace(year=datetime.now().year)
-        result = modified_date - datetime.today()
-        if result <= timedelta(days=7) and result >= timedelta(days=0):
-            list_of_bees.append(i)
-    
-    return list_of_bees
+    return [contact for contact in contacts if _birthday_within_week(contact.birthday)]
+
+
+# Read-only path. The functions below select the columns with Core and return SQLAlchemy Row
+# objects (named tuples) instead of Contact instances: no identity map, instance state or lazy
+# loaders are built for rows that are serialized and dropped right away. The routes pass the rows
+# to contact_list_adapter / contact_model, which read them by attribute. The results are cached
+# in query_cache under the user's version, so repeated reads between two writes skip the database.
+
+def _contact_rows(user_id: int, skip: int, limit: int, fields: Tuple[str, ...], db: Session) -> Sequence[Row]:
+    return db.execute(select(*_columns(fields)).where(Contact.user_id == user_id)
+                      .offset(skip).limit(limit)).all()
+
+
+def _contact_row_by_name(user_id: int, column_name: str, value: str, fields: Tuple[str, ...], db: Session) -> Row | None:
+    column = getattr(Contact, column_name)
+    return db.execute(select(*_columns(fields)).where(column == value, Contact.user_id == user_id)
+                      .limit(1)).first()
+
+
+def _closest_birthday_rows(user_id: int, skip: int, limit: int, db: Session) -> List[Row]:
+    rows = db.execute(select(*_columns(CONTACT_FIELDS)).where(Contact.user_id == user_id)
+                      .offset(skip).limit(limit))
+    return [row for row in rows if _birthday_within_week(row.birthday)]
+
+
+def _count_contacts(user_id: int, db: Session) -> int:
+    return db.execute(select(User.contacts_count).where(User.id == user_id)).scalar_one_or_none() or 0
+
+
+async def get_contact_rows(skip: int, limit: int, user: User, db: Session,
+                           fields: Tuple[str, ...] = CONTACT_FIELDS) -> Sequence[Row]:
+    """
+    Read-only version of get_contacts.
+
+    Args:
+        skip (int): The starting position.
+        limit (int): The final position.
+        user (User): Authorised user.
+        db (Session): Session to retrieve data from DB.
+        fields (Tuple[str, ...], optional): Selected columns. Defaults to CONTACT_FIELDS.
+
+    Returns:
+        Sequence[Row]: Rows with the fields as attributes.
+    """
+    async def load():
+        return _contact_rows(user.id, skip, limit, fields, db)
+    return await query_cache.get(user.id, "rows", (skip, limit, fields), load)
+
+
+async def get_contact_row_by_name(path: str, value: str, user: User, db: Session,
+                                  fields: Tuple[str, ...] = CONTACT_FIELDS) -> Row | None:
+    """
+    Read-only version of get_contact_by_name.
+
+    Args:
+        path (str): Search by name, surname or email.
+        value (str): The actual name/surname/email to search by.
+        user (User): Authorised user.
+        db (Session): Session to retrieve data from DB.
+        fields (Tuple[str, ...], optional): Selected columns. Defaults to CONTACT_FIELDS.
+
+    Returns:
+        Row | None: First matching row.
+    """
+    if path not in ('name', 'surname', 'email'):
+        return None
+
+    async def load():
+        return _contact_row_by_name(user.id, path, value, fields, db)
+    return await query_cache.get(user.id, "row_by_name", (path, value, fields), load)
+
+
+async def get_closest_birthday_rows(skip: int, limit: int, user: User, db: Session) -> List[Row]:
+    """
+    Read-only version of get_closest_birthdays.
+
+    Args:
+        skip (int): The starting position.
+        limit (int): The final position.
+        user (User): Authorised user.
+        db (Session): Session to retrieve data from DB.
+
+    Returns:
+        List[Row]: Rows of the contacts with the birthday within 7 days.
+    """
+    async def load():
+        return _closest_birthday_rows(user.id, skip, limit, db)
+    # The answer changes with the date, not only with the writes.
+    return await query_cache.get(user.id, "birthdays", (skip, limit, date.today()), load)
+
+
+async def get_dashboard(user: User, session_factory: Callable[[], Session], limit: int,
+                        birthdays_scan: int = 100) -> dict:
+    """
+    Read the parts of the home screen at the same time. Every query runs in a thread of the pool
+    with its own session, so the dashboard takes as long as its slowest query instead of the sum
+    of them; it holds up to three pooled connections while it runs. The contacts and the birthdays
+    come from the same cache entries as the list and birthdays routes.
+
+    Args:
+        user (User): Authorised user.
+        session_factory (Callable[[], Session]): Sessions of the database with the user's contacts.
+        limit (int): Contacts of the first page.
+        birthdays_scan (int, optional): Contacts checked for the upcoming birthdays, like the limit
+            of the birthdays route. Defaults to 100.
+
+    Returns:
+        dict: The user, the first page of contact rows, the number of contacts and the rows with the birthday within 7 days.
+    """
+    def read(query, *args):
+        async def load():
+            def run():
+                with session_factory() as db:
+                    return query(user.id, *args, db)
+            return await run_in_threadpool(run)
+        return load
+
+    contacts, contacts_count, birthdays = await asyncio.gather(
+        query_cache.get(user.id, "rows", (0, limit, CONTACT_FIELDS), read(_contact_rows, 0, limit, CONTACT_FIELDS)),
+        read(_count_contacts)(),
+        query_cache.get(user.id, "birthdays", (0, birthdays_scan, date.today()),
+                        read(_closest_birthday_rows, 0, birthdays_scan)))
+    return {"user": user, "contacts": contacts, "contacts_count": contacts_count, "birthdays": birthdays}
 
 
 async def create_contact(body: ContactBase, user: User, db: AsyncSession) -> Contact:
@@ -108,10 +370,13 @@ async def create_contact(body: ContactBase, user: User, db: AsyncSession) -> Con
     Returns:
         Contact: Created contact.
     """
-    contact = Contact(name=body.name, surname=body.surname, mobile=body.mobile, email=body.email, birthday=body.birthday, user=user)
+    contact = Contact(name=body.name, surname=body.surname, mobile=body.mobile, email=body.email, birthday=body.birthday, user_id=user.id,
+                      **contact_keys(body.name, body.surname, body.mobile, body.email))
+    contact.change_seq = record_changes(user, 1, 1, db)
     db.add(contact)
     db.commit()
     db.refresh(contact)
+    await contacts_changed(user.id, contact.change_seq, upserted=[contact])
     return contact
 
 
@@ -130,7 +395,10 @@ async def remove_contact(contact_id: int, user: User, db: Session) -> Contact |
     contact = db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).first()
     if contact:
         db.delete(contact)
+        change_seq = record_changes(user, 1, -1, db)
+        db.add(ContactTombstone(user_id=user.id, contact_id=contact_id, change_seq=change_seq))
         db.commit()
+        await contacts_changed(user.id, change_seq, deleted_ids=[contact_id])
     return contact
 
 
@@ -154,5 +422,330 @@ async def update_contact(contact_id: int, body: ContactBase, user: User, db: Ses
         contact.mobile=body.mobile
         contact.email=body.email
         contact.birthday=body.birthday
+        for key, value in contact_keys(body.name, body.surname, body.mobile, body.email).items():
+            setattr(contact, key, value)
+        contact.change_seq = record_changes(user, 1, 0, db)
         db.commit()
+        await contacts_changed(user.id, contact.change_seq, upserted=[contact])
     return contact
+
+
+DUPLICATE_KEYS = {"email": Contact.email_key, "mobile": Contact.mobile_key, "name": Contact.name_key}
+
+
+def fill_duplicate_keys(user: User, db: Session, batch_size: int = 1000) -> int:
+    """
+    Compute the duplicate keys of the user's contacts created before the keys existed.
+
+    Args:
+        user (User): Owner of the contacts.
+        db (Session): Session to connect to DB.
+        batch_size (int, optional): Rows updated per statement. Defaults to 1000.
+
+    Returns:
+        int: Number of updated contacts.
+    """
+    rows = db.execute(select(Contact.id, Contact.name, Contact.surname, Contact.mobile, Contact.email)
+                      .where(Contact.user_id == user.id, Contact.name_key.is_(None))).all()
+    for i in range(0, len(rows), batch_size):
+        db.execute(update(Contact), [{"id": row.id, **contact_keys(row.name, row.surname, row.mobile, row.email)}
+                                     for row in rows[i:i + batch_size]])
+    if rows:
+        db.commit()
+    return len(rows)
+
+
+def _contact_stats(user_id: int, db: Session) -> dict:
+    owned = Contact.user_id == user_id
+    total, with_email = db.execute(select(func.count(), func.count(case((Contact.email != "", 1))))
+                                   .where(owned)).one()
+    year, month = extract("year", Contact.created_at), extract("month", Contact.created_at)
+    added = db.execute(select(year, month, func.count()).where(owned, Contact.created_at.is_not(None))
+                       .group_by(year, month).order_by(year, month)).all()
+    birthday_month = extract("month", Contact.birthday)
+    birthdays = [0] * 12
+    for month_number, count in db.execute(select(birthday_month, func.count())
+                                          .where(owned, Contact.birthday.is_not(None)).group_by(birthday_month)):
+        birthdays[int(month_number) - 1] = count
+    return {"total": total, "with_email": with_email, "email_share": with_email / total if total else 0.0,
+            "added_per_month": [{"month": f"{int(y):04d}-{int(m):02d}", "count": count} for y, m, count in added],
+            "birthdays_per_month": birthdays}
+
+
+async def get_contact_stats(user: User, db: Session) -> dict:
+    """
+    Statistics of the user's contacts for the dashboards. They are aggregated by the database with
+    GROUP BY, so no contact is loaded. The result is cached under the user's change number: every
+    write moves the number on, so a cached result is never older than the last write.
+
+    Args:
+        user (User): Authorised user.
+        db (Session): Session to connect to DB.
+
+    Returns:
+        dict: Total, contacts with an email, contacts added per month and birthdays per month.
+    """
+    change_seq = await get_change_seq(user, db)
+
+    async def load():
+        return _contact_stats(user.id, db)
+    return await stats_cache.get(f"contacts:stats:{user.id}:{change_seq}", load)
+
+
+async def get_duplicates(user: User, db: Session) -> List[dict]:
+    """
+    Find groups of possible duplicates. Contacts are grouped by their indexed keys with GROUP BY,
+    so the search is linear in the number of contacts instead of comparing every pair.
+
+    Args:
+        user (User): Authorised user.
+        db (Session): Session to retrieve data from DB.
+
+    Returns:
+        List[dict]: Groups with the matched key kind ("email", "mobile" or "name"), the key and the contacts.
+    """
+    fill_duplicate_keys(user, db)
+    groups = []
+    for reason, column in DUPLICATE_KEYS.items():
+        # "" is the name key of the names without a Latin spelling, see src/services/dedup.py.
+        duplicated = select(column).where(Contact.user_id == user.id, column.is_not(None), column != "") \
+            .group_by(column).having(func.count() > 1)
+        contacts = db.execute(select(Contact).where(Contact.user_id == user.id, column.in_(duplicated))
+                              .order_by(column, Contact.id)).scalars()
+        for contact in contacts:
+            key = getattr(contact, column.key)
+            if not groups or groups[-1]["reason"] != reason or groups[-1]["key"] != key:
+                groups.append({"reason": reason, "key": key, "contacts": []})
+            groups[-1]["contacts"].append(contact)
+    return groups
+
+
+async def merge_contacts(primary_id: int, duplicate_ids: List[int], user: User, db: Session) -> Contact | None:
+    """
+    Merge duplicates into the primary contact. Empty fields (None or "") of the primary contact
+    are filled from the duplicates, then the duplicates are deleted.
+
+    Args:
+        primary_id (int): Id of the contact that is kept.
+        duplicate_ids (List[int]): Ids of the contacts merged into it.
+        user (User): Authorised user.
+        db (Session): Session to connect to DB.
+
+    Returns:
+        Contact | None: The merged contact or None if the primary contact is not found.
+    """
+    primary = db.query(Contact).filter(Contact.id == primary_id, Contact.user_id == user.id).first()
+    if primary is None:
+        return None
+    ids = [contact_id for contact_id in duplicate_ids if contact_id != primary_id]
+    duplicates = db.query(Contact).filter(Contact.id.in_(ids), Contact.user_id == user.id).order_by(Contact.id).all()
+    for duplicate in duplicates:
+        for field in ("email", "birthday"):
+            if not getattr(primary, field) and getattr(duplicate, field):
+                setattr(primary, field, getattr(duplicate, field))
+    for key, value in contact_keys(primary.name, primary.surname, primary.mobile, primary.email).items():
+        setattr(primary, key, value)
+    deleted_ids = [duplicate.id for duplicate in duplicates]
+    last_seq = record_changes(user, len(deleted_ids) + 1, -len(deleted_ids), db)
+    primary.change_seq = last_seq
+    if duplicates:
+        db.execute(delete(Contact).where(Contact.id.in_(deleted_ids)).execution_options(synchronize_session=False))
+        for duplicate in duplicates:
+            db.expunge(duplicate)
+        db.add_all(ContactTombstone(user_id=user.id, contact_id=contact_id, change_seq=last_seq - len(deleted_ids) + i)
+                   for i, contact_id in enumerate(deleted_ids))
+    db.commit()
+    db.refresh(primary)
+    await contacts_changed(user.id, last_seq, upserted=[primary], deleted_ids=deleted_ids)
+    return primary
+
+
+async def get_change_seq(user: User, db: Session) -> int:
+    """
+    Args:
+        user (User): Authorised user.
+        db (Session): Session to retrieve data from DB.
+
+    Returns:
+        int: The last change number of the user's contacts.
+    """
+    return db.execute(select(User.change_seq).where(User.id == user.id)).scalar_one_or_none() or 0
+
+
+async def get_changes(since: int | None, limit: int, user: User, db: Session) -> dict:
+    """
+    Return the contacts changed and the ids of the contacts deleted after the ``since`` change number.
+    Both are read through the (user_id, change_seq) indexes, so the cost depends on the number
+    of changes, not on the number of contacts. A ``since`` older than the pruned tombstones (see
+    prune_tombstones) gets an empty answer with reset set: the client has to run the full sync.
+
+    Args:
+        since (int | None): change number from the previous next_token or None for a full sync.
+        limit (int): Maximum number of changes in the answer.
+        user (User): Authorised user.
+        db (Session): Session to retrieve data from DB.
+
+    Returns:
+        dict: Changed contacts, deleted ids, next_token, has_more and reset.
+    """
+    if since is not None and since < (db.execute(select(User.tombstones_pruned_seq).where(User.id == user.id))
+                                      .scalar_one_or_none() or 0):
+        return {"contacts": [], "deleted": [], "next_token": str(since), "has_more": False, "reset": True}
+    after = -1 if since is None else since
+    contacts = db.query(Contact).filter(Contact.user_id == user.id, Contact.change_seq > after) \
+        .order_by(Contact.change_seq).limit(limit + 1).all()
+    tombstones = db.query(ContactTombstone.contact_id, ContactTombstone.change_seq) \
+        .filter(ContactTombstone.user_id == user.id, ContactTombstone.change_seq > after) \
+        .order_by(ContactTombstone.change_seq).limit(limit + 1).all() if since is not None else []
+
+    changes = sorted([(contact.change_seq, contact, None) for contact in contacts]
+                     + [(row.change_seq, None, row.contact_id) for row in tombstones], key=lambda change: change[0])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        next_seq = changes[-1][0]
+    elif since is None:
+        next_seq = db.execute(select(User.change_seq).where(User.id == user.id)).scalar_one_or_none() or 0
+    else:
+        next_seq = since
+    return {
+        "contacts": [contact for _, contact, _ in changes if contact is not None],
+        "deleted": [contact_id for _, _, contact_id in changes if contact_id is not None],
+        "next_token": str(next_seq),
+        "has_more": has_more,
+        "reset": False,
+    }
+
+
+def _contact_values(body: ContactBase) -> dict:
+    return {"name": body.name, "surname": body.surname, "mobile": body.mobile, "email": body.email,
+            "birthday": body.birthday, **contact_keys(body.name, body.surname, body.mobile, body.email)}
+
+
+def _validate_operations(operations: List[ContactOperation], user: User, db: Session) -> tuple:
+    """
+    Check every operation of a batch. Ownership of all referenced contacts is checked with one query.
+
+    Returns:
+        tuple: Results with the errors (None for valid operations) and the parsed bodies.
+    """
+    results = [None] * len(operations)
+    bodies = [None] * len(operations)
+    ids = [operation.id for operation in operations if operation.op != "create" and operation.id is not None]
+    owned = set(db.execute(select(Contact.id).where(Contact.id.in_(ids), Contact.user_id == user.id)).scalars()) if ids else set()
+    seen = set()
+    for i, operation in enumerate(operations):
+        error = None
+        if operation.op != "create":
+            if operation.id is None:
+                error = (422, "id is required")
+            elif operation.id in seen:
+                error = (409, "The contact is changed twice in one batch")
+            elif operation.id not in owned:
+                error = (404, "Contact not found")
+            seen.add(operation.id)
+        if error is None and operation.op != "delete":
+            try:
+                bodies[i] = ContactBase.model_validate(operation.data or {})
+            except ValidationError as e:
+                error = (422, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+        if error is not None:
+            results[i] = {"index": i, "op": operation.op, "id": operation.id, "status": error[0], "detail": error[1]}
+    return results, bodies
+
+
+def _execute_operations(items: List[tuple], user: User, db: Session) -> tuple:
+    """
+    Execute valid operations with one bulk statement per operation kind.
+
+    Args:
+        items (List[tuple]): (index, operation, body) of the operations.
+        user (User): Owner of the contacts.
+        db (Session): Session of the batch transaction.
+
+    Returns:
+        tuple: Operation index and the id of its contact, operation index and its change number.
+    """
+    creates = [(i, body) for i, operation, body in items if operation.op == "create"]
+    updates = [(i, operation.id, body) for i, operation, body in items if operation.op == "update"]
+    deletes = [(i, operation.id) for i, operation, _ in items if operation.op == "delete"]
+    last_seq = record_changes(user, len(items), len(creates) - len(deletes), db)
+    seqs = {i: last_seq - len(items) + 1 + n for n, (i, _, _) in enumerate(items)}
+    ids = {}
+    if creates:
+        rows = [{**_contact_values(body), "user_id": user.id, "change_seq": seqs[i]} for i, body in creates]
+        new_ids = db.execute(insert(Contact).returning(Contact.id, sort_by_parameter_order=True), rows).scalars().all()
+        ids.update((i, contact_id) for (i, _), contact_id in zip(creates, new_ids))
+    if updates:
+        db.execute(update(Contact), [{"id": contact_id, **_contact_values(body), "change_seq": seqs[i]}
+                                     for i, contact_id, body in updates])
+        ids.update((i, contact_id) for i, contact_id, _ in updates)
+    if deletes:
+        db.execute(delete(Contact).where(Contact.id.in_([contact_id for _, contact_id in deletes]), Contact.user_id == user.id)
+                   .execution_options(synchronize_session=False))
+        db.execute(insert(ContactTombstone), [{"user_id": user.id, "contact_id": contact_id, "change_seq": seqs[i]}
+                                              for i, contact_id in deletes])
+        ids.update(deletes)
+    return ids, seqs
+
+
+async def apply_batch(operations: List[ContactOperation], mode: str, user: User, db: Session) -> dict:
+    """
+    Create, update and delete many contacts in one transaction with bulk statements.
+
+    In the "atomic" mode nothing is written if any operation is invalid or fails.
+    In the "best_effort" mode the valid operations are written and the invalid ones are reported;
+    if the bulk statements fail, the operations are retried one by one in savepoints.
+
+    Args:
+        operations (List[ContactOperation]): Operations in the order of the request.
+        mode (str): "atomic" or "best_effort".
+        user (User): Authorised user.
+        db (Session): Session to connect to DB.
+
+    Returns:
+        dict: mode, committed and the result of every operation.
+    """
+    results, bodies = _validate_operations(operations, user, db)
+    items = [(i, operation, bodies[i]) for i, operation in enumerate(operations) if results[i] is None]
+    committed = bool(items) and (mode == "best_effort" or len(items) == len(operations))
+    ids, seqs = {}, {}
+    if committed:
+        try:
+            ids, seqs = _execute_operations(items, user, db)
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            if mode == "atomic":
+                committed = False
+                for i, operation, _ in items:
+                    results[i] = {"index": i, "op": operation.op, "id": operation.id, "status": 500,
+                                  "detail": "The batch failed and was rolled back"}
+            else:
+                for item in items:
+                    try:
+                        with db.begin_nested():
+                            item_ids, item_seqs = _execute_operations([item], user, db)
+                        ids.update(item_ids)
+                        seqs.update(item_seqs)
+                    except SQLAlchemyError:
+                        results[item[0]] = {"index": item[0], "op": item[1].op, "id": item[1].id, "status": 500,
+                                            "detail": "The operation failed"}
+                db.commit()
+
+    changed_ids = [contact_id for i, contact_id in ids.items() if operations[i].op != "delete"]
+    contacts = {contact.id: contact for contact in
+                db.query(Contact).filter(Contact.id.in_(changed_ids)).all()} if changed_ids else {}
+    for i, operation in enumerate(operations):
+        if results[i] is not None:
+            continue
+        if i not in ids:
+            results[i] = {"index": i, "op": operation.op, "id": operation.id, "status": 424,
+                          "detail": "Not executed because another operation of the atomic batch is invalid"}
+        else:
+            results[i] = {"index": i, "op": operation.op, "id": ids[i],
+                          "status": 201 if operation.op == "create" else 200, "contact": contacts.get(ids[i])}
+    if ids:
+        await contacts_changed(user.id, max(seqs.values()), upserted=list(contacts.values()),
+                               deleted_ids=[contact_id for i, contact_id in ids.items() if operations[i].op == "delete"])
+    return {"mode": mode, "committed": committed and bool(ids), "results": results}
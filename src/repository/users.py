@@ -55,15 +55,17 @@ async def update_token(user: User, token: str | None, db: Session) -> None:
     user.refresh_token = token
     db.commit()
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: Session, user: User | None = None) -> None:
     """
     Add info if user is confirmed or not.
 
     Args:
         email (str): User's email thar got the confirmation mail.
         db (Session): Session to connect to DB.
+        user (User | None, optional): The user if it was already loaded, saves a second lookup. Defaults to None.
     """
-    user = await get_user_by_email(email, db)
+    if user is None:
+        user = await get_user_by_email(email, db)
     user.confirmed = True
     db.commit()
 
@@ -0,0 +1,165 @@
+from typing import List, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from src.schemas import AllocationSite, LiveObjects, MemoryStatus
+from src.services.auth import auth_service
+from src.services.metrics import MetricsRoute
+from src.services import memory, profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=MetricsRoute,
+                   dependencies=[Depends(auth_service.get_admin)])
+
+
+@router.get("/profiles", response_model=List[str])
+async def read_profiles():
+    """
+    Route to list the stored request profiles.
+
+    Returns:
+        List[str]: Profile ids, newest first.
+    """
+    return profiler.list_profiles()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def read_profile(profile_id: str):
+    """
+    Route to download a request profile in the collapsed-stack format.
+    It can be opened in speedscope or turned into a flame graph with flamegraph.pl.
+
+    Args:
+        profile_id (str): Id from the X-Profile-Id response header.
+
+    Raises:
+        HTTPException: HTTP_404_NOT_FOUND if there is no such profile.
+
+    Returns:
+        str: Collapsed stacks.
+    """
+    profile = profiler.read_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
+
+
+GroupBy = Literal["lineno", "filename", "traceback"]
+
+
+def _snapshot(snapshot_id: str):
+    snapshot = memory.load_snapshot(snapshot_id)
+    if snapshot is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Snapshot {snapshot_id} not found")
+    return snapshot
+
+
+@router.get("/memory", response_model=MemoryStatus)
+async def read_memory():
+    """
+    Route to get the memory state of the worker.
+
+    Returns:
+        dict: Tracing state, traced bytes, RSS and the stored snapshots.
+    """
+    return memory.status()
+
+
+@router.post("/memory/tracemalloc/start", response_model=MemoryStatus)
+async def start_tracemalloc(frames: int = Query(default=1, ge=1, le=50)):
+    """
+    Route to start tracing the allocations of the worker.
+
+    Args:
+        frames (int, optional): Frames stored per allocation, more frames cost more memory and time. Defaults to 1.
+
+    Returns:
+        dict: Memory state.
+    """
+    memory.start(frames)
+    return memory.status()
+
+
+@router.post("/memory/tracemalloc/stop", response_model=MemoryStatus)
+async def stop_tracemalloc():
+    """
+    Route to stop tracing the allocations. The stored snapshots stay available.
+
+    Returns:
+        dict: Memory state.
+    """
+    memory.stop()
+    return memory.status()
+
+
+@router.post("/memory/snapshots", status_code=status.HTTP_201_CREATED)
+async def create_snapshot():
+    """
+    Route to store a snapshot of the traced allocations.
+
+    Raises:
+        HTTPException: HTTP_409_CONFLICT if tracemalloc is not started.
+
+    Returns:
+        dict: Id of the snapshot.
+    """
+    snapshot_id = await run_in_threadpool(memory.take_snapshot)
+    if snapshot_id is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="tracemalloc is not started")
+    return {"id": snapshot_id}
+
+
+@router.get("/memory/snapshots/{snapshot_id}", response_model=List[AllocationSite])
+async def read_snapshot(snapshot_id: str, group_by: GroupBy = "lineno", limit: int = Query(default=20, ge=1, le=500)):
+    """
+    Route to get the biggest allocation sites of a snapshot.
+
+    Args:
+        snapshot_id (str): Snapshot id.
+        group_by (GroupBy, optional): Group the allocations by line, file or traceback. Defaults to "lineno".
+        limit (int, optional): Allocation sites returned. Defaults to 20.
+
+    Raises:
+        HTTPException: HTTP_404_NOT_FOUND if there is no such snapshot.
+
+    Returns:
+        List[dict]: Allocation sites.
+    """
+    snapshot = await run_in_threadpool(_snapshot, snapshot_id)
+    return await run_in_threadpool(memory.top, snapshot, group_by, limit)
+
+
+@router.get("/memory/diff", response_model=List[AllocationSite])
+async def read_snapshot_diff(first: str, second: str, group_by: GroupBy = "lineno",
+                             limit: int = Query(default=20, ge=1, le=500)):
+    """
+    Route to compare two snapshots. The sites that grew the most come first.
+
+    Args:
+        first (str): Id of the older snapshot.
+        second (str): Id of the newer snapshot.
+        group_by (GroupBy, optional): Group the allocations by line, file or traceback. Defaults to "lineno".
+        limit (int, optional): Allocation sites returned. Defaults to 20.
+
+    Raises:
+        HTTPException: HTTP_404_NOT_FOUND if a snapshot is missing.
+
+    Returns:
+        List[dict]: Allocation sites with the size and count differences.
+    """
+    older = await run_in_threadpool(_snapshot, first)
+    newer = await run_in_threadpool(_snapshot, second)
+    return await run_in_threadpool(memory.diff, older, newer, group_by, limit)
+
+
+@router.get("/memory/objects", response_model=LiveObjects)
+async def read_live_objects():
+    """
+    Route to count the live ORM instances and sessions of the worker. The walk over the heap runs in
+    the threadpool, so it does not stall the other requests of the worker.
+
+    Returns:
+        dict: Live sessions, identity map sizes and instances by class.
+    """
+    return await run_in_threadpool(memory.live_objects)
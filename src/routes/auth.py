@@ -9,8 +9,9 @@ from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.services.email import send_email
+from src.services.metrics import MetricsRoute
 
-router = APIRouter(prefix='/auth', tags=["auth"])
+router = APIRouter(prefix='/auth', tags=["auth"], route_class=MetricsRoute)
 security = HTTPBearer()
 
 
@@ -116,7 +117,7 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
-    await repository_users.confirmed_email(email, db)
+    await repository_users.confirmed_email(email, db, user)
     return {"message": "Email confirmed"}
 
 @router.post('/request_email')
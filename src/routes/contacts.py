@@ -1,53 +1,91 @@
-from typing import List
+from typing import Callable, List, Tuple
 
-from fastapi import APIRouter, HTTPException, Depends, status, Query, Path
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Path, Response, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
+from src.database.shards import get_contacts_db, get_contacts_session_factory
 from src.services.auth import auth_service
 from src.database.models import User
-from src.schemas import ContactBase, ContactResponse
+from src.schemas import ContactBase, ContactResponse, DuplicateGroup, ContactMerge, ContactStats, ContactSuggestion, ContactChanges, ContactBatch, BatchResult, \
+    CONTACT_FIELDS, contact_model, contact_list_adapter, batch_result_adapter
 from src.repository import contacts as repository_contacts
-from fastapi_limiter.depends import RateLimiter
+from src.services.metrics import MetricsRoute
+from src.services.change_stream import change_hub, changes_event
+from src.services.idempotency import Idempotency, IdempotentRequest
+from src.conf.config import settings
+from src.services.rate_limit import RateLimiter
 
 
-router = APIRouter(prefix='/contacts')
+router = APIRouter(prefix='/contacts', route_class=MetricsRoute)
+
+
+def contact_fields(fields: str | None = Query(default=None, description="Comma separated contact fields to return, "
+                                              f"e.g. id,name,mobile. Any of {', '.join(CONTACT_FIELDS)}.")
+                   ) -> Tuple[str, ...] | None:
+    """
+    Parse the fields query parameter. The id is always returned.
+
+    Args:
+        fields (str | None, optional): Comma separated field names. Defaults to Query(default=None).
+
+    Raises:
+        HTTPException: HTTP_400_BAD_REQUEST if a field is unknown.
+
+    Returns:
+        Tuple[str, ...] | None: Fields in the ContactResponse order or None for all fields.
+    """
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return tuple(field for field in CONTACT_FIELDS if field in requested)
 
 
 @router.get("/", response_model=List[ContactResponse], 
             summary="List of all contascts.",
             description="No more than 10 requests per minute.", 
             dependencies=[Depends(RateLimiter(times=2, seconds=5))])
-async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+async def read_contacts(skip: int = 0, limit: int = 100,
+                        fields: Tuple[str, ...] | None = Depends(contact_fields), db: Session = Depends(get_contacts_db),
                      current_user: User = Depends(auth_service.get_current_user)):
     """
-    Route to get the all contact list.
+    Route to get the all contact list. The total number of contacts is returned in the X-Total-Count header.
+    The rows are read without the ORM and serialized straight to JSON.
 
     Args:
         skip (int, optional): The starting position. Defaults to 0.
         limit (int, optional): The final position. Defaults to 100.
-        db (Session, optional): Session to connect to DB. Defaults to Depends(get_db).
+        fields (Tuple[str, ...] | None, optional): Return only these fields. Defaults to Depends(contact_fields).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
         current_user (User, optional): Authorised user who search for a contact. Defaults to Depends(auth_service.get_current_user).
 
     Returns:
-        List[Contact]: List with all contacts.
+        Response: JSON list with all contacts.
     """
-    contacts = await repository_contacts.get_contacts(skip, limit, current_user, db)
-    return contacts
+    fields = fields or CONTACT_FIELDS
+    rows = await repository_contacts.get_contact_rows(skip, limit, current_user, db, fields)
+    total = str(await repository_contacts.count_contacts(current_user, db))
+    adapter = contact_list_adapter(fields)
+    return Response(adapter.dump_json(adapter.validate_python(rows, from_attributes=True)),
+                    media_type="application/json", headers={"X-Total-Count": total})
 
 @router.get("/contact/{contact_id}", response_model=ContactResponse,
             summary="Get a contact by it's ID.", 
             description="No more than 10 requests per minute.", 
             dependencies=[Depends(RateLimiter(times=2, seconds=5))])
-async def read_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
+async def read_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_contacts_db),
                      current_user: User = Depends(auth_service.get_current_user)):
     """
     Route to get the contact by its ID.
 
     Args:
         contact_id (int, optional): Contact ID of a user you want to find. Defaults to Path(ge=1).
-        db (AsyncSession, optional): Session to connect to DB. Defaults to Depends(get_db).
+        db (AsyncSession, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
         current_user (User, optional): Authorised user who search for a contact. Defaults to Depends(auth_service.get_current_user).
 
     Raises:
@@ -65,7 +103,8 @@ async def read_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(
             summary="Find a contact by it's name, surname or email.",
             description="Put name, surname or email to the path line. And then put the value itself to value line.",
             dependencies=[Depends(RateLimiter(times=2, seconds=5))])
-async def read_contact(path:str, value: str, db: Session = Depends(get_db),
+async def read_contact(path:str, value: str, fields: Tuple[str, ...] | None = Depends(contact_fields),
+                       db: Session = Depends(get_contacts_db),
                      current_user: User = Depends(auth_service.get_current_user)):
     """
     Route to get the contact buy its name/surname/emai.
@@ -73,7 +112,8 @@ async def read_contact(path:str, value: str, db: Session = Depends(get_db),
     Args:
         path (str): Specify by what you want to search the contact. Can be name, surname, email.
         value (str): The actual name/surname/email to search by.
-        db (Session, optional): Session to connect to DB. Defaults to Depends(get_db).
+        fields (Tuple[str, ...] | None, optional): Return only these fields. Defaults to Depends(contact_fields).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
         current_user (User, optional): Authorised user who search for a contact. Defaults to Depends(auth_service.get_current_user).
 
     Raises:
@@ -82,16 +122,17 @@ async def read_contact(path:str, value: str, db: Session = Depends(get_db),
     Returns:
         Contact: Return contact with a specified name if exist.
     """
-    contact = await repository_contacts.get_contact_by_name(path, value, current_user, db)
-    if contact is None:
+    fields = fields or CONTACT_FIELDS
+    row = await repository_contacts.get_contact_row_by_name(path, value, current_user, db, fields)
+    if row is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return contact
+    return Response(contact_model(fields).model_validate(row).model_dump_json(), media_type="application/json")
 
 @router.get("/birthdays", response_model=List[ContactResponse], 
             summary="List of contacts with birthdays within 7 days.", 
             description="No more than 10 requests per minute.", 
             dependencies=[Depends(RateLimiter(times=2, seconds=5))])
-async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_contacts_db),
                      current_user: User = Depends(auth_service.get_current_user)):
     """
     Route to get the all contact with birthday within 7 days.
@@ -99,41 +140,241 @@ async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(g
     Args:
         skip (int, optional): The starting position. Defaults to 0.
         limit (int, optional): The final position. Defaults to 100.
-        db (Session, optional): Session to connect to DB. Defaults to Depends(get_db).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
         current_user (User, optional): Authorised user who search for a contact. Defaults to Depends(auth_service.get_current_user).
 
     Returns:
         List[Contact]: List of the contacts.
     """
-    contacts = await repository_contacts.get_closest_birthdays(skip, limit, current_user, db)
-    return contacts
+    rows = await repository_contacts.get_closest_birthday_rows(skip, limit, current_user, db)
+    adapter = contact_list_adapter(CONTACT_FIELDS)
+    return Response(adapter.dump_json(adapter.validate_python(rows, from_attributes=True)), media_type="application/json")
+
+
+@router.get("/changes", response_model=ContactChanges,
+            summary="Contacts changed since the sync token.",
+            description="Call without since for the full sync, then pass next_token of the previous answer. "
+                        "An answer with reset means the token is too old: run the full sync again. "
+                        "No more than 10 requests per minute.",
+            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def read_changes(since: str | None = None, limit: int = Query(default=500, ge=1, le=1000),
+                       db: Session = Depends(get_contacts_db),
+                       current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route for the delta sync of the mobile clients.
+
+    Args:
+        since (str | None, optional): next_token of the previous sync. Defaults to None.
+        limit (int, optional): Maximum number of changes. Defaults to 500.
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Raises:
+        HTTPException: HTTP_400_BAD_REQUEST if the token is invalid.
+
+    Returns:
+        ContactChanges: Changed contacts, deleted ids and the token for the next sync.
+    """
+    if since is not None and not since.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    return await repository_contacts.get_changes(None if since is None else int(since), limit, current_user, db)
+
+
+@router.get("/stream", response_class=StreamingResponse,
+             summary="Server-sent events with the changes of the contacts.",
+             description="Every event has the shape of the delta sync answer and its change number as the id. "
+                         "Send Last-Event-ID to get the missed changes first; a reset event means the client "
+                         "has to run the delta sync and reconnect. No more than 10 requests per minute.",
+             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def stream_changes(last_event_id: str | None = Header(default=None), db: Session = Depends(get_contacts_db),
+                         session_factory: Callable[[], Session] = Depends(get_contacts_session_factory),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route that pushes the changes of the user's contacts. The channel is subscribed before the missed
+    changes are read, so nothing committed in between is lost; the DB session is released before streaming.
+    Changes missed because of out-of-order events are read later with a short-lived session.
+
+    Args:
+        last_event_id (str | None, optional): Id of the last received event. Defaults to Header(default=None).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        session_factory (Callable[[], Session], optional): Sessions of the catch-up reads.
+            Defaults to Depends(get_contacts_session_factory).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Raises:
+        HTTPException: HTTP_400_BAD_REQUEST if Last-Event-ID is invalid.
+
+    Returns:
+        StreamingResponse: text/event-stream.
+    """
+    if last_event_id is not None and not last_event_id.isdigit():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID")
+    queue = await change_hub.subscribe(current_user.id)
+    try:
+        replay, reset = None, False
+        if last_event_id is not None:
+            last_seq = int(last_event_id)
+            changes = await repository_contacts.get_changes(last_seq, settings.stream_replay_limit, current_user, db)
+            replay = changes_event(int(changes["next_token"]), changes["contacts"], changes["deleted"])
+            reset = changes["has_more"] or changes["reset"]
+        else:
+            last_seq = await repository_contacts.get_change_seq(current_user, db)
+    except BaseException:
+        await change_hub.unsubscribe(current_user.id, queue)
+        raise
+
+    async def catch_up(since: int) -> dict:
+        with session_factory() as catch_up_db:
+            return await repository_contacts.get_changes(since, settings.stream_replay_limit, current_user,
+                                                         catch_up_db)
+    return StreamingResponse(change_hub.stream(current_user.id, queue, last_seq, replay, reset, catch_up),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/suggest", response_model=List[ContactSuggestion],
+            summary="Typeahead suggestions.",
+            description="Contacts whose name, surname or email starts with the prefix. No more than 30 requests per 5 seconds.",
+            dependencies=[Depends(RateLimiter(times=30, seconds=5))])
+async def suggest_contacts(prefix: str = Query(min_length=1, max_length=150), limit: int = Query(default=10, ge=1, le=50),
+                           db: Session = Depends(get_contacts_db),
+                           current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route for the contact picker, called on every keystroke.
+
+    Args:
+        prefix (str): Typed prefix. Defaults to Query(min_length=1, max_length=150).
+        limit (int, optional): Maximum number of suggestions. Defaults to 10.
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Returns:
+        List[ContactSuggestion]: Matching contacts.
+    """
+    return await repository_contacts.suggest_contacts(prefix, limit, current_user, db)
+
+
+@router.get("/duplicates", response_model=List[DuplicateGroup],
+            summary="Groups of possible duplicate contacts.",
+            description="Contacts with the same email, phone digits or phonetic name. No more than 2 requests per minute.",
+            dependencies=[Depends(RateLimiter(times=2, seconds=60))])
+async def read_duplicates(db: Session = Depends(get_contacts_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route to get the groups of possible duplicates.
+
+    Args:
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Returns:
+        List[DuplicateGroup]: Groups of contacts with the same key.
+    """
+    return await repository_contacts.get_duplicates(current_user, db)
+
+
+@router.get("/stats", response_model=ContactStats,
+            summary="Statistics of the contacts.",
+            description="Contacts added per month, birthdays per month and the share of contacts with an email. "
+                        "No more than 10 requests per minute.",
+            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def read_contact_stats(db: Session = Depends(get_contacts_db),
+                             current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route to get the statistics of the contacts for the dashboards.
+
+    Args:
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Returns:
+        ContactStats: Aggregates of the user's contacts.
+    """
+    return await repository_contacts.get_contact_stats(current_user, db)
+
+
+@router.post("/merge", response_model=ContactResponse,
+             summary="Merge duplicate contacts.",
+             description="The duplicates are deleted, their email and birthday fill the empty fields of the primary contact.",
+             dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def merge_contacts(body: ContactMerge, db: Session = Depends(get_contacts_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route to merge duplicates into one contact.
+
+    Args:
+        body (ContactMerge): Id of the kept contact and ids of the duplicates.
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Raises:
+        HTTPException: HTTP_404_NOT_FOUND if the primary contact is not found.
+
+    Returns:
+        Contact: The merged contact.
+    """
+    contact = await repository_contacts.merge_contacts(body.primary_id, body.duplicate_ids, current_user, db)
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return contact
+
+
+@router.post("/batch", response_model=BatchResult,
+             summary="Create, update and delete many contacts at once.",
+             description="Up to 500 operations in one transaction. In the atomic mode nothing is written if any "
+                         "operation fails. No more than 5 requests per minute.",
+             dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def batch_contacts(body: ContactBatch, fields: Tuple[str, ...] | None = Depends(contact_fields),
+                         db: Session = Depends(get_contacts_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route to apply a batch of operations.
+
+    Args:
+        body (ContactBatch): Mode and the operations.
+        fields (Tuple[str, ...] | None, optional): Return only these fields of the contacts. Defaults to Depends(contact_fields).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Returns:
+        BatchResult: Result of every operation.
+    """
+    result = await repository_contacts.apply_batch(body.operations, body.mode, current_user, db)
+    if fields:
+        adapter = batch_result_adapter(fields)
+        return Response(adapter.dump_json(adapter.validate_python(result)), media_type="application/json")
+    return result
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED, 
              summary="Add a new contact.",
-             description="No more than 2 requests per minute.",
-             dependencies=[Depends(RateLimiter(times=2, seconds=60))])
-async def create_contact(body: ContactBase, db: Session = Depends(get_db),
+             description="No more than 2 requests per minute. Retries with the same Idempotency-Key header "
+                         "get the first response and are not counted.")
+async def create_contact(body: ContactBase, db: Session = Depends(get_contacts_db),
+                     idempotency: IdempotentRequest = Depends(Idempotency(times=2, seconds=60)),
                      current_user: User = Depends(auth_service.get_current_user)):
     """
     Route to add a new contact.
 
     Args:
         body (ContactBase): Containes contact details such as name, surname, email, number, bday.
-        db (Session, optional): Session to connect to DB. Defaults to Depends(get_db).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        idempotency (IdempotentRequest, optional): Idempotency-Key and rate limit. Defaults to Depends(Idempotency(times=2, seconds=60)).
         current_user (User, optional): Authorised user.. Defaults to Depends(auth_service.get_current_user).
 
     Returns:
         Contact: Created contact.
     """
-    return await repository_contacts.create_contact(body, current_user, db)
+    contact = await repository_contacts.create_contact(body, current_user, db)
+    return await idempotency.respond(contact, ContactResponse, status.HTTP_201_CREATED)
 
 
 @router.put("/{contact_id}", response_model=ContactResponse,
             summary="Update an existing contact by it's ID.",
-            description="Put the contact ID in contact_id line. And then put the values itself to Request body.",
-            dependencies=[Depends(RateLimiter(times=2, seconds=60))])
-async def update_contact(body: ContactBase, contact_id: int, db: Session = Depends(get_db),
+            description="Put the contact ID in contact_id line. And then put the values itself to Request body. "
+                        "Retries with the same Idempotency-Key header get the first response and are not counted.")
+async def update_contact(body: ContactBase, contact_id: int, db: Session = Depends(get_contacts_db),
+                     idempotency: IdempotentRequest = Depends(Idempotency(times=2, seconds=60)),
                      current_user: User = Depends(auth_service.get_current_user)):
     """
     Route to update the contact finded by its ID.
@@ -141,7 +382,8 @@ async def update_contact(body: ContactBase, contact_id: int, db: Session = Depen
     Args:
         body (ContactBase): The contact details that you want to update.
         contact_id (int): Id of a specified contact you want to apdate.
-        db (Session, optional): Session to connect to DB. Defaults to Depends(get_db).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
+        idempotency (IdempotentRequest, optional): Idempotency-Key and rate limit. Defaults to Depends(Idempotency(times=2, seconds=60)).
         current_user (User, optional): Authorised user who search for a contact. Defaults to Depends(auth_service.get_current_user).
 
     Raises:
@@ -153,21 +395,21 @@ async def update_contact(body: ContactBase, contact_id: int, db: Session = Depen
     contact = await repository_contacts.update_contact(contact_id, body, current_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found!")
-    return contact
+    return await idempotency.respond(contact, ContactResponse)
 
 
 @router.delete("/{contact_id}", response_model=ContactResponse, 
                summary="Delete an existing contact by it's ID.",
                description="No more than 5 requests per minute.",
              dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def remove_contact(contact_id: int, db: Session = Depends(get_db),
+async def remove_contact(contact_id: int, db: Session = Depends(get_contacts_db),
                      current_user: User = Depends(auth_service.get_current_user)):
     """
     Route to delete the contact finded by its ID.
 
     Args:
         contact_id (int): Id of the contact you want to delete.
-        db (Session, optional): Session to connect to DB. Defaults to Depends(get_db).
+        db (Session, optional): Session to connect to DB. Defaults to Depends(get_contacts_db).
         current_user (User, optional): Authorised user who search for a contact. Defaults to Depends(auth_service.get_current_user).
 
     Raises:
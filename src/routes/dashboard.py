@@ -0,0 +1,41 @@
+from typing import Callable
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session
+
+from src.database.models import User
+from src.database.shards import get_contacts_session_factory
+from src.repository import contacts as repository_contacts
+from src.schemas import Dashboard
+from src.services.auth import auth_service
+from src.services.metrics import MetricsRoute
+from src.services.rate_limit import RateLimiter
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"], route_class=MetricsRoute)
+
+dashboard_limiter = RateLimiter(times=10, seconds=60)
+
+
+@router.get("/", response_model=Dashboard,
+            summary="Everything the home screen shows in one request.",
+            description="The profile, the first page of contacts, the number of contacts and the upcoming birthdays. "
+                        "No more than 10 requests per minute.",
+            dependencies=[Depends(dashboard_limiter)])
+async def read_dashboard(limit: int = Query(default=20, ge=1, le=100),
+                         session_factory: Callable[[], Session] = Depends(get_contacts_session_factory),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Route to get the home screen data. The user is authenticated once and the queries run concurrently.
+
+    Args:
+        limit (int, optional): Contacts of the first page. Defaults to 20.
+        session_factory (Callable[[], Session], optional): Sessions of the user's contacts database.
+            Defaults to Depends(get_contacts_session_factory).
+        current_user (User, optional): Authorised user. Defaults to Depends(auth_service.get_current_user).
+
+    Returns:
+        Response: JSON of the Dashboard.
+    """
+    dashboard = await repository_contacts.get_dashboard(current_user, session_factory, limit)
+    return Response(Dashboard.model_validate(dashboard, from_attributes=True).model_dump_json(),
+                    media_type="application/json")
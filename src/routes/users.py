@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from functools import lru_cache
 
 from src.database.db import get_db
 from src.database.models import User
@@ -9,8 +8,29 @@ from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.conf.config import settings
 from src.schemas import UserDb
+from src.services.metrics import MetricsRoute
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=MetricsRoute)
+
+
+@lru_cache(maxsize=1)
+def get_cloudinary():
+    """
+    Imports and configures cloudinary on first use, so it is not loaded at startup.
+
+    Returns:
+        module: Configured cloudinary module.
+    """
+    import cloudinary
+    import cloudinary.uploader
+
+    cloudinary.config(
+        cloud_name=settings.cloudinary_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+    return cloudinary
 
 
 @router.get("/me/", response_model=UserDb)
@@ -41,13 +61,7 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     Returns:
         User: User with upadated avatar.
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
+    cloudinary = get_cloudinary()
     r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
     src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
                         .build_url(width=250, height=250, crop='fill', version=r.get('version'))
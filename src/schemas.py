@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, Field, EmailStr
+from functools import lru_cache
+from typing import Dict, List, Optional, Literal, Tuple
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, TypeAdapter, create_model
 
 
 class ContactBase(BaseModel):
@@ -13,10 +14,115 @@ class ContactBase(BaseModel):
 class ContactResponse(ContactBase):
     id: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+CONTACT_FIELDS = tuple(ContactResponse.model_fields)
+
+
+@lru_cache(maxsize=2 ** len(CONTACT_FIELDS))
+def contact_model(fields: Tuple[str, ...]) -> type[BaseModel]:
+    """
+    ContactResponse trimmed to the requested fields, created once per combination.
+
+    Args:
+        fields (Tuple[str, ...]): Field names in the CONTACT_FIELDS order.
+
+    Returns:
+        type[BaseModel]: Model with only these fields.
+    """
+    return create_model(f"Contact_{'_'.join(fields)}", __config__=ConfigDict(from_attributes=True),
+                        **{name: (ContactResponse.model_fields[name].annotation, ContactResponse.model_fields[name])
+                           for name in fields})
+
+
+@lru_cache(maxsize=2 ** len(CONTACT_FIELDS))
+def contact_list_adapter(fields: Tuple[str, ...]) -> TypeAdapter:
+    return TypeAdapter(List[contact_model(fields)])
+
+
+class ContactOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: Optional[dict] = None
+
+
+class ContactBatch(BaseModel):
+    mode: Literal["atomic", "best_effort"] = "atomic"
+    operations: List[ContactOperation] = Field(min_length=1, max_length=500)
+
+
+class OperationResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    contact: Optional[ContactResponse] = None
+    detail: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    mode: str
+    committed: bool
+    results: List[OperationResult]
+
+
+@lru_cache(maxsize=2 ** len(CONTACT_FIELDS))
+def batch_result_adapter(fields: Tuple[str, ...]) -> TypeAdapter:
+    """
+    Args:
+        fields (Tuple[str, ...]): Contact fields in the CONTACT_FIELDS order.
+
+    Returns:
+        TypeAdapter: BatchResult with the contacts trimmed to the fields.
+    """
+    result = create_model(f"OperationResult_{'_'.join(fields)}", __base__=OperationResult,
+                          contact=(Optional[contact_model(fields)], None))
+    return TypeAdapter(create_model(f"BatchResult_{'_'.join(fields)}", __base__=BatchResult, results=(List[result], ...)))
+
+
+class ContactChanges(BaseModel):
+    contacts: List[ContactResponse]
+    deleted: List[int]
+    next_token: str
+    has_more: bool
+    # The token is older than the kept history of deletions, run the full sync (no since).
+    reset: bool = False
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    name: str
+    surname: str
+    email: Optional[str] = None
+
+
+class DuplicateGroup(BaseModel):
+    reason: str
+    key: str
+    contacts: List[ContactResponse]
+
+
+class MonthCount(BaseModel):
+    month: str = Field(description="YYYY-MM")
+    count: int
+
+
+class ContactStats(BaseModel):
+    total: int
+    with_email: int
+    email_share: float = Field(description="Part of the contacts with an email, from 0 to 1.")
+    added_per_month: List[MonthCount]
+    birthdays_per_month: List[int] = Field(description="Contacts with the birthday in January, February, ... December.")
+
+
+class ContactMerge(BaseModel):
+    primary_id: int
+    duplicate_ids: List[int] = Field(min_length=1)
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=3, max_length=50)
     email: str
@@ -38,6 +144,13 @@ class UserResponse(BaseModel):
     user: UserDb
     detail: str = "User successfully created"
 
+
+class Dashboard(BaseModel):
+    user: UserDb
+    contacts: List[ContactResponse]
+    contacts_count: int
+    birthdays: List[ContactResponse] = Field(description="Contacts with the birthday within 7 days.")
+
 class TokenModel(BaseModel):
     access_token: str
     refresh_token: str
@@ -45,3 +158,27 @@ class TokenModel(BaseModel):
 
 class RequestEmail(BaseModel):
     email: EmailStr
+
+
+class MemoryStatus(BaseModel):
+    tracing: bool
+    frames: int
+    traced_bytes: int
+    peak_bytes: int
+    overhead_bytes: int = Field(description="Memory used by tracemalloc itself.")
+    rss_bytes: Optional[int]
+    snapshots: List[str]
+
+
+class AllocationSite(BaseModel):
+    site: str
+    size: int
+    count: int
+    size_diff: Optional[int] = None
+    count_diff: Optional[int] = None
+
+
+class LiveObjects(BaseModel):
+    sessions: int
+    identity_map: int = Field(description="Instances held by the identity maps of the live sessions.")
+    instances: Dict[str, int] = Field(description="Live ORM instances by class.")
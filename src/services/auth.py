@@ -1,25 +1,38 @@
 from typing import Optional
 
 from jose import JWTError, jwt
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Header
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
 from src.conf.config import settings
-import pickle
-import redis
+import hmac
 
 from src.database.db import get_db
 from src.repository import users as repository_users
+from src.services.metrics import USER_CACHE
+from src.services.single_flight import SingleFlightCache
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    _pwd_context = None
+    user_cache = SingleFlightCache("user", ttl=settings.user_cache_ttl_seconds, metric=USER_CACHE)
+
+    @property
+    def pwd_context(self):
+        """
+        Password hashing context. passlib/bcrypt are imported on first use to keep the startup fast.
+
+        Returns:
+            CryptContext: Context with the bcrypt scheme.
+        """
+        if self._pwd_context is None:
+            from passlib.context import CryptContext
+            self._pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        return self._pwd_context
 
     def verify_password(self, plain_password: str, hashed_password: str):
         """
@@ -145,17 +158,26 @@ class Auth:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
-        user = self.r.get(f"user:{email}")
+        user = await self.user_cache.get(f"user:{email}", lambda: repository_users.get_user_by_email(email, db))
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            raise credentials_exception
         return user
     
+    async def get_admin(self, x_admin_token: str | None = Header(default=None)):
+        """
+        Allows the request only if the X-Admin-Token header matches ADMIN_TOKEN.
+        Admin routes are disabled while ADMIN_TOKEN is empty.
+
+        Args:
+            x_admin_token (str | None, optional): Value of the X-Admin-Token header. Defaults to Header(default=None).
+
+        Raises:
+            HTTPException: HTTP_403_FORBIDDEN if the token is missing or wrong.
+        """
+        if not settings.admin_token or x_admin_token is None \
+                or not hmac.compare_digest(x_admin_token.encode(), settings.admin_token.encode()):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
     def create_email_token(self, data: dict):
         """
         Сreates an encoded JWT token valid for 7 days
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Set
+
+from fastapi.encoders import jsonable_encoder
+
+from src.conf.config import settings
+from src.schemas import ContactResponse
+from src.services.metrics import Gauge
+from src.services.redis_client import get_pubsub, get_redis
+
+
+logger = logging.getLogger(__name__)
+
+STREAM_CONNECTIONS = Gauge("contacts_stream_connections", "Open change stream connections of the worker.").labels()
+# Put into a subscriber queue to end the stream, the client reconnects with Last-Event-ID and replays from the DB.
+CLOSE = None
+
+# Reads the changes after a change number from the DB, returns the answer of get_changes.
+CatchUp = Callable[[int], Awaitable[dict]]
+
+
+def channel(user_id: int) -> str:
+    return f"contacts:changes:{user_id}"
+
+
+def changes_event(change_seq: int, contacts: List, deleted_ids: List[int]) -> dict:
+    """
+    Args:
+        change_seq (int): The last change number of the write, used as the SSE event id.
+        contacts (List): Created or updated contacts.
+        deleted_ids (List[int]): Ids of the deleted contacts.
+
+    Returns:
+        dict: Event in the shape of the GET /api/contacts/changes answer. ``first`` is the first change
+            number of the write: every contact and deleted id took one number of the reserved range.
+    """
+    return {"seq": change_seq, "first": change_seq - len(contacts) - len(deleted_ids) + 1,
+            "contacts": [jsonable_encoder(ContactResponse.model_validate(contact)) for contact in contacts],
+            "deleted": list(deleted_ids)}
+
+
+def format_event(event: dict) -> str:
+    data = json.dumps({"contacts": event["contacts"], "deleted": event["deleted"]}, separators=(",", ":"))
+    return f"id: {event['seq']}\nevent: changes\ndata: {data}\n\n"
+
+
+async def publish_changes(user_id: int, change_seq: int, contacts: List, deleted_ids: List[int]) -> None:
+    """
+    Publish a committed write to the user's channel. A failure is logged and never fails the write,
+    the clients catch up through Last-Event-ID or the delta sync.
+
+    Args:
+        user_id (int): Owner of the contacts.
+        change_seq (int): The last change number of the write.
+        contacts (List): Created or updated contacts.
+        deleted_ids (List[int]): Ids of the deleted contacts.
+    """
+    try:
+        message = json.dumps(changes_event(change_seq, contacts, deleted_ids), separators=(",", ":"))
+        await get_redis().publish(channel(user_id), message)
+    except Exception:
+        logger.warning("Publishing the contact changes of user %s failed", user_id, exc_info=True)
+
+
+class ChangeHub:
+    """
+    Fan-out of the per-user Redis channels to the open streams of the worker. All streams share
+    one pub/sub connection, a channel is subscribed while at least one stream of the user is open.
+    An idle stream costs a bounded queue and a suspended generator.
+    """
+
+    def __init__(self):
+        self._queues: Dict[int, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._reader: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, user_id: int) -> asyncio.Queue:
+        """
+        Args:
+            user_id (int): Owner of the contacts.
+
+        Returns:
+            asyncio.Queue: Queue that gets the events of the user published from now on.
+        """
+        queue = asyncio.Queue(maxsize=settings.stream_queue_size)
+        async with self._lock:
+            queues = self._queues.get(user_id)
+            if queues is None:
+                if self._pubsub is None:
+                    self._pubsub = get_pubsub()
+                await self._pubsub.subscribe(channel(user_id))
+                queues = self._queues[user_id] = set()
+                if self._reader is None:
+                    self._reader = asyncio.create_task(self._read())
+            queues.add(queue)
+        return queue
+
+    async def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        async with self._lock:
+            queues = self._queues.get(user_id)
+            if queues is None or queue not in queues:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._queues[user_id]
+                try:
+                    await self._pubsub.unsubscribe(channel(user_id))
+                except Exception:
+                    logger.warning("Unsubscribing from the changes of user %s failed", user_id, exc_info=True)
+
+    def dispatch(self, channel_name: str, data: str):
+        """
+        Put a published event into the queues of the user's streams. A stream that does not keep up
+        is closed instead of buffering without a limit.
+        """
+        queues = self._queues.get(int(channel_name.rsplit(":", 1)[1]))
+        if not queues:
+            return
+        event = json.loads(data)
+        for queue in queues:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._close_queue(queue)
+
+    @staticmethod
+    def _close_queue(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(CLOSE)
+
+    async def _read(self):
+        try:
+            while True:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if message is not None and message["type"] == "message":
+                    self.dispatch(message["channel"], message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Reading the contact changes failed, closing the streams")
+            await self._reset()
+
+    async def _reset(self):
+        async with self._lock:
+            for queues in self._queues.values():
+                for queue in queues:
+                    self._close_queue(queue)
+            self._queues.clear()
+            pubsub, self._pubsub, self._reader = self._pubsub, None, None
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def close(self):
+        """
+        Stop reading and close the pub/sub connection, called on shutdown.
+        """
+        if self._reader is not None:
+            self._reader.cancel()
+        await self._reset()
+
+    async def stream(self, user_id: int, queue: asyncio.Queue, last_seq: int, replay: dict | None = None,
+                     reset: bool = False, catch_up: CatchUp | None = None) -> AsyncIterator[str]:
+        """
+        Server-sent events of one client: the replayed changes first, then the live ones.
+        A comment is sent every STREAM_HEARTBEAT_SECONDS so proxies keep the idle connection open.
+
+        The writes are published after their commit, so the events of two workers can arrive out of
+        order. Live events already delivered (by the replay or a catch-up) are skipped; an event that
+        does not follow the last delivered change number is not sent as is, the changes after that
+        number are read from the DB with ``catch_up`` instead, so a late event is never lost. The
+        change numbers of a user commit in order, so the DB has everything up to the new event.
+
+        Args:
+            user_id (int): Owner of the contacts.
+            queue (asyncio.Queue): Queue from subscribe.
+            last_seq (int): The last change number the client has.
+            replay (dict | None, optional): Event with the changes after last_seq. Defaults to None.
+            reset (bool, optional): Too many changes were missed, the client has to run the delta sync
+                and reconnect. Defaults to False.
+            catch_up (CatchUp | None, optional): Reads the missed changes on a gap, without it the events
+                are sent in the order they arrive. Defaults to None.
+
+        Yields:
+            str: SSE messages.
+        """
+        STREAM_CONNECTIONS.inc()
+        try:
+            yield f"retry: {settings.stream_retry_ms}\n\n"
+            if reset:
+                yield "event: reset\ndata: {}\n\n"
+                return
+            if replay is not None and (replay["contacts"] or replay["deleted"]):
+                last_seq = replay["seq"]
+                yield format_event(replay)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.stream_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is CLOSE:
+                    return
+                if event["seq"] <= last_seq:
+                    continue
+                if event.get("first", event["seq"]) > last_seq + 1 and catch_up is not None:
+                    changes = await catch_up(last_seq)
+                    if changes["has_more"] or changes["reset"]:
+                        yield "event: reset\ndata: {}\n\n"
+                        return
+                    event = changes_event(int(changes["next_token"]), changes["contacts"], changes["deleted"])
+                    if event["seq"] <= last_seq:
+                        continue
+                last_seq = event["seq"]
+                yield format_event(event)
+        finally:
+            STREAM_CONNECTIONS.dec()
+            await self.unsubscribe(user_id, queue)
+
+
+change_hub = ChangeHub()
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+# time.monotonic() value after which the current request is abandoned, None without a budget.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of starting a DB statement after the time budget of the request ran out.
+    """
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Give the code inside the block ``seconds`` to complete. A nested budget cannot extend the outer one.
+
+    Args:
+        seconds (float): Time budget.
+    """
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """
+    Returns:
+        float | None: Seconds left of the budget (negative when it ran out), None without a budget.
+    """
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def check():
+    """
+    Raises:
+        DeadlineExceeded: The budget ran out.
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def timeout() -> asyncio.Timeout:
+    """
+    asyncio.timeout for the rest of the budget, it raises TimeoutError when the budget runs out.
+
+    Returns:
+        asyncio.Timeout: Async context manager, without a budget it never expires.
+    """
+    left = remaining()
+    return asyncio.timeout(None if left is None else max(left, 0))
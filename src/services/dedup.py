@@ -0,0 +1,99 @@
+import re
+import unicodedata
+
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+    "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+_NON_DIGITS = re.compile(r"\D")
+# Ukrainian national transliteration (2010), plus the Russian letters it lacks.
+_CYRILLIC = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie", "ж": "zh", "з": "z",
+    "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+    "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "ё": "e", "ы": "y", "э": "e", "ъ": "",
+})
+
+
+def to_ascii(word: str) -> str:
+    """
+    Latin spelling of a word for the phonetic key: Cyrillic is transliterated and the accents are
+    dropped (Józef -> jozef). Letters of the other scripts (CJK, Arabic...) have no spelling here
+    and are dropped too.
+
+    Args:
+        word (str): Name or surname.
+
+    Returns:
+        str: Casefolded ASCII letters.
+    """
+    word = unicodedata.normalize("NFKD", word.casefold().translate(_CYRILLIC))
+    return "".join(ch for ch in word if ch.isascii() and ch.isalpha())
+
+
+def soundex(word: str) -> str:
+    """
+    American Soundex code of the Latin spelling (see to_ascii) of a word, e.g. Robert -> R163,
+    Мельник -> M452 like Melnyk. A word without a Latin spelling (e.g. CJK) has no code.
+
+    Args:
+        word (str): Name or surname.
+
+    Returns:
+        str: Phonetic key, "" when there is none.
+    """
+    word = to_ascii(word)
+    if not word:
+        return ""
+    code = word[0].upper()
+    previous = _SOUNDEX_CODES.get(word[0], "")
+    for ch in word[1:]:
+        digit = _SOUNDEX_CODES.get(ch, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if ch not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def email_key(email: str | None) -> str | None:
+    return (email.strip().lower() or None) if email else None
+
+
+def mobile_key(mobile: str | None) -> str | None:
+    return (_NON_DIGITS.sub("", mobile) or None) if mobile else None
+
+
+def name_key(name: str | None, surname: str | None) -> str | None:
+    """
+    Phonetic key of the name and surname. It is "" when a given name or surname has no Latin
+    spelling: such contacts are not grouped by name, only by their email and mobile keys
+    (NULL is kept for the contacts whose keys were not computed yet).
+    """
+    codes = []
+    for value in (name or "", surname or ""):
+        code = soundex(value)
+        if not code and any(ch.isalpha() for ch in value):
+            return ""
+        codes.append(code)
+    key = ":".join(codes)
+    return None if key == ":" else key[:100]
+
+
+def contact_keys(name: str | None, surname: str | None, mobile: str | None, email: str | None) -> dict:
+    """
+    Normalized blocking keys of a contact. Contacts with an equal key are duplicate candidates.
+
+    Args:
+        name (str | None): Contact name.
+        surname (str | None): Contact surname.
+        mobile (str | None): Contact phone number.
+        email (str | None): Contact email.
+
+    Returns:
+        dict: Values of the email_key, mobile_key and name_key columns.
+    """
+    return {"email_key": email_key(email), "mobile_key": mobile_key(mobile), "name_key": name_key(name, surname)}
@@ -1,33 +1,43 @@
+import logging
+from functools import lru_cache
 from pathlib import Path
-import os.path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
 from pydantic import EmailStr
 
 from src.services.auth import auth_service
 from src.conf.config import settings
+from src.services.metrics import EMAIL_SENT, EMAIL_FAILED
 
 
-# module_dir = Path.cwd()
-relative_path = "src\\templates"
-module_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logger = logging.getLogger(__name__)
 
-absolute_file_path = os.path.join(module_dir, relative_path)
+TEMPLATE_FOLDER = Path(__file__).resolve().parent.parent / "templates"
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Desired Name",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=absolute_file_path,
-)
+
+@lru_cache(maxsize=1)
+def get_mail_config():
+    """
+    Builds the fastapi_mail connection config on first use.
+    fastapi_mail is heavy to import, so it is not loaded until the first email is sent.
+
+    Returns:
+        ConnectionConfig: Config for the FastMail client.
+    """
+    from fastapi_mail import ConnectionConfig
+
+    return ConnectionConfig(
+        MAIL_USERNAME=settings.mail_username,
+        MAIL_PASSWORD=settings.mail_password,
+        MAIL_FROM=settings.mail_from,
+        MAIL_PORT=settings.mail_port,
+        MAIL_SERVER=settings.mail_server,
+        MAIL_FROM_NAME="Desired Name",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=True,
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=True,
+        TEMPLATE_FOLDER=TEMPLATE_FOLDER,
+    )
 
 
 async def send_email(email: EmailStr, username: str, host: str):
@@ -39,6 +49,8 @@ async def send_email(email: EmailStr, username: str, host: str):
         username (str): User username
         host (str): The host where our application is running
     """
+    from fastapi_mail import FastMail, MessageSchema, MessageType
+
     try:
         token_verification = auth_service.create_email_token({"sub": email})
         message = MessageSchema(
@@ -48,8 +60,10 @@ async def send_email(email: EmailStr, username: str, host: str):
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
+        fm = FastMail(get_mail_config())
         await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
-
+        EMAIL_SENT.inc()
+    except Exception:
+        # Sent from a background task after the response, nobody else would see the error.
+        EMAIL_FAILED.inc()
+        logger.exception("Sending the verification email to %s failed", email)
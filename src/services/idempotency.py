@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Type
+
+from fastapi import Depends, Header, HTTPException, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.rate_limit import RateLimiter
+from src.services.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+IN_FLIGHT = "in_flight"
+POLL_SECONDS = 0.05
+
+
+class IdempotentReplay(StarletteHTTPException):
+    """
+    Raised by the Idempotency dependency to answer a retry with the stored response.
+    """
+
+    def __init__(self, stored: dict):
+        super().__init__(status_code=stored["status"])
+        self.stored = stored
+
+
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay) -> Response:
+    return Response(exc.stored["body"], status_code=exc.stored["status"], media_type="application/json",
+                    headers={**exc.stored.get("headers", {}), "Idempotent-Replayed": "true"})
+
+
+class IdempotentRequest:
+    """
+    State of one write request, injected into the route by the Idempotency dependency.
+    """
+
+    def __init__(self, key: str | None, fingerprint: str | None = None):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.stored: dict | None = None
+
+    async def respond(self, result: Any, model: Type[BaseModel], status_code: int = status.HTTP_200_OK) -> Any:
+        """
+        Serialize the result of the route and keep it for the retries.
+
+        Args:
+            result (Any): Return value of the route.
+            model (Type[BaseModel]): Response model of the route.
+            status_code (int, optional): Status of the answer. Defaults to 200.
+
+        Returns:
+            Any: The result itself without an Idempotency-Key, otherwise the serialized response.
+        """
+        if self.key is None:
+            return result
+        body = json.dumps(jsonable_encoder(model.model_validate(result)), separators=(",", ":"))
+        self.stored = {"status": status_code, "body": body}
+        return Response(body, status_code=status_code, media_type="application/json")
+
+
+class Idempotency:
+    """
+    Dependency for the write routes that supports the Idempotency-Key header.
+
+    The first request with a key puts an in-flight marker into Redis (SET NX) and runs the route;
+    its response is stored for IDEMPOTENCY_TTL_SECONDS. A retry gets the stored response without
+    running the route again and without counting against the rate limit. A concurrent duplicate
+    waits for the in-flight original. Reusing a key for a different request is rejected with 422.
+    Without the header the route runs as usual. If Redis is down the key is ignored.
+    """
+
+    def __init__(self, times: int, seconds: int):
+        self.limiter = RateLimiter(times=times, seconds=seconds)
+
+    async def __call__(self, request: Request, response: Response,
+                       idempotency_key: str | None = Header(default=None, max_length=255),
+                       current_user: User = Depends(auth_service.get_current_user)):
+        if idempotency_key is None:
+            await self.limiter(request, response)
+            yield IdempotentRequest(None)
+            return
+
+        key = f"idempotency:{current_user.id}:{idempotency_key}"
+        fingerprint = hashlib.sha256(b"%s %s\n%s" % (request.method.encode(), request.url.path.encode(),
+                                                     await request.body())).hexdigest()
+        try:
+            await self._claim(key, fingerprint)
+        except RedisError:
+            logger.warning("Idempotency-Key is ignored, Redis is not available", exc_info=True)
+            await self.limiter(request, response)
+            yield IdempotentRequest(None)
+            return
+
+        record = IdempotentRequest(key, fingerprint)
+        try:
+            await self.limiter(request, response)
+            yield record
+        except HTTPException as exc:
+            if exc.status_code < 500 and exc.status_code != status.HTTP_429_TOO_MANY_REQUESTS:
+                record.stored = {"status": exc.status_code, "body": json.dumps({"detail": exc.detail}),
+                                 "headers": dict(exc.headers or {})}
+            raise
+        finally:
+            await self._finish(record)
+
+    @staticmethod
+    async def _claim(key: str, fingerprint: str):
+        """
+        Put the in-flight marker of the key, waiting while another request with the key is running.
+
+        Raises:
+            IdempotentReplay: The original request is completed.
+            HTTPException: HTTP_422_UNPROCESSABLE_ENTITY if the key was used for another request,
+                HTTP_409_CONFLICT if the original is still running after IDEMPOTENCY_WAIT_SECONDS.
+        """
+        r = get_redis()
+        marker = json.dumps({"state": IN_FLIGHT, "fingerprint": fingerprint})
+        deadline = asyncio.get_running_loop().time() + settings.idempotency_wait_seconds
+        while True:
+            if await r.set(key, marker, nx=True, ex=settings.idempotency_lock_seconds):
+                return
+            value = await r.get(key)
+            if value is not None:
+                stored = json.loads(value)
+                if stored["fingerprint"] != fingerprint:
+                    raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                        detail="Idempotency-Key was already used for a different request")
+                if stored.get("state") != IN_FLIGHT:
+                    raise IdempotentReplay(stored)
+            if asyncio.get_running_loop().time() >= deadline:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(POLL_SECONDS)
+
+    @staticmethod
+    async def _finish(record: IdempotentRequest):
+        r = get_redis()
+        try:
+            if record.stored is None:
+                await r.delete(record.key)
+            else:
+                await r.set(record.key, json.dumps({**record.stored, "fingerprint": record.fingerprint}),
+                            ex=settings.idempotency_ttl_seconds)
+        except RedisError:
+            logger.warning("Could not store the response of Idempotency-Key %s", record.key, exc_info=True)
@@ -0,0 +1,168 @@
+"""
+Memory diagnostics of the worker for the admin routes.
+
+tracemalloc is off until an admin starts it, so the diagnostics cost nothing while unused;
+while it traces, every allocation pays for the recorded frames (``frames=1`` keeps it light).
+The snapshots are written to the profile directory instead of kept in memory, so they do not
+add to the memory under investigation. Typical leak hunt:
+
+    POST /api/admin/memory/tracemalloc/start
+    POST /api/admin/memory/snapshots            -> first id
+    ... let the worker serve traffic ...
+    POST /api/admin/memory/snapshots            -> second id
+    GET  /api/admin/memory/diff?first=<id>&second=<id>
+"""
+import gc
+import os
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Base
+from src.services.profiler import profile_dir
+
+
+GROUP_BY = ("lineno", "filename", "traceback")
+
+# Allocations of the diagnostics themselves.
+_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>")]
+
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def start(frames: int = 1):
+    """
+    Start tracing the allocations. Does nothing if tracemalloc already traces.
+
+    Args:
+        frames (int, optional): Frames stored per allocation. Defaults to 1.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop():
+    """
+    Stop tracing and free the traces. The stored snapshots are kept.
+    """
+    tracemalloc.stop()
+
+
+def status() -> dict:
+    """
+    Returns:
+        dict: Tracing state, traced and peak bytes, memory used by tracemalloc itself, RSS of the
+            process and the stored snapshot ids.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    return {"tracing": tracemalloc.is_tracing(), "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current, "peak_bytes": peak, "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "rss_bytes": _rss_bytes(), "snapshots": list_snapshots()}
+
+
+def take_snapshot() -> str | None:
+    """
+    Store a snapshot of the traced allocations. The oldest snapshots above MEMORY_SNAPSHOTS_LIMIT are deleted.
+
+    Returns:
+        str | None: Id of the snapshot, None when tracemalloc does not trace.
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    # Nanoseconds, so the snapshots taken within one second keep their order.
+    snapshot_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    tracemalloc.take_snapshot().filter_traces(_FILTERS).dump(str(profile_dir() / f"{snapshot_id}.tracemalloc"))
+    for old in list_snapshots()[settings.memory_snapshots_limit:]:
+        (profile_dir() / f"{old}.tracemalloc").unlink(missing_ok=True)
+    return snapshot_id
+
+
+def list_snapshots() -> List[str]:
+    """
+    Returns:
+        List[str]: Ids of the stored snapshots, newest first.
+    """
+    return sorted((p.stem for p in profile_dir().glob("*.tracemalloc")), reverse=True)
+
+
+def load_snapshot(snapshot_id: str) -> tracemalloc.Snapshot | None:
+    """
+    Args:
+        snapshot_id (str): Id returned by take_snapshot.
+
+    Returns:
+        tracemalloc.Snapshot | None: Snapshot or None if there is no such snapshot.
+    """
+    if not snapshot_id.replace("-", "").isalnum():
+        return None
+    path = profile_dir() / f"{snapshot_id}.tracemalloc"
+    return tracemalloc.Snapshot.load(str(path)) if path.exists() else None
+
+
+def _site(traceback: tracemalloc.Traceback, group_by: str) -> str:
+    if group_by == "filename":
+        return traceback[0].filename
+    return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in traceback)
+
+
+def top(snapshot: tracemalloc.Snapshot, group_by: str = "lineno", limit: int = 20) -> List[dict]:
+    """
+    Args:
+        snapshot (tracemalloc.Snapshot): Snapshot.
+        group_by (str, optional): "lineno", "filename" or "traceback". Defaults to "lineno".
+        limit (int, optional): Allocation sites returned. Defaults to 20.
+
+    Returns:
+        List[dict]: The biggest allocation sites with their size and number of blocks.
+    """
+    return [{"site": _site(stat.traceback, group_by), "size": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(group_by)[:limit]]
+
+
+def diff(first: tracemalloc.Snapshot, second: tracemalloc.Snapshot, group_by: str = "lineno",
+         limit: int = 20) -> List[dict]:
+    """
+    Args:
+        first (tracemalloc.Snapshot): Older snapshot.
+        second (tracemalloc.Snapshot): Newer snapshot.
+        group_by (str, optional): "lineno", "filename" or "traceback". Defaults to "lineno".
+        limit (int, optional): Allocation sites returned. Defaults to 20.
+
+    Returns:
+        List[dict]: Allocation sites ordered by the growth of their size, the leaks come first.
+    """
+    return [{"site": _site(stat.traceback, group_by), "size": stat.size, "size_diff": stat.size_diff,
+             "count": stat.count, "count_diff": stat.count_diff}
+            for stat in second.compare_to(first, group_by)[:limit]]
+
+
+def live_objects() -> dict:
+    """
+    Count the ORM instances and sessions alive in the worker. It walks the objects tracked by the
+    garbage collector, which takes a moment on a big heap, so it only runs when asked.
+
+    Returns:
+        dict: Live sessions, instances in their identity maps and live instances by mapped class.
+    """
+    mapped = {mapper.class_ for mapper in Base.registry.mappers}
+    sessions, identity_map, instances = 0, 0, Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if cls in mapped:
+            instances[cls.__name__] += 1
+        elif isinstance(obj, Session):
+            sessions += 1
+            identity_map += len(obj.identity_map)
+    return {"sessions": sessions, "identity_map": identity_map, "instances": dict(instances.most_common())}
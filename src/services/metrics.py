@@ -0,0 +1,251 @@
+import time
+from bisect import bisect_left
+from math import ceil
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_429_TOO_MANY_REQUESTS
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Base class of a metric family. Children are created once per label set by ``labels``
+    and should be kept by the caller, so the hot path only touches plain attributes.
+    """
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        Returns the child bound to the given label values, creating it on first use.
+
+        Args:
+            *values (str): Label values in the order of ``labelnames``.
+
+        Returns:
+            object: Child with the ``inc``/``set``/``observe`` methods.
+        """
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._sample_lines(values, child))
+        return lines
+
+    def _sample_lines(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {child.value}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "count")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _sample_lines(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """
+    Keeps the metric families of the worker and renders them in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route, method and status.",
+                            ("method", "route", "status"))
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being processed by route and method.",
+                             ("method", "route"))
+USER_CACHE = Counter("auth_user_cache_total", "Lookups of the current user in the Redis cache.", ("result",))
+CONTACT_STATS_CACHE = Counter("contacts_stats_cache_total", "Lookups of the contact statistics in the Redis cache.",
+                              ("result",))
+CONTACT_QUERY_CACHE = Counter("contacts_query_cache_total", "Lookups of the contact query results in the Redis cache.",
+                              ("result",))
+REQUESTS_SHED = Counter("http_requests_shed_total", "Requests answered with 503 by the admission control.",
+                        ("reason", "priority"))
+REQUESTS_TIMED_OUT = Counter("http_requests_deadline_exceeded_total",
+                             "Requests answered with 504 after their time budget ran out.").labels()
+ADMISSION_QUEUE = Gauge("http_admission_queue_length", "Requests of the worker waiting for a slot.").labels()
+RATE_LIMIT_REJECTIONS = Counter("rate_limiter_rejections_total", "Requests rejected by the rate limiter.", ("route",))
+RATE_LIMIT_SKIPPED = Counter("rate_limiter_skipped_total",
+                             "Requests let through without a rate limit check because Redis was not available.").labels()
+EMAILS = Counter("email_send_total", "Background emails by outcome.", ("outcome",))
+EMAIL_SENT = EMAILS.labels("sent")
+EMAIL_FAILED = EMAILS.labels("failed")
+
+
+class MetricsRoute(APIRoute):
+    """
+    APIRoute that records latency and in-flight requests. The label sets are bound once per route,
+    the status children are cached after the first response with that status.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        in_progress = {method: REQUESTS_IN_PROGRESS.labels(method, self.path) for method in self.methods}
+        latency = {method: {} for method in self.methods}
+
+        def observe(method: str, status: int, elapsed: float):
+            children = latency[method]
+            child = children.get(status)
+            if child is None:
+                child = children[status] = REQUEST_LATENCY.labels(method, self.path, status)
+            child.observe(elapsed)
+
+        async def metrics_handler(request: Request) -> Response:
+            method = request.method
+            gauge = in_progress[method]
+            gauge.inc()
+            start = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except StarletteHTTPException as exc:
+                status = exc.status_code
+                raise
+            except RequestValidationError:
+                # Answered by FastAPI's default handler.
+                status = HTTP_422_UNPROCESSABLE_ENTITY
+                raise
+            finally:
+                gauge.dec()
+                observe(method, status, time.perf_counter() - start)
+
+        return metrics_handler
+
+
+async def rate_limit_callback(request: Request, response: Response, pexpire: int):
+    """
+    Callback for FastAPILimiter. Counts the rejection and answers with 429 like the default callback.
+
+    Args:
+        request (Request): Rejected request.
+        response (Response): Response of the request.
+        pexpire (int): The remaining milliseconds of the limit window.
+
+    Raises:
+        HTTPException: HTTP_429_TOO_MANY_REQUESTS.
+    """
+    route = request.scope.get("route")
+    RATE_LIMIT_REJECTIONS.labels(route.path if route else request.url.path).inc()
+    raise HTTPException(HTTP_429_TOO_MANY_REQUESTS, "Too Many Requests", headers={"Retry-After": str(ceil(pexpire / 1000))})
@@ -0,0 +1,105 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from src.conf.config import settings
+
+
+def profile_dir() -> Path:
+    """
+    Directory with the stored profiles. Defaults to a folder in the system temp dir.
+
+    Returns:
+        Path: Existing directory.
+    """
+    path = Path(settings.profile_dir or os.path.join(tempfile.gettempdir(), "contacts-profiles"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread from a background thread every ``interval`` seconds
+    and aggregates it in the collapsed-stack format used by flamegraph.pl and speedscope.
+
+    The sampled thread is the event loop thread, so coroutines of other requests running
+    at the same time can show up in the profile too.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def save_profile(sampler: StackSampler, method: str, path: str, duration: float) -> str:
+    """
+    Stores the collapsed stacks of a request. The oldest profiles above PROFILES_LIMIT are deleted.
+
+    Args:
+        sampler (StackSampler): Stopped sampler.
+        method (str): HTTP method of the request.
+        path (str): Path of the request.
+        duration (float): Request duration in seconds.
+
+    Returns:
+        str: Id of the stored profile.
+    """
+    # Nanoseconds, so the profiles stored within one second keep their order.
+    profile_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    header = f"# {method} {path} {duration * 1000:.1f} ms, {sum(sampler.stacks.values())} samples\n"
+    (profile_dir() / f"{profile_id}.collapsed").write_text(header + sampler.collapsed(), encoding="utf-8")
+    for old in list_profiles()[settings.profiles_limit:]:
+        (profile_dir() / f"{old}.collapsed").unlink(missing_ok=True)
+    return profile_id
+
+
+def list_profiles() -> list:
+    """
+    Returns:
+        list: Ids of the stored profiles, newest first.
+    """
+    return sorted((p.stem for p in profile_dir().glob("*.collapsed")), reverse=True)
+
+
+def read_profile(profile_id: str) -> str | None:
+    """
+    Args:
+        profile_id (str): Id returned in the X-Profile-Id header.
+
+    Returns:
+        str | None: Collapsed stacks or None if there is no such profile.
+    """
+    if not profile_id.replace("-", "").isalnum():
+        return None
+    path = profile_dir() / f"{profile_id}.collapsed"
+    return path.read_text(encoding="utf-8") if path.exists() else None
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import time
+from typing import Any, Hashable
+
+from redis.exceptions import RedisError
+
+from src.services.redis_client import CircuitOpenError, get_redis
+from src.services.single_flight import Loader, SingleFlightCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    Read-through cache of query results of one owner (a user), invalidated by a version instead
+    of by key. The key of a result holds the owner's current version, so a write makes all the
+    cached results of the owner unreachable with one DEL of the version key; the old entries are
+    left to expire. A missing version is started from the clock, so it never repeats one under
+    which results were cached before, even after Redis lost the key.
+
+    Without Redis the queries go straight to the loader.
+    """
+
+    def __init__(self, namespace: str, cache: SingleFlightCache, version_ttl: int):
+        """
+        Args:
+            namespace (str): Prefix of the Redis keys.
+            cache (SingleFlightCache): Cache of the results.
+            version_ttl (int): Seconds an unused version lives, it must be longer than the TTL of the results.
+        """
+        self.namespace = namespace
+        self.cache = cache
+        self.version_ttl = version_ttl
+
+    def _version_key(self, owner_id: int) -> str:
+        return f"{self.namespace}:version:{owner_id}"
+
+    async def version(self, owner_id: int) -> str | None:
+        """
+        Args:
+            owner_id (int): Owner of the cached results.
+
+        Returns:
+            str | None: Current version of the owner's results, None when Redis is not available.
+        """
+        r = get_redis()
+        key = self._version_key(owner_id)
+        try:
+            version = await r.get(key)
+            if version is None:
+                version = str(time.time_ns())
+                if not await r.set(key, version, nx=True, ex=self.version_ttl):
+                    version = await r.get(key)
+        except CircuitOpenError:
+            return None
+        except RedisError:
+            logger.warning("Reading the %s version of %s failed", self.namespace, owner_id, exc_info=True)
+            return None
+        return version
+
+    async def get(self, owner_id: int, query: str, params: Hashable, loader: Loader) -> Any:
+        """
+        Args:
+            owner_id (int): Owner of the result.
+            query (str): Name of the query.
+            params (Hashable): Parameters of the query, their repr is part of the key.
+            loader (Loader): Runs the query on a miss. None results are not cached.
+
+        Returns:
+            Any: Cached or loaded result.
+        """
+        version = await self.version(owner_id)
+        if version is None:
+            return await loader()
+        digest = hashlib.sha1(repr(params).encode()).hexdigest()
+        return await self.cache.get(f"{self.namespace}:{owner_id}:{version}:{query}:{digest}", loader)
+
+    async def bump(self, owner_id: int):
+        """
+        Invalidate all the cached results of the owner. Call it after the write was committed.
+
+        Args:
+            owner_id (int): Owner of the changed data.
+        """
+        try:
+            await get_redis().delete(self._version_key(owner_id))
+        except RedisError:
+            logger.warning("Could not invalidate the %s cache of %s", self.namespace, owner_id, exc_info=True)
@@ -0,0 +1,24 @@
+from fastapi_limiter import depends
+from redis.exceptions import RedisError
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.conf.config import settings
+from src.services.metrics import RATE_LIMIT_SKIPPED
+
+
+class RateLimiter(depends.RateLimiter):
+    """
+    fastapi-limiter's RateLimiter that lets the request through when Redis is not available
+    (connection error, timeout or the open circuit of the Redis client), so an outage of Redis
+    turns the rate limiting off instead of failing every limited route with 500.
+    RATE_LIMIT_ENABLED=false turns it off on purpose, e.g. for the load tests.
+    """
+
+    async def __call__(self, request: Request, response: Response):
+        if not settings.rate_limit_enabled:
+            return
+        try:
+            return await super().__call__(request, response)
+        except RedisError:
+            RATE_LIMIT_SKIPPED.inc()
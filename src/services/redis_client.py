@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+from weakref import WeakKeyDictionary
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline, PubSub
+from redis.exceptions import ConnectionError, TimeoutError
+
+from src.conf.config import settings
+from src.services import deadline
+from src.services.metrics import Counter, Gauge
+
+
+logger = logging.getLogger(__name__)
+
+REDIS_CIRCUIT_OPEN = Gauge("redis_circuit_open", "1 while the Redis circuit breaker of the worker is open.").labels()
+REDIS_REJECTED = Counter("redis_circuit_rejected_total", "Redis commands failed fast by the open circuit breaker.").labels()
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised instead of sending a command while the circuit is open. It is a ConnectionError,
+    so the callers that already handle RedisError fall back the same way as on a real outage.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending commands to Redis after ``failures`` consecutive connection errors or timeouts.
+    After ``reset_seconds`` one command is let through; its success closes the circuit, its failure
+    opens it again. A breaker is shared by all the clients of the worker.
+    """
+
+    def __init__(self, failures: int, reset_seconds: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            failures (int): Consecutive failures that open the circuit.
+            reset_seconds (float): Time the circuit stays open before a trial command.
+            clock (Callable[[], float], optional): Time source. Defaults to time.monotonic.
+        """
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._failed = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if not self._probing and self.clock() - self._opened_at >= self.reset_seconds:
+            self._probing = True
+            return True
+        return False
+
+    def success(self):
+        if self._opened_at is not None:
+            logger.info("Redis is available again, closing the circuit")
+        self._failed = 0
+        self._opened_at = None
+        self._probing = False
+        REDIS_CIRCUIT_OPEN.set(0)
+
+    def failure(self):
+        self._failed += 1
+        self._probing = False
+        if self._opened_at is not None or self._failed >= self.failures:
+            if self._opened_at is None:
+                logger.warning("Redis failed %d times in a row, opening the circuit for %ss",
+                               self._failed, self.reset_seconds)
+            self._opened_at = self.clock()
+            REDIS_CIRCUIT_OPEN.set(1)
+
+    async def call(self, command: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Args:
+            command (Callable[[], Awaitable[Any]]): Sends the command and returns the reply.
+
+        Returns:
+            Any: Reply of the command.
+
+        Raises:
+            CircuitOpenError: The circuit is open, the command was not sent.
+        """
+        if not self.allow():
+            REDIS_REJECTED.inc()
+            raise CircuitOpenError("Redis circuit is open")
+        try:
+            result = await command()
+        except (ConnectionError, TimeoutError, asyncio.TimeoutError):
+            self.failure()
+            raise
+        except BaseException:
+            self._probing = False
+            raise
+        self.success()
+        return result
+
+
+breaker = CircuitBreaker(settings.redis_breaker_failures, settings.redis_breaker_reset_seconds)
+
+
+class GuardedPipeline(Pipeline):
+
+    async def execute(self, raise_on_error: bool = True):
+        execute = super().execute
+        async with deadline.timeout():
+            return await breaker.call(lambda: execute(raise_on_error))
+
+
+class GuardedRedis(redis.Redis):
+    """
+    Client whose commands and pipelines go through the circuit breaker and are cancelled
+    when the time budget of the request runs out.
+    """
+
+    async def execute_command(self, *args, **options):
+        execute_command = super().execute_command
+        async with deadline.timeout():
+            return await breaker.call(lambda: execute_command(*args, **options))
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> GuardedPipeline:
+        return GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = WeakKeyDictionary()
+
+
+def _connection_kwargs() -> dict:
+    return dict(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
+                socket_connect_timeout=settings.redis_connect_timeout)
+
+
+def get_redis(decode_responses: bool = True) -> redis.Redis:
+    """
+    Shared asyncio Redis client of the running event loop. All the Redis users of the worker
+    (auth cache, rate limiter, idempotency keys, change stream) go through its connection pool
+    of REDIS_MAX_CONNECTIONS; a command waits up to REDIS_POOL_TIMEOUT for a free connection,
+    times out after REDIS_SOCKET_TIMEOUT and fails fast while the circuit breaker is open.
+
+    Args:
+        decode_responses (bool, optional): Decode the responses to str, pass False for binary values. Defaults to True.
+
+    Returns:
+        redis.Redis: Redis client.
+    """
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(decode_responses)
+    if client is None:
+        pool = redis.BlockingConnectionPool(**_connection_kwargs(), decode_responses=decode_responses,
+                                            socket_timeout=settings.redis_socket_timeout,
+                                            max_connections=settings.redis_max_connections,
+                                            timeout=settings.redis_pool_timeout)
+        client = clients[decode_responses] = GuardedRedis(connection_pool=pool)
+    return client
+
+
+def get_pubsub() -> PubSub:
+    """
+    PubSub on a connection of its own. A subscriber waits for messages indefinitely, so it does
+    not use the read timeout of the shared pool and does not take one of its connections.
+
+    Returns:
+        PubSub: Not yet subscribed PubSub.
+    """
+    return redis.Redis(**_connection_kwargs(), decode_responses=True).pubsub()
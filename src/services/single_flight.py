@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import pickle
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from redis.exceptions import RedisError
+
+from src.services.metrics import Counter
+from src.services.redis_client import CircuitOpenError, get_redis
+
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class SingleFlightCache:
+    """
+    Read-through Redis cache in which concurrent misses of a key share one load.
+
+    Within the worker the callers of a key await the same future. Across workers the loader takes
+    a short Redis lock (SET NX PX) and the other workers poll for the value instead of loading it
+    too. The TTLs get random jitter, so entries written together do not expire together, and an
+    entry read during the last ``refresh_ahead`` part of its TTL is reloaded by one request while
+    the others keep getting the cached value, so popular entries never expire under load.
+    """
+
+    def __init__(self, name: str, ttl: int, jitter: float = 0.1, refresh_ahead: float = 0.2,
+                 lock_ms: int = 3000, poll_ms: int = 20, metric: Counter | None = None, max_bytes: int | None = None,
+                 dumps: Callable[[Any], bytes] = pickle.dumps, loads: Callable[[bytes], Any] = pickle.loads):
+        """
+        Args:
+            name (str): Name of the cache for the logs.
+            ttl (int): Seconds an entry lives in Redis before the jitter.
+            jitter (float, optional): Relative random deviation of the TTL. Defaults to 0.1.
+            refresh_ahead (float, optional): Part of the TTL before the expiry in which a read reloads the entry. Defaults to 0.2.
+            lock_ms (int, optional): Lifetime of the load lock and the longest wait for another worker. Defaults to 3000.
+            poll_ms (int, optional): Interval of checks for the value loaded by another worker. Defaults to 20.
+            metric (Counter | None, optional): Counter with the "result" label: hit, miss, coalesced, refresh,
+                oversize. Defaults to None.
+            max_bytes (int | None, optional): Serialized values above this size are not stored. Defaults to None.
+            dumps (Callable, optional): Serializer of the values. Defaults to pickle.dumps.
+            loads (Callable, optional): Deserializer of the values. Defaults to pickle.loads.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.jitter = jitter
+        self.refresh_ahead = refresh_ahead
+        self.lock_ms = lock_ms
+        self.poll_ms = poll_ms
+        self.max_bytes = max_bytes
+        self.dumps = dumps
+        self.loads = loads
+        self._results = {result: metric.labels(result) for result in ("hit", "miss", "coalesced", "refresh", "oversize")} if metric else {}
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    def _count(self, result: str):
+        child = self._results.get(result)
+        if child is not None:
+            child.inc()
+
+    async def get(self, key: str, loader: Loader) -> Any:
+        """
+        Args:
+            key (str): Redis key.
+            loader (Loader): Coroutine function that loads the value on a miss. None results are not cached.
+
+        Returns:
+            Any: Cached or loaded value.
+        """
+        r = get_redis(decode_responses=False)
+        cached = await self._read(r, key)
+        if cached is not None:
+            refresh_at, value = cached
+            if time.time() < refresh_at or key in self._flights or not await self._lock(r, key):
+                self._count("hit")
+                return value
+            self._count("refresh")
+            return await self._fly(key, lambda: self._load(r, key, loader, locked=True))
+
+        while key in self._flights:
+            flight = self._flights[key]
+            self._count("coalesced")
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+            except Exception:
+                pass
+            # The load of the request that started the flight failed (e.g. it ran out of its own
+            # time budget), this request loads again with its own.
+
+        async def load():
+            return await self._load(r, key, loader, locked=await self._lock(r, key))
+        return await self._fly(key, load)
+
+    async def invalidate(self, key: str):
+        try:
+            await get_redis(decode_responses=False).delete(key)
+        except RedisError:
+            logger.warning("Could not invalidate %s in the %s cache", key, self.name, exc_info=True)
+
+    async def _fly(self, key: str, load: Loader) -> Any:
+        """
+        Run the load in a task of its own, so a cancelled caller (a client that went away or ran out
+        of time) does not cancel the load the other callers of the key wait for.
+        """
+        flight = asyncio.ensure_future(load())
+        self._flights[key] = flight
+
+        def land(task: asyncio.Future):
+            if self._flights.get(key) is task:
+                del self._flights[key]
+            if not task.cancelled():
+                # Retrieved, so a failed load nobody waits for any more is not logged as never retrieved.
+                task.exception()
+        flight.add_done_callback(land)
+        return await asyncio.shield(flight)
+
+    async def _load(self, r, key: str, loader: Loader, locked: bool) -> Any:
+        if not locked:
+            deadline = time.monotonic() + self.lock_ms / 1000
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_ms / 1000)
+                cached = await self._read(r, key)
+                if cached is not None:
+                    self._count("coalesced")
+                    return cached[1]
+        self._count("miss")
+        try:
+            value = await loader()
+        except BaseException:
+            if locked:
+                await self._unlock(r, key)
+            raise
+        if value is not None or locked:
+            await self._write(r, key, value, unlock=locked)
+        return value
+
+    async def _lock(self, r, key: str) -> bool:
+        try:
+            return bool(await r.set(f"{key}:lock", b"1", nx=True, px=self.lock_ms))
+        except RedisError:
+            return True
+
+    async def _read(self, r, key: str) -> tuple | None:
+        try:
+            data = await r.get(key)
+        except CircuitOpenError:
+            return None
+        except RedisError:
+            logger.warning("Reading %s from the %s cache failed", key, self.name, exc_info=True)
+            return None
+        if data is None:
+            return None
+        try:
+            entry = self.loads(data)
+        except Exception:
+            return None
+        return entry if isinstance(entry, tuple) and len(entry) == 2 else None
+
+    async def _unlock(self, r, key: str):
+        try:
+            await r.delete(f"{key}:lock")
+        except RedisError:
+            pass
+
+    async def _write(self, r, key: str, value: Any, unlock: bool = False):
+        """
+        Store the value and release the load lock in one round trip. None values and values above
+        ``max_bytes`` are not stored.
+        """
+        ttl = max(1, round(self.ttl * random.uniform(1 - self.jitter, 1 + self.jitter)))
+        refresh_at = time.time() + ttl * (1 - self.refresh_ahead)
+        data = self.dumps((refresh_at, value)) if value is not None else None
+        if data is not None and self.max_bytes and len(data) > self.max_bytes:
+            self._count("oversize")
+            data = None
+        if data is None and not unlock:
+            return
+        try:
+            async with r.pipeline(transaction=False) as pipe:
+                if data is not None:
+                    pipe.set(key, data, ex=ttl)
+                if unlock:
+                    pipe.delete(f"{key}:lock")
+                await pipe.execute()
+        except CircuitOpenError:
+            pass
+        except RedisError:
+            logger.warning("Writing %s to the %s cache failed", key, self.name, exc_info=True)
@@ -0,0 +1,159 @@
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Contact
+
+
+ContactFields = Tuple[str, str, str | None]
+
+
+def _terms(fields: ContactFields) -> set:
+    return {value.casefold() for value in fields if value}
+
+
+class PrefixIndex:
+    """
+    Sorted array of (term, contact id) pairs of one user. Terms are the casefolded
+    name, surname and email, a prefix lookup is a bisect plus a short scan.
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[str, int]] = []
+        self.contacts: Dict[int, ContactFields] = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, contact_id: int, fields: ContactFields):
+        if contact_id in self.contacts:
+            self.remove(contact_id)
+        self.contacts[contact_id] = fields
+        for term in _terms(fields):
+            insort(self.entries, (term, contact_id))
+
+    def remove(self, contact_id: int):
+        fields = self.contacts.pop(contact_id, None)
+        if fields is None:
+            return
+        for term in _terms(fields):
+            i = bisect_left(self.entries, (term, contact_id))
+            if i < len(self.entries) and self.entries[i] == (term, contact_id):
+                del self.entries[i]
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        prefix = prefix.casefold()
+        found = []
+        seen = set()
+        i = bisect_left(self.entries, (prefix,))
+        while i < len(self.entries) and len(found) < limit:
+            term, contact_id = self.entries[i]
+            if not term.startswith(prefix):
+                break
+            if contact_id not in seen:
+                seen.add(contact_id)
+                name, surname, email = self.contacts[contact_id]
+                found.append({"id": contact_id, "name": name, "surname": surname, "email": email})
+            i += 1
+        return found
+
+    @classmethod
+    def build(cls, rows: Iterable) -> "PrefixIndex":
+        index = cls()
+        entries = []
+        for contact_id, name, surname, email in rows:
+            fields = (name, surname, email)
+            index.contacts[contact_id] = fields
+            entries.extend((term, contact_id) for term in _terms(fields))
+        entries.sort()
+        index.entries = entries
+        return index
+
+
+class SuggestIndexes:
+    """
+    Per-worker LRU of prefix indexes. An index is built on the first suggest request of a user and
+    kept up to date by the contacts repository. It remembers the query cache version of the user's
+    contacts it was built at (see ``src.services.query_cache``); every write bumps the version, so an
+    index that missed a write of another worker is rebuilt on the next request. Without Redis there
+    is no version and the index is rebuilt after SUGGEST_INDEX_TTL_SECONDS instead, which bounds how
+    stale it gets. When the indexes hold more than SUGGEST_MAX_ENTRIES terms in total, the least
+    recently used ones are dropped.
+    """
+
+    def __init__(self):
+        self._indexes: "OrderedDict[int, Tuple[PrefixIndex, float, str | None]]" = OrderedDict()
+        self._entries = 0
+
+    def _evict(self):
+        while self._entries > settings.suggest_max_entries and len(self._indexes) > 1:
+            _, (index, _, _) = self._indexes.popitem(last=False)
+            self._entries -= len(index)
+
+    def _resize(self, index: PrefixIndex, before: int):
+        self._entries += len(index) - before
+
+    def get(self, user_id: int, db: Session, version: str | None = None) -> PrefixIndex:
+        """
+        Args:
+            user_id (int): Owner of the contacts.
+            db (Session): Session used to build the index on a miss.
+            version (str | None, optional): Current version of the user's contacts, None when it is
+                not known. Defaults to None.
+
+        Returns:
+            PrefixIndex: Index of the user's contacts.
+        """
+        cached = self._indexes.get(user_id)
+        if cached is not None and time.monotonic() - cached[1] < settings.suggest_index_ttl_seconds \
+                and (version is None or version == cached[2]):
+            self._indexes.move_to_end(user_id)
+            return cached[0]
+        self.drop(user_id)
+        rows = db.execute(select(Contact.id, Contact.name, Contact.surname, Contact.email)
+                          .where(Contact.user_id == user_id))
+        index = PrefixIndex.build(rows)
+        self._indexes[user_id] = (index, time.monotonic(), version)
+        self._entries += len(index)
+        self._evict()
+        return index
+
+    def upsert(self, user_id: int, contacts: Iterable[Contact]):
+        """
+        Adds or replaces contacts in the user's index if it is loaded.
+        """
+        cached = self._indexes.get(user_id)
+        if cached is None:
+            return
+        index = cached[0]
+        before = len(index)
+        for contact in contacts:
+            index.add(contact.id, (contact.name, contact.surname, contact.email))
+        self._resize(index, before)
+        self._evict()
+
+    def delete(self, user_id: int, contact_ids: Iterable[int]):
+        """
+        Removes contacts from the user's index if it is loaded.
+        """
+        cached = self._indexes.get(user_id)
+        if cached is None:
+            return
+        index = cached[0]
+        before = len(index)
+        for contact_id in contact_ids:
+            index.remove(contact_id)
+        self._resize(index, before)
+
+    def drop(self, user_id: int):
+        cached = self._indexes.pop(user_id, None)
+        if cached is not None:
+            self._entries -= len(cached[0])
+
+
+suggest_indexes = SuggestIndexes()
@@ -8,9 +8,11 @@ from src.database.models import Base
 from src.database.db import get_db
 import sys
 import os
+import tempfile
 
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+# A fresh file per test run, outside the working tree.
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='contacts-tests-'), 'test.db')}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
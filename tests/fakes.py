@@ -0,0 +1,67 @@
+"""
+In-memory stand-ins of the async Redis client shared by the tests.
+"""
+from redis.exceptions import ConnectionError
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def set(self, *args, **kwargs):
+        self.commands.append((self.redis.set, args, kwargs))
+
+    def delete(self, *args):
+        self.commands.append((self.redis.delete, args, {}))
+
+    async def execute(self):
+        # Like Redis, the queued commands only run on execute, so a pipeline that is never
+        # executed changes nothing.
+        commands, self.commands = self.commands, []
+        return [await method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class FakeRedis:
+    """
+    The commands of the async Redis client used by the caches and the Idempotency dependency,
+    shared by the "workers" of a test.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        self.ttls[key] = ex
+        return True
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class BrokenRedis:
+
+    async def get(self, key, *args, **kwargs):
+        raise ConnectionError("down")
+
+    set = delete = get
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.loadtest import Recorder, percentile
+from benchmarks.read_path import run as run_read_path
+from benchmarks.repository import compare, main as run_repository_benchmarks
+from benchmarks.seed import seed
+from src.database.models import Contact, User
+
+
+class TestSeed(unittest.TestCase):
+
+    def test_seed(self):
+        engine = create_engine("sqlite://")
+        result = seed(engine, users=3, contacts=20, create_schema=True)
+        self.assertEqual(result["contacts"], 60)
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute(select(func.count()).select_from(User)).scalar_one(), 3)
+            self.assertEqual(conn.execute(select(func.count()).where(User.confirmed.is_(True))).scalar_one(), 3)
+            counts = conn.execute(select(Contact.user_id, func.count()).group_by(Contact.user_id)).all()
+            # ContactResponse requires an email.
+            self.assertEqual(conn.execute(select(func.count()).where(Contact.email.is_(None))).scalar_one(), 0)
+        self.assertEqual(sorted(count for _, count in counts), [20, 20, 20])
+
+    def test_seed_is_reproducible(self):
+        rows = []
+        for _ in range(2):
+            engine = create_engine("sqlite://")
+            seed(engine, users=1, contacts=10, seed_value=7, create_schema=True)
+            with engine.connect() as conn:
+                rows.append(conn.execute(select(Contact.name, Contact.mobile, Contact.birthday)).all())
+        self.assertEqual(rows[0], rows[1])
+
+
+class TestLoadReport(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_report(self):
+        recorder = Recorder()
+        for i in range(10):
+            recorder.record("list", 200, (i + 1) / 1000)
+        recorder.record("list", 500, 0.5)
+        recorder.record("list", 429, 0.0001)
+        recorder.record("search", 429, 0.0001)
+        report = recorder.report(duration=2)
+        self.assertEqual(report["requests"], 11)
+        self.assertEqual(report["rate_limited"], 2)
+        self.assertEqual(report["routes"]["list"]["errors"], 1)
+        self.assertEqual(report["routes"]["list"]["rate_limited"], 1)
+        self.assertEqual(report["routes"]["list"]["statuses"], {"200": 10, "429": 1, "500": 1})
+        self.assertEqual(report["routes"]["list"]["p50_ms"], 6.0)
+        self.assertEqual((report["routes"]["search"]["requests"], report["routes"]["search"]["p99_ms"]), (0, 0.0))
+
+
+class TestRepositoryBenchmarks(unittest.TestCase):
+
+    def test_compare(self):
+        baseline = {"sqlite:1000:get_contacts": 0.010, "sqlite:1000:get_contact": 0.001}
+        results = {"sqlite:1000:get_contacts": 0.0115, "sqlite:1000:get_contact": 0.002, "sqlite:1000:new": 1.0}
+        regressions = compare(results, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("sqlite:1000:get_contact:"))
+
+    def test_check_without_baseline_fails(self):
+        with tempfile.TemporaryDirectory() as directory:
+            argv = ["repository", "--baseline", str(Path(directory) / "baseline.json")]
+            with patch("sys.argv", argv), patch("benchmarks.repository.run_scale") as run_scale:
+                with self.assertRaises(SystemExit) as raised:
+                    run_repository_benchmarks()
+        self.assertIn("No baseline", str(raised.exception.code))
+        run_scale.assert_not_called()
+
+
+
+class TestReadPathBenchmark(unittest.TestCase):
+
+    def test_run(self):
+        results = run_read_path("sqlite://", rows=50, repeat=2)
+        self.assertEqual(set(results), {"orm", "rows"})
+        self.assertTrue(all(result["ms"] > 0 and result["peak_kib"] > 0 for result in results.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
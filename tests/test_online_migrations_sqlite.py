@@ -0,0 +1,82 @@
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, insert, inspect, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Contact, User
+from src.database.online_migrations import BACKFILLS, add_column_online, backfill_status, create_index_concurrently
+from src.services.dedup import contact_keys
+
+
+@pytest.fixture
+def database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'contacts.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": 1, "email": "a@example.com", "password": "hash"}])
+        connection.execute(insert(Contact), [{"user_id": 1, "name": f"Name{i}", "surname": "Melnyk",
+                                              "mobile": f"+38050{i:07d}", "email": f"n{i}@example.com"}
+                                             for i in range(2500)])
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def test_backfill_is_batched_and_resumable(database):
+    engine, session_factory = database
+    duplicate_keys = BACKFILLS["contact_duplicate_keys"]
+
+    progress = duplicate_keys.run(session_factory, batch_size=1000, max_batches=2)
+    assert progress == {"last_id": 2000, "rows_done": 2000, "finished": False}
+    with engine.connect() as connection:
+        assert connection.scalar(select(sa.func.count()).where(Contact.name_key.is_(None))) == 500
+
+    progress = duplicate_keys.run(session_factory, batch_size=1000)
+    assert progress == {"last_id": 2500, "rows_done": 2500, "finished": True}
+    with engine.connect() as connection:
+        rows = connection.execute(select(Contact.name, Contact.surname, Contact.mobile, Contact.email,
+                                         Contact.email_key, Contact.mobile_key, Contact.name_key)).all()
+    assert all({"email_key": row.email_key, "mobile_key": row.mobile_key, "name_key": row.name_key}
+               == contact_keys(row.name, row.surname, row.mobile, row.email) for row in rows)
+
+    assert duplicate_keys.run(session_factory)["rows_done"] == 2500
+    assert duplicate_keys.run(session_factory, restart=True) == {"last_id": 2500, "rows_done": 0, "finished": True}
+    [status] = backfill_status(session_factory)
+    assert status["name"] == "contact_duplicate_keys" and status["finished_at"] is not None
+
+
+def test_schema_helpers(database):
+    engine, _ = database
+    with engine.begin() as connection, Operations.context(MigrationContext.configure(connection)):
+        with pytest.raises(ValueError):
+            add_column_online("contacts", sa.Column("nickname", sa.String(50), nullable=False))
+        add_column_online("contacts", sa.Column("nickname", sa.String(50), nullable=True))
+        create_index_concurrently("ix_contacts_user_id_nickname", "contacts", ["user_id", "nickname"])
+    inspector = inspect(engine)
+    assert "nickname" in {column["name"] for column in inspector.get_columns("contacts")}
+    assert "ix_contacts_user_id_nickname" in {index["name"] for index in inspector.get_indexes("contacts")}
+
+
+def test_change_seq_backfill(database):
+    engine, session_factory = database
+    with engine.begin() as connection:
+        connection.execute(insert(Contact).values(user_id=1, name="New", surname="Melnyk", mobile="+380500000000",
+                                                  email="new@example.com", change_seq=5000))
+
+    progress = BACKFILLS["contact_change_seq"].run(session_factory, batch_size=1000)
+    assert progress == {"last_id": 2501, "rows_done": 2500, "finished": True}
+    with engine.connect() as connection:
+        rows = connection.execute(select(Contact.id, Contact.change_seq, Contact.updated_at)).all()
+    assert all(row.change_seq == (5000 if row.id == 2501 else row.id) and row.updated_at is not None for row in rows)
+
+
+def test_name_keys_backfill(database):
+    engine, session_factory = database
+    with engine.begin() as connection:
+        connection.execute(insert(Contact).values(user_id=1, name="Олена", surname="Мельник", mobile="+380500000000",
+                                                  email="olena@example.com", name_key="олена:мельник"))
+
+    progress = BACKFILLS["contact_name_keys"].run(session_factory)
+    assert progress["rows_done"] == 1
+    with engine.connect() as connection:
+        assert connection.scalar(select(Contact.name_key).where(Contact.name == "Олена")) == "O450:M452"
@@ -0,0 +1,427 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from typing import List
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, User, Contact, ContactTombstone
+from src.schemas import ContactBase, ContactResponse, DuplicateGroup, ContactOperation, BatchResult, CONTACT_FIELDS, \
+    contact_list_adapter, batch_result_adapter
+from src.database.shards import get_contacts_session_factory
+from src.repository import contacts as repository_contacts
+from src.routes import dashboard
+from src.services.auth import auth_service
+from src.services import query_cache as query_cache_module
+from src.services import single_flight as single_flight_module
+from src.services.metrics import CONTACT_QUERY_CACHE
+from src.services.suggest import suggest_indexes
+from tests.fakes import FakeRedis
+
+
+def contact_body(name="Olena", surname="Melnyk", mobile="+380501234567", email="olena@example.com",
+                 birthday=datetime(1990, 5, 17)) -> ContactBase:
+    return ContactBase(name=name, surname=surname, mobile=mobile, email=email, birthday=birthday)
+
+
+class SqliteTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Repository tests against a real in-memory SQLite database.
+    """
+
+    def database_url(self) -> str:
+        return "sqlite://"
+
+    def setUp(self):
+        self.engine = create_engine(self.database_url())
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)()
+        self.user = User(username="owner", email="owner@example.com", password="x", confirmed=True)
+        self.other = User(username="other", email="other@example.com", password="x", confirmed=True)
+        self.session.add_all([self.user, self.other])
+        self.session.commit()
+
+    def tearDown(self):
+        suggest_indexes.drop(self.user.id)
+        suggest_indexes.drop(self.other.id)
+        self.session.close()
+        self.engine.dispose()
+
+
+class TestContactsCount(SqliteTestCase):
+
+    async def test_counter_follows_create_and_remove(self):
+        first = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(name="Taras"), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(), self.other, self.session)
+        self.assertEqual(await repository_contacts.count_contacts(self.user, self.session), 2)
+
+        await repository_contacts.remove_contact(first.id, self.user, self.session)
+        await repository_contacts.remove_contact(first.id, self.user, self.session)
+        self.assertEqual(await repository_contacts.count_contacts(self.user, self.session), 1)
+        self.assertEqual(await repository_contacts.count_contacts(self.other, self.session), 1)
+
+    async def test_reconcile(self):
+        await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        self.session.execute(update(User).where(User.id == self.user.id).values(contacts_count=10))
+        self.session.commit()
+        self.assertEqual(repository_contacts.reconcile_contacts_counts(self.session), 1)
+        self.assertEqual(await repository_contacts.count_contacts(self.user, self.session), 1)
+        self.assertEqual(repository_contacts.reconcile_contacts_counts(self.session), 0)
+
+
+class TestDuplicates(SqliteTestCase):
+
+    async def test_groups_by_keys(self):
+        first = await repository_contacts.create_contact(
+            contact_body(email="Olena@Example.com", mobile="+38 (050) 123-45-67"), self.user, self.session)
+        second = await repository_contacts.create_contact(
+            contact_body(name="Olena", surname="Melnik", email="olena@example.com", mobile="0987654321"), self.user, self.session)
+        await repository_contacts.create_contact(
+            contact_body(name="Taras", surname="Koval", email="taras@example.com", mobile="380501234567"), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(), self.other, self.session)
+
+        groups = await repository_contacts.get_duplicates(self.user, self.session)
+        by_reason = {group["reason"]: group for group in groups}
+        self.assertEqual(set(by_reason), {"email", "mobile", "name"})
+        self.assertEqual([c.id for c in by_reason["email"]["contacts"]], [first.id, second.id])
+        self.assertEqual(by_reason["mobile"]["key"], "380501234567")
+        self.assertEqual(len(by_reason["mobile"]["contacts"]), 2)
+        self.assertEqual(by_reason["name"]["key"], "O450:M452")
+        DuplicateGroup.model_validate(by_reason["email"])
+
+    async def test_fills_missing_keys(self):
+        self.session.add_all([Contact(name="Ivan", surname="Moroz", mobile="1", user_id=self.user.id),
+                              Contact(name="Ivan", surname="Moroz", mobile="2", user_id=self.user.id)])
+        self.session.commit()
+        groups = await repository_contacts.get_duplicates(self.user, self.session)
+        self.assertEqual([(group["reason"], len(group["contacts"])) for group in groups], [("name", 2)])
+        self.assertEqual(repository_contacts.fill_duplicate_keys(self.user, self.session), 0)
+
+    async def test_merge(self):
+        primary = await repository_contacts.create_contact(contact_body(email=""), self.user, self.session)
+        duplicate = await repository_contacts.create_contact(contact_body(email="olena@example.com"), self.user, self.session)
+        foreign = await repository_contacts.create_contact(contact_body(), self.other, self.session)
+
+        merged = await repository_contacts.merge_contacts(primary.id, [duplicate.id, foreign.id, primary.id],
+                                                          self.user, self.session)
+        self.assertEqual(merged.id, primary.id)
+        self.assertEqual(merged.email, "olena@example.com")
+        self.assertEqual(await repository_contacts.count_contacts(self.user, self.session), 1)
+        self.assertEqual(await repository_contacts.count_contacts(self.other, self.session), 1)
+        self.assertIsNone(await repository_contacts.merge_contacts(foreign.id, [primary.id], self.user, self.session))
+
+
+class TestSuggest(SqliteTestCase):
+
+    async def test_index_follows_writes(self):
+        olena = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(name="Oleh"), self.other, self.session)
+        result = await repository_contacts.suggest_contacts("ole", 10, self.user, self.session)
+        self.assertEqual([c["id"] for c in result], [olena.id])
+
+        oleh = await repository_contacts.create_contact(contact_body(name="Oleh", email="oleh@example.com"), self.user, self.session)
+        await repository_contacts.update_contact(olena.id, contact_body(name="Iryna", email="iryna@example.com"), self.user, self.session)
+        result = await repository_contacts.suggest_contacts("ole", 10, self.user, self.session)
+        self.assertEqual([c["id"] for c in result], [oleh.id])
+
+        await repository_contacts.remove_contact(oleh.id, self.user, self.session)
+        self.assertEqual(await repository_contacts.suggest_contacts("ole", 10, self.user, self.session), [])
+        result = await repository_contacts.suggest_contacts("iry", 10, self.user, self.session)
+        self.assertEqual(result, [{"id": olena.id, "name": "Iryna", "surname": "Melnyk", "email": "iryna@example.com"}])
+
+    async def test_index_follows_writes_of_other_workers(self):
+        redis = FakeRedis()
+        with patch.object(query_cache_module, "get_redis", return_value=redis):
+            olena = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+            self.assertEqual(len(await repository_contacts.suggest_contacts("ole", 10, self.user, self.session)), 1)
+            # Another worker adds a contact: this worker's index does not see the insert, only the bump.
+            oleh = Contact(user_id=self.user.id, **contact_body(name="Oleh").model_dump())
+            self.session.add(oleh)
+            self.session.commit()
+            result = await repository_contacts.suggest_contacts("ole", 10, self.user, self.session)
+            self.assertEqual([c["id"] for c in result], [olena.id])
+            await repository_contacts.query_cache.bump(self.user.id)
+            result = await repository_contacts.suggest_contacts("ole", 10, self.user, self.session)
+            self.assertEqual(sorted(c["id"] for c in result), sorted([olena.id, oleh.id]))
+
+
+class TestChanges(SqliteTestCase):
+
+    async def test_delta_sync(self):
+        first = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        second = await repository_contacts.create_contact(contact_body(name="Taras"), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(), self.other, self.session)
+
+        full = await repository_contacts.get_changes(None, 100, self.user, self.session)
+        self.assertEqual([c.id for c in full["contacts"]], [first.id, second.id])
+        self.assertEqual(full["deleted"], [])
+        token = int(full["next_token"])
+
+        nothing = await repository_contacts.get_changes(token, 100, self.user, self.session)
+        self.assertEqual((nothing["contacts"], nothing["deleted"], nothing["next_token"]), ([], [], str(token)))
+
+        await repository_contacts.update_contact(first.id, contact_body(name="Iryna"), self.user, self.session)
+        await repository_contacts.remove_contact(second.id, self.user, self.session)
+        third = await repository_contacts.create_contact(contact_body(name="Oleh"), self.user, self.session)
+        delta = await repository_contacts.get_changes(token, 100, self.user, self.session)
+        self.assertEqual([c.id for c in delta["contacts"]], [first.id, third.id])
+        self.assertEqual(delta["deleted"], [second.id])
+        self.assertFalse(delta["has_more"])
+
+        page = await repository_contacts.get_changes(token, 2, self.user, self.session)
+        self.assertEqual(([c.id for c in page["contacts"]], page["deleted"], page["has_more"]), ([first.id], [second.id], True))
+        rest = await repository_contacts.get_changes(int(page["next_token"]), 2, self.user, self.session)
+        self.assertEqual(([c.id for c in rest["contacts"]], rest["has_more"]), ([third.id], False))
+
+    async def test_merge_writes_tombstones(self):
+        primary = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        duplicate = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        token = int((await repository_contacts.get_changes(None, 100, self.user, self.session))["next_token"])
+        await repository_contacts.merge_contacts(primary.id, [duplicate.id], self.user, self.session)
+        delta = await repository_contacts.get_changes(token, 100, self.user, self.session)
+        self.assertEqual(([c.id for c in delta["contacts"]], delta["deleted"]), ([primary.id], [duplicate.id]))
+
+    async def test_pruned_tombstones_reset_old_tokens(self):
+        first = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        second = await repository_contacts.create_contact(contact_body(name="Taras"), self.user, self.session)
+        old_token = int((await repository_contacts.get_changes(None, 100, self.user, self.session))["next_token"])
+        await repository_contacts.remove_contact(first.id, self.user, self.session)
+        token = int((await repository_contacts.get_changes(old_token, 100, self.user, self.session))["next_token"])
+        await repository_contacts.remove_contact(second.id, self.user, self.session)
+        self.session.execute(update(ContactTombstone).where(ContactTombstone.contact_id == first.id)
+                             .values(deleted_at=datetime.now() - timedelta(days=60)))
+        self.session.commit()
+
+        pruned = repository_contacts.prune_tombstones(datetime.now() - timedelta(days=30), self.session)
+        self.assertEqual(pruned, 1)
+        stale = await repository_contacts.get_changes(old_token, 100, self.user, self.session)
+        self.assertEqual((stale["deleted"], stale["reset"]), ([], True))
+        # The tokens after the pruned deletion still get the kept tombstones.
+        delta = await repository_contacts.get_changes(token, 100, self.user, self.session)
+        self.assertEqual((delta["deleted"], delta["reset"]), ([second.id], False))
+        # A second run with nothing to prune keeps the watermark.
+        repository_contacts.prune_tombstones(datetime.now() - timedelta(days=30), self.session)
+        self.assertTrue((await repository_contacts.get_changes(old_token, 100, self.user, self.session))["reset"])
+        full = await repository_contacts.get_changes(None, 100, self.user, self.session)
+        self.assertFalse(full["reset"])
+
+
+class TestBatch(SqliteTestCase):
+
+    def data(self, **kwargs) -> dict:
+        return contact_body(**kwargs).model_dump(mode="json")
+
+    async def test_atomic_batch(self):
+        existing = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        removed_id = (await repository_contacts.create_contact(contact_body(name="Taras"), self.user, self.session)).id
+        token = int((await repository_contacts.get_changes(None, 100, self.user, self.session))["next_token"])
+        operations = [
+            ContactOperation(op="create", data=self.data(name="Oleh")),
+            ContactOperation(op="update", id=existing.id, data=self.data(name="Iryna")),
+            ContactOperation(op="delete", id=removed_id),
+            ContactOperation(op="create", data=self.data(name="Petro")),
+        ]
+        result = await repository_contacts.apply_batch(operations, "atomic", self.user, self.session)
+        BatchResult.model_validate(result)
+        self.assertTrue(result["committed"])
+        self.assertEqual([r["status"] for r in result["results"]], [201, 200, 200, 201])
+        self.assertEqual([r["contact"].name for r in result["results"] if r["op"] != "delete"], ["Oleh", "Iryna", "Petro"])
+        self.assertEqual(await repository_contacts.count_contacts(self.user, self.session), 3)
+
+        delta = await repository_contacts.get_changes(token, 100, self.user, self.session)
+        self.assertEqual([c.name for c in delta["contacts"]], ["Oleh", "Iryna", "Petro"])
+        self.assertEqual(delta["deleted"], [removed_id])
+
+    async def test_atomic_batch_is_all_or_nothing(self):
+        foreign = await repository_contacts.create_contact(contact_body(), self.other, self.session)
+        operations = [
+            ContactOperation(op="create", data=self.data(name="Oleh")),
+            ContactOperation(op="delete", id=foreign.id),
+            ContactOperation(op="create", data={"name": "No mobile"}),
+        ]
+        result = await repository_contacts.apply_batch(operations, "atomic", self.user, self.session)
+        self.assertFalse(result["committed"])
+        self.assertEqual([r["status"] for r in result["results"]], [424, 404, 422])
+        self.assertEqual(await repository_contacts.count_contacts(self.user, self.session), 0)
+
+    async def test_best_effort_batch(self):
+        existing = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        operations = [
+            ContactOperation(op="create", data=self.data(name="Oleh")),
+            ContactOperation(op="update", id=existing.id, data=self.data(name="Iryna")),
+            ContactOperation(op="delete", id=existing.id),
+            ContactOperation(op="update", data=self.data()),
+        ]
+        result = await repository_contacts.apply_batch(operations, "best_effort", self.user, self.session)
+        self.assertTrue(result["committed"])
+        self.assertEqual([r["status"] for r in result["results"]], [201, 200, 409, 422])
+        self.assertEqual(await repository_contacts.count_contacts(self.user, self.session), 2)
+
+
+class TestFields(SqliteTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(name="Taras", email="taras@example.com"), self.user, self.session)
+
+    async def test_list_selects_only_the_fields(self):
+        fields = ("id", "name", "mobile")
+        rows = await repository_contacts.get_contact_rows(0, 10, self.user, self.session, fields)
+        self.assertEqual([row._fields for row in rows], [fields] * 2)
+        adapter = contact_list_adapter(fields)
+        self.assertEqual(adapter.dump_python(adapter.validate_python(rows, from_attributes=True))[1],
+                         {"id": rows[1].id, "name": "Taras", "mobile": "+380501234567"})
+
+    async def test_search_selects_only_the_fields(self):
+        row = await repository_contacts.get_contact_row_by_name("email", "taras@example.com", self.user, self.session, ("id", "name"))
+        self.assertEqual(row._asdict(), {"id": row.id, "name": "Taras"})
+        self.assertIsNone(await repository_contacts.get_contact_row_by_name("mobile", "x", self.user, self.session, ("id",)))
+
+    async def test_rows_serialize_like_the_orm(self):
+        contacts = await repository_contacts.get_contacts(0, 10, self.user, self.session)
+        rows = await repository_contacts.get_contact_rows(0, 10, self.user, self.session)
+        adapter, orm_adapter = contact_list_adapter(CONTACT_FIELDS), TypeAdapter(List[ContactResponse])
+        self.assertEqual(adapter.dump_json(adapter.validate_python(rows, from_attributes=True)),
+                         orm_adapter.dump_json(orm_adapter.validate_python(contacts)))
+
+    async def test_batch_result_is_trimmed(self):
+        result = await repository_contacts.apply_batch([ContactOperation(op="create", data=contact_body(name="Oleh").model_dump(mode="json"))],
+                                                       "atomic", self.user, self.session)
+        adapter = batch_result_adapter(("id", "name"))
+        contact = adapter.dump_python(adapter.validate_python(result))["results"][0]["contact"]
+        self.assertEqual(contact, {"id": result["results"][0]["id"], "name": "Oleh"})
+
+
+
+class TestStats(SqliteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        patcher = patch.object(single_flight_module, "get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def create(self, created_at: datetime, **kwargs):
+        contact = await repository_contacts.create_contact(contact_body(**kwargs), self.user, self.session)
+        contact.created_at = created_at
+        self.session.commit()
+
+    async def test_aggregates(self):
+        await self.create(datetime(2026, 1, 3), birthday=datetime(1990, 5, 17))
+        await self.create(datetime(2026, 1, 20), birthday=datetime(1985, 5, 1), email="")
+        await self.create(datetime(2026, 3, 1), birthday=datetime(2001, 12, 31))
+        await repository_contacts.create_contact(contact_body(), self.other, self.session)
+
+        stats = await repository_contacts.get_contact_stats(self.user, self.session)
+        self.assertEqual((stats["total"], stats["with_email"]), (3, 2))
+        self.assertAlmostEqual(stats["email_share"], 2 / 3)
+        self.assertEqual(stats["added_per_month"], [{"month": "2026-01", "count": 2}, {"month": "2026-03", "count": 1}])
+        self.assertEqual(stats["birthdays_per_month"], [0, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 1])
+
+    async def test_cache_follows_writes(self):
+        await self.create(datetime(2026, 1, 3))
+        first = await repository_contacts.get_contact_stats(self.user, self.session)
+        with patch.object(repository_contacts, "_contact_stats") as aggregate:
+            self.assertEqual(await repository_contacts.get_contact_stats(self.user, self.session), first)
+            aggregate.assert_not_called()
+
+        await self.create(datetime(2026, 2, 3))
+        second = await repository_contacts.get_contact_stats(self.user, self.session)
+        self.assertEqual(second["total"], 2)
+
+
+class TestQueryCache(SqliteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        for module in (single_flight_module, query_cache_module):
+            patcher = patch.object(module, "get_redis", return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def names(self) -> List[str]:
+        return sorted(row.name for row in await repository_contacts.get_contact_rows(0, 10, self.user, self.session))
+
+    async def test_repeated_reads_skip_the_database(self):
+        await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        hits = CONTACT_QUERY_CACHE.labels("hit").value
+        self.assertEqual(await self.names(), ["Olena"])
+        with patch.object(repository_contacts, "_contact_rows") as query:
+            self.assertEqual(await self.names(), ["Olena"])
+            query.assert_not_called()
+        self.assertEqual(CONTACT_QUERY_CACHE.labels("hit").value, hits + 1)
+
+        row = await repository_contacts.get_contact_row_by_name("email", "olena@example.com", self.user, self.session)
+        with patch.object(repository_contacts, "_contact_row_by_name") as query:
+            cached = await repository_contacts.get_contact_row_by_name("email", "olena@example.com", self.user,
+                                                                       self.session)
+            query.assert_not_called()
+        self.assertEqual(cached, row)
+
+    async def test_writes_bump_the_version(self):
+        contact = await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(), self.other, self.session)
+        self.assertEqual(await self.names(), ["Olena"])
+        other_version = await repository_contacts.query_cache.version(self.other.id)
+
+        await repository_contacts.create_contact(contact_body(name="Taras"), self.user, self.session)
+        self.assertEqual(await self.names(), ["Olena", "Taras"])
+        await repository_contacts.update_contact(contact.id, contact_body(name="Olha"), self.user, self.session)
+        self.assertEqual(await self.names(), ["Olha", "Taras"])
+        await repository_contacts.remove_contact(contact.id, self.user, self.session)
+        self.assertEqual(await self.names(), ["Taras"])
+        self.assertEqual(await repository_contacts.query_cache.version(self.other.id), other_version)
+
+    async def test_large_results_are_not_cached(self):
+        await repository_contacts.create_contact(contact_body(), self.user, self.session)
+        oversize = CONTACT_QUERY_CACHE.labels("oversize").value
+        with patch.object(repository_contacts.query_cache.cache, "max_bytes", 10):
+            await self.names()
+        self.assertEqual(CONTACT_QUERY_CACHE.labels("oversize").value, oversize + 1)
+        self.assertFalse([key for key in self.redis.values if ":rows:" in key])
+
+
+class TestDashboard(SqliteTestCase):
+
+    def database_url(self) -> str:
+        # The dashboard reads with a session per thread, an in-memory database would be one per connection.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return f"sqlite:///{directory.name}/contacts.db"
+
+    async def test_one_request(self):
+        soon = datetime.now() + timedelta(days=3)
+        await repository_contacts.create_contact(contact_body(name="Taras"), self.user, self.session)
+        await repository_contacts.create_contact(contact_body(birthday=soon.replace(year=1990)), self.user,
+                                                 self.session)
+        await repository_contacts.create_contact(contact_body(name="Other"), self.other, self.session)
+        self.user.avatar = "https://example.com/avatar.png"
+        self.session.commit()
+
+        app = FastAPI()
+        app.include_router(dashboard.router, prefix="/api")
+        app.dependency_overrides[auth_service.get_current_user] = lambda: self.user
+        app.dependency_overrides[get_contacts_session_factory] = lambda: sessionmaker(bind=self.engine)
+        app.dependency_overrides[dashboard.dashboard_limiter] = lambda: None
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/dashboard/", params={"limit": 1})
+
+        self.assertEqual(response.status_code, 200, response.text)
+        data = response.json()
+        self.assertEqual(data["user"]["email"], "owner@example.com")
+        self.assertEqual([contact["name"] for contact in data["contacts"]], ["Taras"])
+        self.assertEqual(data["contacts_count"], 2)
+        self.assertEqual([contact["name"] for contact in data["birthdays"]], ["Olena"])
+
+
+if __name__ == '__main__':
+    unittest.main()
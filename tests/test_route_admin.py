@@ -0,0 +1,86 @@
+from src.conf.config import settings
+
+
+def test_admin_routes_forbidden_without_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "admin-secret")
+    response = client.get("/api/admin/profiles")
+    assert response.status_code == 403, response.text
+    response = client.get("/api/admin/profiles", headers={"X-Admin-Token": "wrong"})
+    assert response.status_code == 403, response.text
+
+
+def test_admin_routes_disabled_without_admin_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "")
+    response = client.get("/api/admin/profiles", headers={"X-Admin-Token": ""})
+    assert response.status_code == 403, response.text
+
+
+def test_request_profile(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "admin_token", "admin-secret")
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    response = client.get("/")
+    assert "x-profile-id" not in response.headers
+    response = client.get("/", headers={"X-Profile": "admin-secret"})
+    assert response.status_code == 200, response.text
+    profile_id = response.headers["x-profile-id"]
+
+    response = client.get("/api/admin/profiles", headers={"X-Admin-Token": "admin-secret"})
+    assert response.json() == [profile_id]
+    response = client.get(f"/api/admin/profiles/{profile_id}", headers={"X-Admin-Token": "admin-secret"})
+    assert response.status_code == 200, response.text
+    assert response.text.startswith("# GET / ")
+    response = client.get("/api/admin/profiles/missing", headers={"X-Admin-Token": "admin-secret"})
+    assert response.status_code == 404, response.text
+
+
+def test_old_profiles_are_deleted(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "admin_token", "admin-secret")
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profiles_limit", 2)
+    profile_ids = [client.get("/", headers={"X-Profile": "admin-secret"}).headers["x-profile-id"] for _ in range(3)]
+
+    response = client.get("/api/admin/profiles", headers={"X-Admin-Token": "admin-secret"})
+    assert response.json() == profile_ids[:0:-1]
+    assert len(list(tmp_path.glob("*.collapsed"))) == 2
+
+
+def test_memory_snapshots(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "admin_token", "admin-secret")
+    monkeypatch.setattr(settings, "profile_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "memory_snapshots_limit", 2)
+    headers = {"X-Admin-Token": "admin-secret"}
+    assert client.get("/api/admin/memory", headers=headers).json()["tracing"] is False
+    response = client.post("/api/admin/memory/snapshots", headers=headers)
+    assert response.status_code == 409, response.text
+
+    response = client.post("/api/admin/memory/tracemalloc/start", params={"frames": 2}, headers=headers)
+    try:
+        assert response.json()["tracing"] is True
+        first = client.post("/api/admin/memory/snapshots", headers=headers).json()["id"]
+        leak = [bytearray(1024) for _ in range(1000)]
+        second = client.post("/api/admin/memory/snapshots", headers=headers).json()["id"]
+
+        response = client.get("/api/admin/memory/diff", params={"first": first, "second": second}, headers=headers)
+        assert response.status_code == 200, response.text
+        growth = response.json()[0]
+        assert "test_route_admin.py" in growth["site"]
+        assert growth["size_diff"] >= 1024 * 1000
+        response = client.get(f"/api/admin/memory/snapshots/{second}", params={"group_by": "filename"},
+                              headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()[0]["size"] > 0
+        del leak
+
+        third = client.post("/api/admin/memory/snapshots", headers=headers).json()["id"]
+        assert client.get("/api/admin/memory", headers=headers).json()["snapshots"] == [third, second]
+    finally:
+        client.post("/api/admin/memory/tracemalloc/stop", headers=headers)
+    response = client.get("/api/admin/memory/snapshots/missing", headers=headers)
+    assert response.status_code == 404, response.text
+
+
+def test_live_objects(client, session, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "admin-secret")
+    response = client.get("/api/admin/memory/objects", headers={"X-Admin-Token": "admin-secret"})
+    assert response.status_code == 200, response.text
+    assert response.json()["sessions"] >= 1
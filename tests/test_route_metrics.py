@@ -0,0 +1,54 @@
+import asyncio
+from unittest.mock import patch
+
+from src.services.email import send_email
+from src.services.metrics import EMAIL_FAILED, Registry, Histogram, Counter
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/")
+    assert response.status_code == 200, response.text
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' in response.text
+    assert 'http_requests_in_progress{method="GET",route="/"} 0.0' in response.text
+    assert 'auth_user_cache_total{result="miss"}' in response.text
+
+
+def test_validation_errors_are_recorded_as_422(client):
+    response = client.post("/api/auth/signup", json={"username": "x"})
+    assert response.status_code == 422, response.text
+    text = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/auth/signup",status="422"}' in text
+    assert 'route="/api/auth/signup",status="500"' not in text
+
+
+def test_every_email_failure_is_counted():
+    failed = EMAIL_FAILED.value
+    with patch("src.services.email.get_mail_config", side_effect=ValueError("bad config")):
+        asyncio.run(send_email("user@example.com", "user", "http://test/"))
+    assert EMAIL_FAILED.value == failed + 1
+
+
+def test_histogram_render():
+    registry = Registry()
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0), registry=registry)
+    child = histogram.labels("/a")
+    assert histogram.labels("/a") is child
+    child.observe(0.05)
+    child.observe(0.5)
+    child.observe(5)
+    text = registry.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+
+
+def test_counter_labels():
+    registry = Registry()
+    counter = Counter("events_total", "Events.", ("outcome",), registry=registry)
+    counter.labels("ok").inc()
+    counter.labels("ok").inc(2)
+    assert 'events_total{outcome="ok"} 3.0' in registry.render()
@@ -0,0 +1,146 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database import shards as shards_module
+from src.database.models import Base, Contact, ContactTombstone, User
+from src.database.shards import ShardMap, get_contacts_db, move_user, upgrade_all
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactBase
+
+
+def contact_body(name: str) -> ContactBase:
+    return ContactBase(name=name, surname="Melnyk", mobile="+380501234567", email=f"{name.lower()}@example.com",
+                       birthday="1990-05-17")
+
+
+@pytest.fixture
+def databases(tmp_path):
+    urls = [f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(3)]
+    for url in urls:
+        Base.metadata.create_all(create_engine(url))
+    main_engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    Base.metadata.create_all(main_engine)
+    main = sessionmaker(autocommit=False, autoflush=False, bind=main_engine)
+    with main() as db:
+        db.add_all([User(id=4, username="a", email="a@example.com", password="hash", confirmed=True),
+                    User(id=5, username="b", email="b@example.com", password="hash", confirmed=True)])
+        db.commit()
+    return ShardMap(urls), main
+
+
+def contacts_session(shard_map: ShardMap, main, user_id: int):
+    with main() as db:
+        user = db.get(User, user_id)
+    with patch.object(shards_module, "shard_map", shard_map):
+        dependency = get_contacts_db(user, None)
+        return user, dependency, next(dependency)
+
+
+def test_routing(databases):
+    shard_map, main = databases
+    assert shard_map.shard_for(User(id=4)) == 1
+    assert shard_map.shard_for(User(id=5)) == 2
+    assert shard_map.shard_for(User(id=5, shard=0)) == 0
+
+    user, dependency, db = contacts_session(shard_map, main, 4)
+    assert db.bind.url.database.endswith("shard1.db")
+    shard_user = db.execute(select(User.__table__).where(User.id == 4)).mappings().one()
+    assert (shard_user["email"], shard_user["password"]) == ("a@example.com", "")
+    dependency.close()
+
+
+def test_main_session_without_shards(databases):
+    main_db = object()
+    with patch.object(shards_module, "shard_map", ShardMap([])):
+        assert next(get_contacts_db(User(id=4), main_db)) is main_db
+
+
+def test_moving_user_is_rejected(databases):
+    shard_map, _ = databases
+    with patch.object(shards_module, "shard_map", shard_map), pytest.raises(HTTPException) as error:
+        next(get_contacts_db(User(id=4, shard_moving=True), None))
+    assert error.value.status_code == 503
+
+
+def test_move_user(databases):
+    shard_map, main = databases
+    user, dependency, db = contacts_session(shard_map, main, 4)
+    kept = asyncio.run(repository_contacts.create_contact(contact_body("Olena"), user, db))
+    removed = asyncio.run(repository_contacts.create_contact(contact_body("Taras"), user, db))
+    kept_id, removed_id = kept.id, removed.id
+    asyncio.run(repository_contacts.remove_contact(removed_id, user, db))
+    dependency.close()
+
+    assert move_user(4, 0, main=main, shards=shard_map, grace_seconds=0) == 1
+
+    with main() as main_db:
+        moved = main_db.get(User, 4)
+        assert (moved.shard, moved.shard_moving) == (0, False)
+    user, dependency, db = contacts_session(shard_map, main, 4)
+    assert db.bind.url.database.endswith("shard0.db")
+    assert [contact.id for contact in asyncio.run(repository_contacts.get_contacts(0, 10, user, db))] == [kept_id]
+    assert asyncio.run(repository_contacts.count_contacts(user, db)) == 1
+    changes = asyncio.run(repository_contacts.get_changes(0, 10, user, db))
+    assert (changes["deleted"], changes["next_token"]) == ([removed_id], "3")
+    dependency.close()
+
+    with shard_map.session(1) as old:
+        assert old.execute(select(Contact.id)).first() is None
+        assert old.execute(select(ContactTombstone.id)).first() is None
+        assert old.get(User, 4) is None
+
+
+def test_move_renumbers_taken_ids(databases):
+    shard_map, main = databases
+    other, dependency, db = contacts_session(shard_map, main, 5)
+    taken = asyncio.run(repository_contacts.create_contact(contact_body("Iryna"), other, db)).id
+    dependency.close()
+    user, dependency, db = contacts_session(shard_map, main, 4)
+    moved = asyncio.run(repository_contacts.create_contact(contact_body("Olena"), user, db))
+    moved_id = moved.id
+    token = int(asyncio.run(repository_contacts.get_changes(None, 10, user, db))["next_token"])
+    dependency.close()
+    assert moved_id == taken
+
+    with patch.object(repository_contacts.query_cache, "bump") as bump:
+        assert move_user(4, 2, main=main, shards=shard_map, grace_seconds=0) == 1
+    bump.assert_awaited_once_with(4)
+
+    user, dependency, db = contacts_session(shard_map, main, 4)
+    contacts = asyncio.run(repository_contacts.get_contacts(0, 10, user, db))
+    assert [contact.name for contact in contacts] == ["Olena"] and contacts[0].id != moved_id
+    changes = asyncio.run(repository_contacts.get_changes(token, 10, user, db))
+    assert ([contact.id for contact in changes["contacts"]], changes["deleted"]) == ([contacts[0].id], [moved_id])
+    other_contact = db.get(Contact, taken)
+    assert (other_contact.user_id, other_contact.name) == (5, "Iryna")
+    dependency.close()
+
+
+def test_missing_shard_user_row_is_recreated(databases):
+    shard_map, main = databases
+    user, dependency, db = contacts_session(shard_map, main, 4)
+    # The worker remembers the row, another process deleted it (a move away and back).
+    db.execute(delete(User).where(User.id == 4))
+    db.commit()
+    asyncio.run(repository_contacts.create_contact(contact_body("Olena"), user, db))
+    assert db.execute(select(User.change_seq).where(User.id == 4)).scalar_one() == 1
+    dependency.close()
+
+
+def test_move_to_missing_shard(databases):
+    shard_map, main = databases
+    with pytest.raises(ValueError):
+        move_user(4, 3, main=main, shards=shard_map, grace_seconds=0)
+
+
+def test_upgrade_all_shards(databases):
+    shard_map, _ = databases
+    with patch.object(shards_module, "shard_map", shard_map), patch("alembic.command.upgrade") as upgrade:
+        urls = upgrade_all("head")
+    assert urls[1:] == shard_map.urls
+    assert [call.args[0].attributes["sqlalchemy.url"] for call in upgrade.call_args_list] == urls
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+# Cumulative import time of ``main`` in milliseconds. Override it on slower machines with IMPORT_TIME_BUDGET_MS.
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 2500))
+LAZY_MODULES = ("cloudinary", "fastapi_mail", "passlib")
+
+
+def import_times(module: str) -> dict:
+    """
+    Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter.
+
+    Args:
+        module (str): Module to import.
+
+    Returns:
+        dict: Cumulative import time in microseconds for every imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestStartupImportTime(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The first run may have to write .pyc files, so only the second one is measured.
+        import_times("main")
+        cls.times = import_times("main")
+
+    def test_heavy_integrations_are_lazy(self):
+        for name in LAZY_MODULES:
+            loaded = [module for module in self.times if module == name or module.startswith(f"{name}.")]
+            self.assertEqual(loaded, [], f"{name} is imported at startup")
+
+    def test_import_time_budget(self):
+        total_ms = self.times["main"] / 1000
+        self.assertLessEqual(total_ms, IMPORT_TIME_BUDGET_MS,
+                             f"import main took {total_ms:.0f} ms, budget is {IMPORT_TIME_BUDGET_MS:.0f} ms")
+
+
+if __name__ == '__main__':
+    unittest.main()
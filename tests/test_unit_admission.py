@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from main import app as main_app
+from src.middleware.admission import EXEMPT, AdmissionControlMiddleware, Priority
+from src.services.metrics import ADMISSION_QUEUE, REQUESTS_SHED
+
+
+class TestAdmissionControl(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.release = asyncio.Event()
+        self.started = []
+        app = FastAPI()
+
+        @app.get("/{name}")
+        async def work(name: str):
+            self.started.append(name)
+            await self.release.wait()
+            return {"name": name}
+
+        self.app = app
+        self.client = None
+
+    def middleware(self, **kwargs) -> AdmissionControlMiddleware:
+        options = dict(max_concurrency=1, queue_size=1, queue_timeout=5, retry_after=3,
+                       priorities={"/refresh": Priority.HIGH, "/export": Priority.LOW, "/metrics": EXEMPT})
+        options.update(kwargs)
+        middleware = AdmissionControlMiddleware(self.app, **options)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+        return middleware
+
+    async def asyncTearDown(self):
+        self.release.set()
+        if self.client is not None:
+            await self.client.aclose()
+
+    def get(self, path: str) -> asyncio.Task:
+        return asyncio.create_task(self.client.get(path))
+
+    async def settle(self):
+        for _ in range(20):
+            await asyncio.sleep(0)
+
+    @staticmethod
+    def shed(reason: str, priority: str) -> float:
+        return REQUESTS_SHED.labels(reason, priority).value
+
+    async def test_queue_full_is_shed(self):
+        middleware = self.middleware()
+        shed_before = self.shed("queue_full", "normal")
+        first, second, third = self.get("/a"), self.get("/b"), self.get("/c")
+        await self.settle()
+        self.assertEqual((middleware.active, middleware.waiting), (1, 1))
+
+        response = await third
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "3")
+        self.assertEqual(self.shed("queue_full", "normal"), shed_before + 1)
+
+        self.release.set()
+        self.assertEqual([(await task).status_code for task in (first, second)], [200, 200])
+        self.assertEqual(self.started, ["a", "b"])
+        self.assertEqual((middleware.active, middleware.waiting), (0, 0))
+
+    async def test_queue_timeout(self):
+        middleware = self.middleware(queue_timeout=0.05)
+        first, second = self.get("/a"), self.get("/b")
+        self.assertEqual((await second).status_code, 503)
+        self.release.set()
+        self.assertEqual((await first).status_code, 200)
+        self.assertEqual((middleware.active, middleware.waiting), (0, 0))
+
+    async def test_priority(self):
+        middleware = self.middleware(queue_size=2)
+        first = self.get("/a")
+        await self.settle()
+        export, normal = self.get("/export"), self.get("/b")
+        await self.settle()
+        refresh = self.get("/refresh")
+        self.assertEqual((await export).status_code, 503)
+        # The evicted request left the queue, the refresh took its place.
+        self.assertEqual(ADMISSION_QUEUE.value, 2)
+
+        self.release.set()
+        for task in (first, normal, refresh):
+            self.assertEqual((await task).status_code, 200)
+        self.assertEqual(self.started, ["a", "refresh", "b"])
+        self.assertEqual((middleware.active, middleware.waiting), (0, 0))
+        self.assertEqual(ADMISSION_QUEUE.value, 0)
+
+    async def test_eviction_updates_the_queue_gauge(self):
+        middleware = self.middleware()
+        first, export = self.get("/a"), self.get("/export")
+        await self.settle()
+        self.assertEqual(ADMISSION_QUEUE.value, 1)
+        self.assertTrue(middleware._evict(Priority.HIGH))
+        self.assertEqual(ADMISSION_QUEUE.value, 0)
+        self.assertEqual((await export).status_code, 503)
+        self.release.set()
+        await first
+
+    async def test_exempt_paths_are_not_limited(self):
+        middleware = self.middleware(queue_size=0)
+        first = self.get("/a")
+        await self.settle()
+        metrics = self.get("/metrics")
+        await self.settle()
+        self.assertEqual(self.started, ["a", "metrics"])
+        self.release.set()
+        self.assertEqual([(await task).status_code for task in (first, metrics)], [200, 200])
+        self.assertEqual(middleware.active, 0)
+
+    async def test_shed_response_has_cors_headers(self):
+        middleware = self.middleware(queue_size=0)
+        await self.client.aclose()
+        # The order of main.py: CORS is the outermost middleware.
+        self.assertIs(main_app.user_middleware[0].cls, CORSMiddleware)
+        cors = CORSMiddleware(middleware, allow_origins=["http://localhost:3000"], expose_headers=["Retry-After"])
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=cors), base_url="http://test")
+        first = self.get("/a")
+        await self.settle()
+
+        response = await self.client.get("/b", headers={"Origin": "http://localhost:3000"})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["access-control-allow-origin"], "http://localhost:3000")
+        self.assertEqual(response.headers["access-control-expose-headers"], "Retry-After")
+        self.release.set()
+        await first
+
+
+if __name__ == '__main__':
+    unittest.main()
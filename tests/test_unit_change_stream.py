@@ -0,0 +1,93 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock
+
+from src.conf.config import settings
+from src.services.change_stream import ChangeHub, channel, publish_changes
+
+
+def event(seq: int, deleted=()) -> str:
+    return json.dumps({"seq": seq, "first": seq - len(deleted) + 1, "contacts": [], "deleted": list(deleted)})
+
+
+class TestChangeHub(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.hub = ChangeHub()
+        self.hub._pubsub = AsyncMock()
+        self.queue = asyncio.Queue(maxsize=3)
+        self.hub._queues[1] = {self.queue}
+
+    async def read(self, stream, count: int) -> list:
+        return [await anext(stream) for _ in range(count)]
+
+    async def test_replay_then_live_events(self):
+        replay = {"seq": 5, "contacts": [], "deleted": [7]}
+        stream = self.hub.stream(1, self.queue, 3, replay)
+        self.hub.dispatch(channel(1), event(4, [8]))
+        self.hub.dispatch(channel(1), event(6, [9]))
+        self.hub.dispatch(channel(2), event(10))
+        messages = await self.read(stream, 3)
+        self.assertTrue(messages[0].startswith("retry: "))
+        self.assertEqual(messages[1], 'id: 5\nevent: changes\ndata: {"contacts":[],"deleted":[7]}\n\n')
+        self.assertEqual(messages[2], 'id: 6\nevent: changes\ndata: {"contacts":[],"deleted":[9]}\n\n')
+        await stream.aclose()
+        self.assertNotIn(1, self.hub._queues)
+        self.hub._pubsub.unsubscribe.assert_awaited_once_with(channel(1))
+
+    async def test_out_of_order_event_is_read_from_the_db(self):
+        catch_up = AsyncMock(return_value={"contacts": [], "deleted": [7, 8], "next_token": "8", "has_more": False,
+                                          "reset": False})
+        stream = self.hub.stream(1, self.queue, 6, catch_up=catch_up)
+        self.hub.dispatch(channel(1), event(8, [8]))
+        self.hub.dispatch(channel(1), event(7, [7]))
+        self.hub.dispatch(channel(1), event(9, [9]))
+        messages = await self.read(stream, 3)
+        catch_up.assert_awaited_once_with(6)
+        self.assertEqual(messages[1], 'id: 8\nevent: changes\ndata: {"contacts":[],"deleted":[7,8]}\n\n')
+        self.assertEqual(messages[2], 'id: 9\nevent: changes\ndata: {"contacts":[],"deleted":[9]}\n\n')
+        await stream.aclose()
+
+    async def test_reset_when_the_catch_up_is_too_long(self):
+        catch_up = AsyncMock(return_value={"contacts": [], "deleted": [], "next_token": "8", "has_more": True,
+                                          "reset": False})
+        stream = self.hub.stream(1, self.queue, 6, catch_up=catch_up)
+        self.hub.dispatch(channel(1), event(8, [8]))
+        messages = [message async for message in stream]
+        self.assertEqual(messages[1:], ["event: reset\ndata: {}\n\n"])
+
+    async def test_reset_when_the_tombstones_were_pruned(self):
+        catch_up = AsyncMock(return_value={"contacts": [], "deleted": [], "next_token": "6", "has_more": False,
+                                          "reset": True})
+        stream = self.hub.stream(1, self.queue, 6, catch_up=catch_up)
+        self.hub.dispatch(channel(1), event(8, [8]))
+        messages = [message async for message in stream]
+        self.assertEqual(messages[1:], ["event: reset\ndata: {}\n\n"])
+
+    async def test_reset_when_too_many_changes_were_missed(self):
+        messages = [message async for message in self.hub.stream(1, self.queue, 3, reset=True)]
+        self.assertEqual(messages[1], "event: reset\ndata: {}\n\n")
+
+    async def test_slow_stream_is_closed(self):
+        for seq in range(1, 6):
+            self.hub.dispatch(channel(1), event(seq))
+        messages = [message async for message in self.hub.stream(1, self.queue, 0)]
+        self.assertEqual(len(messages), 1)
+
+    async def test_heartbeat(self):
+        heartbeat = settings.stream_heartbeat_seconds
+        settings.stream_heartbeat_seconds = 0.01
+        try:
+            stream = self.hub.stream(1, self.queue, 0)
+            self.assertEqual((await self.read(stream, 2))[1], ": ping\n\n")
+            await stream.aclose()
+        finally:
+            settings.stream_heartbeat_seconds = heartbeat
+
+    async def test_publish_never_raises(self):
+        await publish_changes(1, 1, [object()], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
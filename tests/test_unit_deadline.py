@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httpx
+import redis.asyncio as redis
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from src.database.instrumentation import _apply_deadline, instrument_engine
+from src.middleware.deadline import NO_DEADLINE, DeadlineMiddleware
+from src.services import deadline
+from src.services import redis_client
+from src.services.deadline import DeadlineExceeded
+from src.services.metrics import REQUESTS_TIMED_OUT
+
+
+class TestDeadlineMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        app = FastAPI()
+
+        @app.get("/sleep/{seconds}")
+        async def sleep(seconds: float):
+            await asyncio.sleep(seconds)
+            return {"remaining": deadline.remaining()}
+
+        @app.get("/stream/{seconds}")
+        async def stream(seconds: float):
+            await asyncio.sleep(seconds)
+            return {"remaining": deadline.remaining()}
+
+        @app.get("/expired")
+        def expired():
+            # A sync route runs in the threadpool and sees the deadline of the request.
+            while deadline.remaining() > 0:
+                pass
+            deadline.check()
+
+        middleware = DeadlineMiddleware(app, default_seconds=0.1, budgets={"/stream": NO_DEADLINE})
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_within_budget(self):
+        response = await self.client.get("/sleep/0")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(0 < response.json()["remaining"] <= 0.1)
+
+    async def test_slow_request_times_out(self):
+        timed_out = REQUESTS_TIMED_OUT.value
+        response = await self.client.get("/sleep/1")
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json(), {"detail": "Request deadline exceeded"})
+        self.assertEqual(REQUESTS_TIMED_OUT.value, timed_out + 1)
+
+    async def test_deadline_check_in_thread(self):
+        response = await self.client.get("/expired")
+        self.assertEqual(response.status_code, 504)
+
+    async def test_path_without_deadline(self):
+        response = await self.client.get("/stream/0.15")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()["remaining"])
+
+
+class TestDeadline(unittest.IsolatedAsyncioTestCase):
+
+    def test_nested_deadline_cannot_extend(self):
+        self.assertIsNone(deadline.remaining())
+        with deadline.deadline(1):
+            with deadline.deadline(10):
+                self.assertLessEqual(deadline.remaining(), 1)
+        self.assertIsNone(deadline.remaining())
+
+    def test_statement_after_deadline_is_refused(self):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        with engine.connect() as connection:
+            with deadline.deadline(10):
+                self.assertEqual(connection.execute(text("SELECT 1")).scalar(), 1)
+            with deadline.deadline(0):
+                with self.assertRaises(DeadlineExceeded):
+                    connection.execute(text("SELECT 1"))
+        engine.dispose()
+
+    def test_postgres_transaction_gets_the_rest_of_the_budget(self):
+        connection = MagicMock()
+        connection.dialect.name = "postgresql"
+        _apply_deadline(None, None, connection)
+        connection.exec_driver_sql.assert_not_called()
+        with deadline.deadline(0.25):
+            _apply_deadline(None, None, connection)
+        sql = connection.exec_driver_sql.call_args.args[0]
+        milliseconds = int(sql.split("statement_timeout = ")[1].split(";")[0])
+        self.assertTrue(0 < milliseconds <= 250)
+        self.assertIn(f"SET LOCAL lock_timeout = {milliseconds}", sql)
+
+        connection = MagicMock()
+        connection.dialect.name = "sqlite"
+        with deadline.deadline(0.25):
+            _apply_deadline(None, None, connection)
+        connection.exec_driver_sql.assert_not_called()
+
+    async def test_redis_command_is_cancelled(self):
+        async def slow_command(self, *args, **options):
+            await asyncio.sleep(1)
+
+        client = redis_client.GuardedRedis()
+        breaker = redis_client.CircuitBreaker(failures=1, reset_seconds=10)
+        with patch.object(redis.Redis, "execute_command", slow_command), patch.object(redis_client, "breaker", breaker):
+            with deadline.deadline(0.05):
+                with self.assertRaises(TimeoutError):
+                    await client.get("key")
+        # Running out of budget is not a Redis failure.
+        self.assertFalse(breaker.is_open)
+        await client.aclose()
+
+
+if __name__ == '__main__':
+    unittest.main()
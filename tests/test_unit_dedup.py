@@ -0,0 +1,34 @@
+import unittest
+
+from src.services.dedup import contact_keys, soundex
+
+
+class TestDedupKeys(unittest.TestCase):
+
+    def test_soundex(self):
+        self.assertEqual(soundex("Robert"), "R163")
+        self.assertEqual(soundex("Rupert"), "R163")
+        self.assertEqual(soundex("Tymczak"), "T522")
+        self.assertEqual(soundex("Ashcraft"), "A261")
+        self.assertEqual(soundex("Lee"), "L000")
+        self.assertEqual(soundex(""), "")
+
+    def test_non_ascii_names(self):
+        self.assertEqual(soundex("Олена"), soundex("Olena"))
+        self.assertEqual(soundex("Мельник"), soundex("Melnyk"))
+        self.assertEqual(soundex("Józef"), soundex("Jozef"))
+        self.assertEqual(contact_keys("Олена", "Мельник", None, None)["name_key"],
+                         contact_keys("Олена", "Мелник", None, None)["name_key"])
+        # No Latin spelling: no name key, so the contact is not grouped by an exact spelling.
+        self.assertEqual(soundex("王伟"), "")
+        self.assertEqual(contact_keys("伟", "王", None, None)["name_key"], "")
+        self.assertEqual(contact_keys("Olena", "王", None, None)["name_key"], "")
+
+    def test_contact_keys(self):
+        keys = contact_keys("Yulia", "Shevchenko", "+38 (050) 123-45-67", " Yulia@Example.COM ")
+        self.assertEqual(keys, {"email_key": "yulia@example.com", "mobile_key": "380501234567", "name_key": "Y400:S125"})
+        self.assertEqual(contact_keys(None, None, None, None), {"email_key": None, "mobile_key": None, "name_key": None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from pydantic import BaseModel
+
+from src.database.models import User
+from src.services import idempotency as idempotency_module
+from src.services.auth import auth_service
+from src.services.idempotency import Idempotency, IdempotentReplay, IdempotentRequest, idempotent_replay_handler
+from tests.fakes import FakeRedis
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+
+
+class TestIdempotency(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch.object(idempotency_module, "get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+        guard = Idempotency(times=2, seconds=60)
+        guard.limiter = self.limiter = AsyncMock()
+
+        app = FastAPI()
+        app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
+        app.dependency_overrides[auth_service.get_current_user] = lambda: User(id=1)
+
+        @app.post("/items", status_code=201)
+        async def create_item(body: dict, idempotency: IdempotentRequest = Depends(guard)):
+            self.calls.append(body)
+            await asyncio.sleep(0.05)
+            if body.get("missing"):
+                raise HTTPException(status_code=404, detail="Not found")
+            return await idempotency.respond({"id": len(self.calls), "name": body["name"]}, Item, 201)
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def post(self, body: dict, key: str | None = "key-1") -> httpx.Response:
+        return await self.client.post("/items", json=body, headers={"Idempotency-Key": key} if key else {})
+
+    async def test_retry_gets_the_stored_response(self):
+        first = await self.post({"name": "Olena"})
+        retry = await self.post({"name": "Olena"})
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(first.json(), retry.json())
+        self.assertEqual(retry.headers["idempotent-replayed"], "true")
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.limiter.await_count, 1)
+
+    async def test_concurrent_duplicates_wait_for_the_original(self):
+        responses = await asyncio.gather(*(self.post({"name": "Olena"}) for _ in range(3)))
+        self.assertEqual({response.json()["id"] for response in responses}, {1})
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_key_reused_for_another_request(self):
+        await self.post({"name": "Olena"})
+        response = await self.post({"name": "Taras"})
+        self.assertEqual(response.status_code, 422, response.text)
+
+    async def test_client_errors_are_stored(self):
+        first = await self.post({"name": "Olena", "missing": True})
+        retry = await self.post({"name": "Olena", "missing": True})
+        self.assertEqual((first.status_code, retry.status_code), (404, 404))
+        self.assertEqual(retry.json(), {"detail": "Not found"})
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_without_key(self):
+        await self.post({"name": "Olena"}, key=None)
+        await self.post({"name": "Olena"}, key=None)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.redis.values, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
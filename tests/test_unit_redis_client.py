@@ -0,0 +1,120 @@
+import unittest
+from unittest.mock import patch
+
+import httpx
+from fastapi import Depends, FastAPI
+from fastapi_limiter import FastAPILimiter
+from redis.exceptions import ConnectionError, ResponseError
+
+from src.conf.config import settings
+from src.services.metrics import RATE_LIMIT_SKIPPED
+from src.services.rate_limit import RateLimiter
+from src.services.redis_client import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(failures=3, reset_seconds=10, clock=self.clock)
+        self.sent = 0
+
+    async def ok(self):
+        self.sent += 1
+        return "PONG"
+
+    async def down(self):
+        self.sent += 1
+        raise ConnectionError("refused")
+
+    async def fail(self, times: int):
+        for _ in range(times):
+            with self.assertRaises(ConnectionError):
+                await self.breaker.call(self.down)
+
+    async def test_opens_after_consecutive_failures(self):
+        await self.fail(2)
+        self.assertEqual(await self.breaker.call(self.ok), "PONG")
+        await self.fail(2)
+        self.assertFalse(self.breaker.is_open)
+        await self.fail(1)
+        self.assertTrue(self.breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            await self.breaker.call(self.ok)
+        self.assertEqual(self.sent, 6)
+
+    async def test_one_trial_command_after_the_reset_time(self):
+        await self.fail(3)
+        self.clock.now = 10
+        await self.fail(1)
+        with self.assertRaises(CircuitOpenError):
+            await self.breaker.call(self.ok)
+        self.clock.now = 20
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.success()
+        self.assertEqual(await self.breaker.call(self.ok), "PONG")
+        self.assertEqual(self.sent, 5)
+
+    async def test_command_errors_do_not_count(self):
+        async def wrong_type():
+            raise ResponseError("WRONGTYPE")
+
+        for _ in range(5):
+            with self.assertRaises(ResponseError):
+                await self.breaker.call(wrong_type)
+        self.assertFalse(self.breaker.is_open)
+
+
+class UnavailableRedis:
+
+    async def evalsha(self, *args):
+        raise CircuitOpenError("Redis circuit is open")
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_request_goes_through_without_redis(self):
+        app = FastAPI()
+
+        @app.get("/limited", dependencies=[Depends(RateLimiter(times=1, seconds=60))])
+        async def limited():
+            return {"ok": True}
+
+        async def identifier(request):
+            return "client"
+
+        skipped = RATE_LIMIT_SKIPPED.value
+        with patch.multiple(FastAPILimiter, redis=UnavailableRedis(), identifier=identifier, lua_sha="sha"):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                responses = [await client.get("/limited") for _ in range(2)]
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(RATE_LIMIT_SKIPPED.value, skipped + 2)
+
+    async def test_disabled_limiter_does_not_call_redis(self):
+        app = FastAPI()
+
+        @app.get("/limited", dependencies=[Depends(RateLimiter(times=1, seconds=60))])
+        async def limited():
+            return {"ok": True}
+
+        skipped = RATE_LIMIT_SKIPPED.value
+        with patch.multiple(FastAPILimiter, redis=UnavailableRedis(), lua_sha="sha"), \
+                patch.object(settings, "rate_limit_enabled", False):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                responses = [await client.get("/limited") for _ in range(2)]
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        self.assertEqual(RATE_LIMIT_SKIPPED.value, skipped)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import pickle
+import time
+import unittest
+from unittest.mock import patch
+
+from src.services import single_flight as single_flight_module
+from src.services.metrics import Counter, Registry
+from src.services.single_flight import SingleFlightCache
+from tests.fakes import BrokenRedis, FakeRedis
+
+
+class TestSingleFlightCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch.object(single_flight_module, "get_redis", side_effect=lambda **kwargs: self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.metric = Counter("cache_total", "Test cache.", ("result",), registry=Registry())
+        self.loads = 0
+
+    def cache(self) -> SingleFlightCache:
+        return SingleFlightCache("test", ttl=100, poll_ms=1, metric=self.metric)
+
+    async def loader(self, value="value"):
+        self.loads += 1
+        await asyncio.sleep(0.02)
+        return value
+
+    def count(self, result: str) -> float:
+        return self.metric.labels(result).value
+
+    async def test_concurrent_misses_share_one_load(self):
+        cache = self.cache()
+        values = await asyncio.gather(*(cache.get("key", self.loader) for _ in range(10)))
+        self.assertEqual(values, ["value"] * 10)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual((self.count("miss"), self.count("coalesced")), (1, 9))
+        self.assertEqual(await cache.get("key", self.loader), "value")
+        self.assertEqual((self.loads, self.count("hit")), (1, 1))
+
+    async def test_cancelled_leader_does_not_fail_the_followers(self):
+        cache = self.cache()
+        leader = asyncio.create_task(cache.get("key", self.loader))
+        await asyncio.sleep(0.005)
+        follower = asyncio.create_task(cache.get("key", self.loader))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(await follower, "value")
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(await cache.get("key", self.loader), "value")
+        self.assertEqual(self.loads, 1)
+
+    async def test_followers_load_again_after_a_failed_load(self):
+        cache = self.cache()
+
+        async def failing_loader():
+            await asyncio.sleep(0.02)
+            raise TimeoutError("out of time")
+
+        leader = asyncio.create_task(cache.get("key", failing_loader))
+        await asyncio.sleep(0.005)
+        followers = [asyncio.create_task(cache.get("key", self.loader)) for _ in range(3)]
+        with self.assertRaises(TimeoutError):
+            await leader
+        self.assertEqual(await asyncio.gather(*followers), ["value"] * 3)
+        self.assertEqual(self.loads, 1)
+
+    async def test_workers_share_one_load_through_the_lock(self):
+        workers = [self.cache(), self.cache()]
+        values = await asyncio.gather(*(worker.get("key", self.loader) for worker in workers))
+        self.assertEqual(values, ["value", "value"])
+        self.assertEqual(self.loads, 1)
+        self.assertNotIn("key:lock", self.redis.values)
+
+    async def test_ttl_jitter(self):
+        cache = self.cache()
+        for i in range(20):
+            await cache.get(f"key{i}", self.loader)
+        ttls = {self.redis.ttls[f"key{i}"] for i in range(20)}
+        self.assertTrue(all(90 <= ttl <= 110 for ttl in ttls))
+        self.assertGreater(len(ttls), 1)
+
+    async def test_refresh_ahead(self):
+        cache = self.cache()
+        self.redis.values["key"] = pickle.dumps((time.time() - 1, "old"))
+        values = await asyncio.gather(cache.get("key", lambda: self.loader("new")), cache.get("key", lambda: self.loader("new")))
+        self.assertEqual(sorted(values), ["new", "old"])
+        self.assertEqual((self.loads, self.count("refresh")), (1, 1))
+        self.assertEqual(await cache.get("key", self.loader), "new")
+
+    async def test_none_is_not_cached(self):
+        cache = self.cache()
+        self.assertIsNone(await cache.get("key", lambda: self.loader(None)))
+        self.assertIsNone(await cache.get("key", lambda: self.loader(None)))
+        self.assertEqual(self.loads, 2)
+
+    async def test_loads_without_redis(self):
+        self.redis = BrokenRedis()
+        self.assertEqual(await self.cache().get("key", self.loader), "value")
+
+
+if __name__ == '__main__':
+    unittest.main()
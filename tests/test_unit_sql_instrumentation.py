@@ -0,0 +1,50 @@
+import logging
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from src.conf.config import settings
+from src.database.instrumentation import instrument_engine, track_queries
+
+
+class TestSqlInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        instrument_engine(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, secret TEXT)"))
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_queries_are_attributed_to_the_block(self):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with track_queries() as stats:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+        self.assertEqual(stats.count, 2)
+        self.assertGreater(stats.duration, 0)
+
+    def test_repeated_statement_is_suspected(self):
+        with self.engine.connect() as conn, track_queries() as stats:
+            for i in range(settings.sql_n_plus_one_threshold):
+                conn.execute(text("SELECT * FROM items WHERE id = :id"), {"id": i})
+        self.assertEqual(stats.suspected, {"SELECT * FROM items WHERE id = ?"})
+
+    def test_slow_query_log_redacts_parameters(self):
+        threshold = settings.sql_slow_query_ms
+        settings.sql_slow_query_ms = 0
+        try:
+            with self.assertLogs("src.database.instrumentation", level=logging.WARNING) as logs:
+                with self.engine.begin() as conn:
+                    conn.execute(text("INSERT INTO items (secret) VALUES (:secret)"), {"secret": "hunter2"})
+        finally:
+            settings.sql_slow_query_ms = threshold
+        self.assertIn("INSERT INTO items", logs.output[0])
+        self.assertNotIn("hunter2", "".join(logs.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import time
+import unittest
+
+from src.services.suggest import PrefixIndex
+
+
+class TestPrefixIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PrefixIndex.build([
+            (1, "Olena", "Melnyk", "olena@example.com"),
+            (2, "Oleh", "Moroz", None),
+            (3, "Taras", "Oliinyk", "taras@example.com"),
+        ])
+
+    def test_search(self):
+        self.assertEqual([c["id"] for c in self.index.search("ol", 10)], [2, 1, 3])
+        self.assertEqual([c["id"] for c in self.index.search("OLE", 10)], [2, 1])
+        self.assertEqual([c["id"] for c in self.index.search("taras@", 10)], [3])
+        self.assertEqual(self.index.search("x", 10), [])
+        self.assertEqual(len(self.index.search("o", 2)), 2)
+
+    def test_add_and_remove(self):
+        self.index.add(4, ("Olga", "Koval", None))
+        self.assertIn(4, [c["id"] for c in self.index.search("olg", 10)])
+        self.index.add(1, ("Iryna", "Melnyk", None))
+        self.assertEqual([c["id"] for c in self.index.search("olena", 10)], [])
+        self.assertEqual(self.index.search("iry", 10)[0]["name"], "Iryna")
+        self.index.remove(1)
+        self.index.remove(1)
+        self.assertEqual(self.index.search("melnyk", 10), [])
+        self.assertEqual(len(self.index), 7)
+
+    def test_p99_latency(self):
+        index = PrefixIndex.build((i, f"name{i}", f"surname{i}", f"user{i}@example.com") for i in range(100_000))
+        timings = []
+        for i in range(1000):
+            start = time.perf_counter()
+            index.search(f"name{i % 500}", 10)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        self.assertLess(timings[989], 0.005)
+
+
+if __name__ == '__main__':
+    unittest.main()